@@ -29,6 +29,25 @@ class AssistantManager(ParentManager):
             self.__generate_manager_documentation(manager)
 
 
+    @staticmethod
+    def __split_params(params):
+        """
+        Split a parameter list on the commas that are not inside brackets, e.g. in Literal['a', 'b'] or Dict[str, int]
+        """
+        parts, depth, current = [], 0, ''
+        for character in params:
+            if character in '[(':
+                depth += 1
+            elif character in '])':
+                depth -= 1
+            if character == ',' and depth == 0:
+                parts.append(current)
+                current = ''
+            else:
+                current += character
+        parts.append(current)
+        return parts
+
     @staticmethod
     def __generate_manager_documentation(manager_name):
         """
@@ -51,7 +70,8 @@ class AssistantManager(ParentManager):
                 functions_list = [
                     {
                         "name": name,
-                        "params": [p.strip() for p in params.split(',') if p.strip() and p.strip() != 'self'],
+                        "params": [p.strip() for p in AssistantManager.__split_params(params)
+                                   if p.strip() and p.strip() != 'self'],
                         "usage": doc.strip()
                     }
                     for name, params, doc in function_matches
@@ -0,0 +1,213 @@
+"""Fake LLM backend and recording devices used to replay the pipeline offline.
+
+FakeLLM answers from canned answers with a latency model (time to first token, time per output token and a
+log-normal jitter). The recording devices stand for the Hue bridge, the Home Assistant REST session and the
+Roborock vacuum: they keep the state the managers read back, record every call and can add a fixed latency.
+"""
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+from llm.command_schema import NO_ACTION_ANSWER
+from llm.llm_abstract_class import LLMInterface
+from llm.token_counter import count_tokens
+
+
+class FakeLLM(LLMInterface):
+    """
+    LLMInterface answering the canned answer of a request, NO_ACTION_ANSWER for unknown requests.
+
+    An answer takes first_token_ms plus ms_per_token for each of its tokens, multiplied by a log-normal factor
+    of standard deviation jitter; streamed answers are yielded token by token at that pace. The reported usage
+    counts the system prompt as cached, like a provider with prompt caching.
+    """
+
+    def __init__(self, answers: Dict[str, Dict[str, Any]], first_token_ms: float = 0, ms_per_token: float = 0,
+                 jitter: float = 0.0, seed: Optional[int] = None, chars_per_token: int = 4):
+        self.answers = {request.strip(): json.dumps(answer, ensure_ascii=False) for request, answer in answers.items()}
+        self.no_action_answer = json.dumps({"answer": NO_ACTION_ANSWER, "commands": []}, ensure_ascii=False)
+        self.first_token_ms = first_token_ms
+        self.ms_per_token = ms_per_token
+        self.jitter = jitter
+        self.chars_per_token = chars_per_token
+        self.plugs_context = ''
+        self.calls = 0
+        self._random = random.Random(seed)
+        # Requests are answered from several pool threads with --concurrency above 1
+        self._lock = threading.Lock()
+
+    def add_plugs_context_to_prompt(self, plugs_context):
+        self.plugs_context = plugs_context
+
+    def interpret_request(self, request):
+        answer = self.__answer_for(request)
+        time.sleep(self.__latency_factor() * (self.first_token_ms + self.ms_per_token * count_tokens(answer)) / 1000)
+        self.__record_usage(request, answer)
+        return answer
+
+    def interpret_request_stream(self, request):
+        answer = self.__answer_for(request)
+        factor = self.__latency_factor()
+        time.sleep(factor * self.first_token_ms / 1000)
+        for offset in range(0, len(answer), self.chars_per_token):
+            time.sleep(factor * self.ms_per_token / 1000)
+            yield answer[offset:offset + self.chars_per_token]
+        self.__record_usage(request, answer)
+
+    def __answer_for(self, request):
+        with self._lock:
+            self.calls += 1
+        return self.answers.get(request.strip(), self.no_action_answer)
+
+    def __latency_factor(self):
+        if not self.jitter:
+            return 1.0
+        with self._lock:
+            return self._random.lognormvariate(0, self.jitter)
+
+    def __record_usage(self, request, answer):
+        system_tokens = count_tokens(self.llm_context) + count_tokens(self.plugs_context)
+        self.record_usage(system_tokens + count_tokens(request), system_tokens, count_tokens(answer))
+
+
+class RecordingDevice:
+    """
+    Base of the fake devices: every call is recorded as (name, arguments) and takes latency_ms
+    """
+
+    def __init__(self, latency_ms: float = 0):
+        self.latency_ms = latency_ms
+        self.calls: List[Tuple[str, Tuple[Any, ...]]] = []
+        self._calls_lock = threading.Lock()
+
+    @property
+    def call_count(self) -> int:
+        return len(self.calls)
+
+    def _record(self, name: str, *arguments) -> None:
+        with self._calls_lock:
+            self.calls.append((name, arguments))
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+
+class RecordingHueBridge(RecordingDevice):
+    """
+    Subset of phue.Bridge used by HueManager, with one group per room like a bridge configured with the Hue app
+    """
+
+    def __init__(self, lights: Iterable[Dict[str, Any]], latency_ms: float = 0):
+        super().__init__(latency_ms)
+        self.light_names: Dict[int, str] = {}
+        self.light_states: Dict[int, Dict[str, Any]] = {}
+        rooms: Dict[str, List[int]] = {}
+        for light in lights:
+            light_id = int(light['id'])
+            self.light_names[light_id] = light.get('name', str(light_id))
+            self.light_states[light_id] = {'on': False, 'bri': 254, 'reachable': True}
+            rooms.setdefault(light.get('room', ''), []).append(light_id)
+        self.groups: Dict[int, Dict[str, Any]] = {
+            group_id: {'name': room, 'lights': [str(light_id) for light_id in light_ids]}
+            for group_id, (room, light_ids) in enumerate(sorted(rooms.items()), start=1)
+        }
+
+    @property
+    def lights(self) -> List[Dict[str, Any]]:
+        return [self.__light(light_id) for light_id in self.light_states]
+
+    def get_light(self, light_id=None, parameter=None):
+        self._record('get_light', light_id, parameter)
+        if light_id is None:
+            return {str(light_id): self.__light(light_id) for light_id in self.light_states}
+        light = self.__light(int(light_id))
+        return light if parameter is None else light['state'].get(parameter, light.get(parameter))
+
+    def get_group(self, group_id=None, parameter=None):
+        self._record('get_group', group_id, parameter)
+        if group_id is None:
+            return {str(group_id): dict(group) for group_id, group in self.groups.items()}
+        group = self.groups[int(group_id)]
+        return group if parameter is None else group.get(parameter)
+
+    def get_light_objects(self, mode='list'):
+        self._record('get_light_objects', mode)
+        return {light_id: self.__light(light_id) for light_id in self.light_states}
+
+    def set_light(self, light_id, parameter, value=None, transitiontime=None):
+        state = parameter if isinstance(parameter, dict) else {parameter: value}
+        self._record('set_light', light_id, state)
+        return [self.__apply(int(light_id), state)]
+
+    def set_group(self, group_id, parameter, value=None, transitiontime=None):
+        state = parameter if isinstance(parameter, dict) else {parameter: value}
+        self._record('set_group', group_id, state)
+        group_id = int(group_id)
+        light_ids = self.light_states if group_id == 0 else [int(light_id) for light_id in self.groups[group_id]['lights']]
+        return [self.__apply(light_id, state) for light_id in light_ids]
+
+    def __light(self, light_id: int) -> Dict[str, Any]:
+        return {'name': self.light_names[light_id], 'state': dict(self.light_states[light_id])}
+
+    def __apply(self, light_id: int, state: Dict[str, Any]) -> Dict[str, Any]:
+        light_state = self.light_states[light_id]
+        for parameter, value in state.items():
+            if parameter.endswith('_inc'):
+                parameter = parameter[:-len('_inc')]
+                value = max(0, min(254, light_state.get(parameter, 0) + value))
+            light_state[parameter] = value
+        return {'success': {f"/lights/{light_id}/state": state}}
+
+
+class RecordingHomeAssistantSession(requests.Session, RecordingDevice):
+    """
+    requests.Session answering every Home Assistant REST call locally with status_code
+    """
+
+    def __init__(self, latency_ms: float = 0, status_code: int = 200):
+        requests.Session.__init__(self)
+        RecordingDevice.__init__(self, latency_ms)
+        self.status_code = status_code
+
+    def request(self, method, url, *args, **kwargs):
+        self._record(method.upper(), url)
+        response = requests.Response()
+        response.status_code = self.status_code
+        response.url = url
+        response._content = b'[]'
+        response.headers['Content-Type'] = 'application/json'
+        return response
+
+
+class RecordingVacuum(RecordingDevice):
+    """
+    Subset of miio.RoborockVacuum used by RoborockManager
+    """
+
+    def __init__(self, latency_ms: float = 0):
+        super().__init__(latency_ms)
+        self.state = 'Charging'
+
+    def home(self):
+        self._record('home')
+        self.state = 'Returning home'
+        return ['ok']
+
+    def start(self):
+        self._record('start')
+        self.state = 'Cleaning'
+        return ['ok']
+
+    def segment_clean(self, segments):
+        self._record('segment_clean', list(segments))
+        self.state = 'Segment cleaning'
+        return ['ok']
+
+    def send(self, command, parameters=None):
+        self._record(command, parameters)
+        if command == 'app_segment_clean':
+            self.state = 'Segment cleaning'
+        return ['ok']
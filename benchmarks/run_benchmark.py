@@ -0,0 +1,228 @@
+"""Offline replay benchmark of the command pipeline.
+
+Every utterance of the corpus (a JSON lines file of {"text", "answer", optional "wav"}) goes through speech to
+text when it has a WAV file, then through CommandUnderstander and CommandInterpreter, exactly as in the voice
+pipeline. The LLM is a FakeLLM answering the canned "answer" of the utterance with a latency model and the
+devices are recording fakes, so the numbers only depend on the code of the assistant and on the modelled
+latencies. Speech synthesis is not replayed. With --devices simulated, the managers talk to the local
+simulators of the simulators package through the real client libraries (phue, requests, python-miio) instead.
+
+Run from the repository root:
+
+    python -m benchmarks.run_benchmark --repeat 5 --llm-first-token-ms 350 --llm-ms-per-token 8
+
+The report gives the throughput, the latency percentiles of every stage (from the traces written to --traces)
+and the device calls per request. Calls are attributed to a request by difference, which is only exact with
+--concurrency 1 (the default).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import wave
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.fakes import FakeLLM, RecordingHomeAssistantSession, RecordingHueBridge, RecordingVacuum
+from command_interpreter import CommandInterpreter
+from plugs.home_assistant_plug.home_assistant_manager import HomeAssistantManager
+from plugs.hue_plug import HueManager
+from plugs.roborock_plug.roborock_manager import RoborockManager
+from services.async_runtime import configure_blocking_pool, run_blocking
+from services.command_understander import CommandUnderstander
+from services.tracing import configure_tracing, tracer
+from trace_summary import PERCENTILES, format_table, load_spans, percentile, stage_durations, stage_errors
+
+DEFAULT_CORPUS_PATH = Path(__file__).resolve().parent / "corpus.jsonl"
+DEFAULT_TRACES_PATH = Path("logs/benchmark_traces.jsonl")
+CONFIGURATION_PATH = Path("configuration.json")
+HUE_CONFIGURATION_PATH = Path("plugs/hue_plug/hue_configuration.json")
+ROBOROCK_CONFIGURATION_PATH = Path("plugs/roborock_plug/roborock_configuration.json")
+
+
+def load_corpus(path: Path) -> List[dict]:
+    """Read the corpus, a relative wav path is resolved from the corpus directory."""
+    entries = []
+    with path.open("r", encoding="utf-8") as corpus_file:
+        for line in corpus_file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry.get("wav"):
+                entry["wav"] = str(path.parent / entry["wav"])
+            entries.append(entry)
+    return entries
+
+
+def read_wav(path: str):
+    with wave.open(path, "rb") as wav_file:
+        if wav_file.getsampwidth() != 2 or wav_file.getnchannels() != 1:
+            raise ValueError(f"{path} must be 16-bit mono PCM")
+        return wav_file.readframes(wav_file.getnframes()), wav_file.getframerate()
+
+
+class Benchmark:
+    """Pipeline wired to the fake LLM and to the recording devices."""
+
+    def __init__(self, corpus: List[dict], arguments: argparse.Namespace):
+        with CONFIGURATION_PATH.open("r", encoding="utf-8") as configuration_file:
+            self.configuration = json.load(configuration_file)
+        self.configuration["response_cache"] = {"enabled": arguments.response_cache}
+        self.corpus = corpus
+
+        with HUE_CONFIGURATION_PATH.open("r", encoding="utf-8") as hue_configuration_file:
+            hue_lights = json.load(hue_configuration_file)["hue_lights"]
+        access_token = os.environ.setdefault("HOME_ASSISTANT_TOKEN", "benchmark")
+        self.simulators = []
+        if arguments.devices == "simulated":
+            managers = self.__simulated_managers(hue_lights, access_token, arguments.device_latency_ms)
+        else:
+            self.devices = {
+                "hue": RecordingHueBridge(hue_lights, arguments.device_latency_ms),
+                "home_assistant": RecordingHomeAssistantSession(arguments.device_latency_ms),
+                "roborock": RecordingVacuum(arguments.device_latency_ms),
+            }
+            managers = {
+                "hue": HueManager(bridge=self.devices["hue"]),
+                "home_assistant": HomeAssistantManager(session=self.devices["home_assistant"], use_websocket=False),
+                "roborock": RoborockManager(vacuum=self.devices["roborock"]),
+            }
+        self.command_interpreter = CommandInterpreter(self.configuration, managers=managers)
+        self.llm = FakeLLM({entry["text"]: entry["answer"] for entry in corpus if "answer" in entry},
+                           first_token_ms=arguments.llm_first_token_ms, ms_per_token=arguments.llm_ms_per_token,
+                           jitter=arguments.llm_jitter, seed=arguments.seed)
+        self.command_understander = CommandUnderstander(self.configuration, llm=self.llm)
+        self.speech_to_text = None
+        if any(entry.get("wav") for entry in corpus):
+            # speech_recognition and the STT models are only needed by a corpus with recorded audio
+            from services.speech_to_text import create_speech_to_text
+            self.speech_to_text = create_speech_to_text(self.configuration)
+        self.device_calls: Dict[str, List[int]] = {name: [] for name in self.devices}
+
+    def __simulated_managers(self, hue_lights, access_token, latency_ms):
+        """
+        Start the device simulators and connect the managers to them with the real client libraries
+        """
+        from miio import RoborockVacuum
+        from phue import Bridge
+        from simulators import DeviceBehaviour, HomeAssistantSimulator, HueBridgeSimulator, RoborockSimulator
+        from simulators.__main__ import documented_scripts
+
+        with ROBOROCK_CONFIGURATION_PATH.open("r", encoding="utf-8") as roborock_configuration_file:
+            roborock_token = json.load(roborock_configuration_file)["token"]
+        self.devices = {
+            "hue": HueBridgeSimulator(hue_lights, behaviour=DeviceBehaviour(latency_ms, max_requests_per_second=10)),
+            "home_assistant": HomeAssistantSimulator(access_token, documented_scripts(),
+                                                     behaviour=DeviceBehaviour(latency_ms)),
+            "roborock": RoborockSimulator(roborock_token, behaviour=DeviceBehaviour(latency_ms)),
+        }
+        try:
+            for simulator in self.devices.values():
+                simulator.start()
+                self.simulators.append(simulator)
+        except BaseException:
+            self.close()
+            raise
+        hue = self.devices["hue"]
+        return {
+            "hue": HueManager(bridge=Bridge(hue.address, next(iter(hue.usernames)))),
+            "home_assistant": HomeAssistantManager(url=f"http://{self.devices['home_assistant'].address}"),
+            "roborock": RoborockManager(vacuum=RoborockVacuum(self.devices["roborock"].host, roborock_token)),
+        }
+
+    def close(self) -> None:
+        """Stop the device simulators started for --devices simulated."""
+        while self.simulators:
+            self.simulators.pop().stop()
+
+    async def run(self, repeat: int, concurrency: int) -> float:
+        """Replay the corpus repeat times, return the elapsed wall time in seconds."""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def replay(entry):
+            async with semaphore:
+                await self.__replay(entry)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            await asyncio.gather(*(replay(entry) for entry in self.corpus))
+        return time.perf_counter() - start
+
+    async def __replay(self, entry: dict) -> None:
+        calls_before = {name: device.call_count for name, device in self.devices.items()}
+        command_tasks = []
+
+        async def on_command(command):
+            command_tasks.append(asyncio.create_task(self.command_interpreter.handle_command_async(command)))
+
+        async def on_answer(answer):
+            pass
+
+        with tracer.activate(tracer.start_trace("benchmark")), tracer.span("request"):
+            text = entry["text"]
+            if entry.get("wav") and self.speech_to_text is not None:
+                pcm, sample_rate = read_wav(entry["wav"])
+                with tracer.span("stt", engine=self.speech_to_text.name):
+                    text = await run_blocking(self.speech_to_text.transcribe, pcm, sample_rate) or ""
+            await self.command_understander.interpret_and_dispatch_async(text, on_command, on_answer)
+            await asyncio.gather(*command_tasks)
+        for name, device in self.devices.items():
+            self.device_calls[name].append(device.call_count - calls_before[name])
+
+
+def format_device_calls(device_calls: Dict[str, List[int]]) -> str:
+    header = f"{'device':<32}{'calls':>7}{'mean/request':>14}" + "".join(f"{f'p{p}':>7}" for p in PERCENTILES)
+    lines = [header, "-" * len(header)]
+    for name, calls in device_calls.items():
+        if not calls:
+            continue
+        sorted_calls = sorted(calls)
+        lines.append(f"{name:<32}{sum(calls):>7}{sum(calls) / len(calls):>14.2f}"
+                     + "".join(f"{percentile(sorted_calls, p):>7}" for p in PERCENTILES))
+    return "\n".join(lines)
+
+
+def main() -> None:
+    """Entry point of the benchmark."""
+    parser = argparse.ArgumentParser(description="Replay a corpus of utterances through the command pipeline.")
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS_PATH)
+    parser.add_argument("--repeat", type=int, default=3, help="number of passes over the corpus")
+    parser.add_argument("--concurrency", type=int, default=1, help="utterances replayed at the same time")
+    parser.add_argument("--llm-first-token-ms", type=float, default=0)
+    parser.add_argument("--llm-ms-per-token", type=float, default=0)
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="standard deviation of the log-normal jitter")
+    parser.add_argument("--devices", choices=("fake", "simulated"), default="fake",
+                        help="recording fakes, or the local simulators reached through the client libraries")
+    parser.add_argument("--device-latency-ms", type=float, default=0)
+    parser.add_argument("--response-cache", action="store_true", help="keep the LLM response cache enabled")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--traces", type=Path, default=DEFAULT_TRACES_PATH)
+    arguments = parser.parse_args()
+
+    if arguments.traces.exists():
+        arguments.traces.unlink()
+    configure_tracing(str(arguments.traces))
+    configure_blocking_pool(max(8, arguments.concurrency * 2))
+
+    corpus = load_corpus(arguments.corpus)
+    benchmark = Benchmark(corpus, arguments)
+    try:
+        elapsed = asyncio.run(benchmark.run(arguments.repeat, arguments.concurrency))
+    finally:
+        benchmark.close()
+
+    requests_count = len(corpus) * arguments.repeat
+    print(f"{requests_count} requests in {elapsed:.2f} s, {requests_count / elapsed:.1f} requests/s, "
+          f"{benchmark.llm.calls} LLM calls\n")
+    tracer.flush()
+    spans = load_spans(arguments.traces)
+    print(format_table(stage_durations(spans), stage_errors(spans)))
+    print()
+    print(format_device_calls(benchmark.device_calls))
+
+
+if __name__ == "__main__":
+    main()
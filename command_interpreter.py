@@ -1,36 +1,154 @@
+import asyncio
+import contextvars
 import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
 from plugs.home_assistant_plug.home_assistant_manager import HomeAssistantManager
 from plugs.hue_plug import HueManager
+from plugs.parent_manager import ParentManager
 from plugs.roborock_plug.roborock_manager import RoborockManager
+from services.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
+
+@dataclass
+class CommandResult:
+    manager_name: str
+    command_name: str
+    params: List[Any]
+    result: Any = None
+    error: Optional[str] = None
+    duration_ms: float = 0.0
+
+
 class CommandInterpreter:
-    def __init__(self, configuration):
+    def __init__(self, configuration, managers: Optional[Dict[str, ParentManager]] = None):
+        """
+        managers replaces the managers created from the configuration (fake devices of the benchmarks...)
+        """
         self.configuration = configuration
         available_managers = self.configuration.get('available_managers', [])
-        self.hue_manager = HueManager() if 'hue' in available_managers else None
-        self.home_assistant_manager = HomeAssistantManager() if 'home_assistant' in available_managers else None
-        self.roborock_manager = RoborockManager() if 'roborock' in available_managers else None
+        managers = managers or {}
+        self.hue_manager = self.__create_manager('hue', HueManager, available_managers, managers)
+        self.home_assistant_manager = self.__create_manager('home_assistant', HomeAssistantManager,
+                                                            available_managers, managers)
+        self.roborock_manager = self.__create_manager('roborock', RoborockManager, available_managers, managers)
+        # One single threaded lane per manager keeps the commands of a manager ordered while different
+        # managers run in parallel, independent commands go to the shared pool
+        self.__lanes: Dict[str, ThreadPoolExecutor] = {
+            manager_name: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"command-{manager_name}")
+            for manager_name in available_managers
+        }
+        self.__independent_pool = ThreadPoolExecutor(
+            max_workers=self.configuration.get('command_workers', 4), thread_name_prefix="command-independent"
+        )
+        # Same ordering guarantee for the asyncio variants, asyncio locks wake their waiters in FIFO order
+        self.__manager_locks: Dict[str, asyncio.Lock] = {}
 
-    def handle_command(self, command):
-        manager_name = command['manager_name']
-        available_managers = self.configuration['available_managers']
+    @staticmethod
+    def __create_manager(manager_name, manager_class, available_managers, managers) -> Optional[ParentManager]:
         if manager_name not in available_managers:
-            logger.error("Manager %s is not available", manager_name)
-            return
-        if manager_name == 'hue' and self.hue_manager:
-            self.hue_manager.handle_command(command)
-        elif manager_name == 'home_assistant' and self.home_assistant_manager:
-            self.home_assistant_manager.handle_command(command)
-        elif manager_name == 'roborock' and self.roborock_manager:
-            self.roborock_manager.handle_command(command)
+            return None
+        if manager_name in managers:
+            return managers[manager_name]
+        return manager_class()
+
+    def get_manager(self, manager_name) -> Optional[ParentManager]:
+        if manager_name not in self.configuration.get('available_managers', []):
+            return None
+        if manager_name == 'hue':
+            return self.hue_manager
+        if manager_name == 'home_assistant':
+            return self.home_assistant_manager
+        if manager_name == 'roborock':
+            return self.roborock_manager
+        return None
+
+    def handle_command(self, command) -> CommandResult:
+        """
+        Execute a command synchronously and return its result, error and duration
+        """
+        command_result, manager = self.__prepare(command)
+        with tracer.span("command", manager=command_result.manager_name,
+                         command=command_result.command_name) as span:
+            start = time.perf_counter()
+            if manager is not None:
+                try:
+                    command_result.result = manager.handle_command(command)
+                except Exception as exc:
+                    span.set_error(exc)
+                    command_result.error = f"{type(exc).__name__}: {exc}"
+            return self.__finish(command_result, start)
+
+    async def handle_command_async(self, command) -> CommandResult:
+        """
+        Awaitable variant of handle_command, commands of a same manager keep their order unless declared independent
+        """
+        command_result, manager = self.__prepare(command)
+        if manager is None:
+            return self.__finish(command_result, time.perf_counter())
+        if command_result.command_name in manager.independent_commands:
+            return await self.__execute_async(manager, command, command_result)
+        lock = self.__manager_locks.setdefault(command_result.manager_name, asyncio.Lock())
+        async with lock:
+            return await self.__execute_async(manager, command, command_result)
 
-    def handle_request(self, command_as_json):
-        for command in command_as_json:
-            self.handle_command(command)
+    async def __execute_async(self, manager, command, command_result) -> CommandResult:
+        with tracer.span("command", manager=command_result.manager_name,
+                         command=command_result.command_name) as span:
+            start = time.perf_counter()
+            try:
+                command_result.result = await manager.handle_command_async(command)
+            except Exception as exc:
+                span.set_error(exc)
+                command_result.error = f"{type(exc).__name__}: {exc}"
+            return self.__finish(command_result, start)
 
+    def __prepare(self, command):
+        command_result = CommandResult(command.get('manager_name'), command.get('command_name'),
+                                       command.get('params', []))
+        manager = self.get_manager(command_result.manager_name)
+        if manager is None:
+            command_result.error = f"Manager {command_result.manager_name} is not available"
+        return command_result, manager
 
+    @staticmethod
+    def __finish(command_result: CommandResult, start: float) -> CommandResult:
+        command_result.duration_ms = (time.perf_counter() - start) * 1000
+        if command_result.error:
+            logger.error("Command %s.%s failed in %.1f ms: %s", command_result.manager_name,
+                         command_result.command_name, command_result.duration_ms, command_result.error)
+        else:
+            logger.info("Command %s.%s done in %.1f ms", command_result.manager_name,
+                        command_result.command_name, command_result.duration_ms)
+        return command_result
 
+    def submit_command(self, command) -> "Future[CommandResult]":
+        """
+        Schedule a command on the lane of its manager, or on the shared pool if the manager declares it independent
+        """
+        manager_name = command.get('manager_name')
+        manager = self.get_manager(manager_name)
+        # The command runs in a copy of the caller context to stay in the trace of its utterance
+        context = contextvars.copy_context()
+        if manager is not None and command.get('command_name') in manager.independent_commands:
+            return self.__independent_pool.submit(context.run, self.handle_command, command)
+        lane = self.__lanes.get(manager_name, self.__independent_pool)
+        return lane.submit(context.run, self.handle_command, command)
 
+    def handle_request(self, command_as_json) -> List[CommandResult]:
+        """
+        Execute all the commands of a request, commands targeting different managers run in parallel
+        """
+        futures = [self.submit_command(command) for command in command_as_json]
+        return [future.result() for future in futures]
 
+    async def handle_request_async(self, command_as_json) -> List[CommandResult]:
+        """
+        Awaitable variant of handle_request
+        """
+        return list(await asyncio.gather(*(self.handle_command_async(command) for command in command_as_json)))
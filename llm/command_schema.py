@@ -0,0 +1,214 @@
+import ast
+import json
+import logging
+import re
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+NO_ACTION_ANSWER = "Je suis navré, mais cette demande ne correspond à aucune action possible."
+
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+_PARAM = re.compile(r'^(?P<name>\w+)\s*(?::\s*(?P<annotation>[^=]+?))?\s*(?P<default>=.*)?$')
+
+
+class ParamSignature(NamedTuple):
+    name: str
+    kind: Optional[str]  # 'list', 'int', 'str', 'literal' or None when the param is not annotated
+    literals: Optional[frozenset]
+    required: bool
+
+
+class CommandSchema:
+    """
+    The commands the LLM may answer with, generated from the plug documentations: for each manager the
+    documented command names and their params (arity, list/int/str/Literal annotations).
+
+    Validation only does dict lookups and isinstance checks against the signatures compiled at load time.
+    An answer that does not validate gets a single local repair pass (code fences, trailing commas, scalars
+    given for lists, numeric strings, wrong manager name case...); what is still invalid is dropped and the
+    answer falls back to NO_ACTION_ANSWER when no command is left.
+    """
+
+    def __init__(self, signatures: Dict[str, Dict[str, Tuple[ParamSignature, ...]]]):
+        self.signatures = signatures
+        self._managers_by_lowercase_name = {manager_name.lower(): manager_name for manager_name in signatures}
+
+    @classmethod
+    def from_documentation(cls, managers: Iterable[str], plugs_directory: str = 'plugs') -> "CommandSchema":
+        signatures = {}
+        for manager_name in sorted(set(managers)):
+            path = f"{plugs_directory}/{manager_name}_plug/{manager_name}_documentation.json"
+            with open(path, 'r', encoding='utf-8') as documentation_file:
+                documentation = json.load(documentation_file)
+            signatures[manager_name] = {
+                function['name']: tuple(cls.__parse_param(param) for param in function.get('params', []))
+                for function in documentation.get('functions', [])
+            }
+        return cls(signatures)
+
+    def json_schema(self) -> Dict[str, Any]:
+        """
+        JSON schema of an answer, in the subset accepted by the providers structured outputs
+        """
+        scalar = [{"type": "integer"}, {"type": "number"}, {"type": "string"}, {"type": "boolean"}]
+        return {
+            "type": "object",
+            "properties": {
+                "answer": {"type": "string"},
+                "commands": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "manager_name": {"type": "string", "enum": sorted(self.signatures)},
+                            "command_name": {"type": "string", "enum": sorted(
+                                {name for commands in self.signatures.values() for name in commands})},
+                            "params": {"type": "array", "items": {"anyOf": scalar + [
+                                {"type": "array", "items": {"anyOf": scalar}}]}},
+                        },
+                        "required": ["manager_name", "command_name", "params"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["answer", "commands"],
+            "additionalProperties": False,
+        }
+
+    def command_error(self, command: Any) -> Optional[str]:
+        """
+        Why a command does not match the schema, None when it does
+        """
+        if not isinstance(command, dict):
+            return "a command must be an object"
+        commands = self.signatures.get(command.get('manager_name'))
+        if commands is None:
+            return f"unknown manager {command.get('manager_name')!r}"
+        params_signature = commands.get(command.get('command_name'))
+        if params_signature is None:
+            return f"unknown command {command.get('command_name')!r} of {command['manager_name']}"
+        params = command.get('params')
+        if not isinstance(params, list):
+            return "params must be a list"
+        required = sum(1 for param in params_signature if param.required)
+        if not required <= len(params) <= len(params_signature):
+            return f"{command['command_name']} takes {required} to {len(params_signature)} params, not {len(params)}"
+        for param, value in zip(params_signature, params):
+            error = self.__param_error(param, value)
+            if error:
+                return error
+        return None
+
+    def repair_command(self, command: Any) -> Optional[Dict[str, Any]]:
+        """
+        Return the command when it is valid, else its repaired copy, or None when it cannot be repaired
+        """
+        error = self.command_error(command)
+        if error is None:
+            return command
+        if not isinstance(command, dict):
+            logger.warning("Dropped invalid command %s: %s", command, error)
+            return None
+        repaired = dict(command)
+        manager_name = str(repaired.get('manager_name', '')).strip().lower()
+        repaired['manager_name'] = self._managers_by_lowercase_name.get(manager_name, manager_name)
+        repaired['command_name'] = str(repaired.get('command_name', '')).strip()
+        params_signature = self.signatures.get(repaired['manager_name'], {}).get(repaired['command_name'])
+        params = repaired.get('params', [])
+        if params is None:
+            params = []
+        elif not isinstance(params, list):
+            params = [params]
+        if params_signature:
+            # A list param given as its flattened items: [1, 2, 3] instead of [[1, 2, 3]]
+            if (len(params_signature) == 1 and params_signature[0].kind == 'list' and len(params) > 1
+                    and not any(isinstance(value, list) for value in params)):
+                params = [params]
+            params = [self.__repair_value(param, value) for param, value in zip(params_signature, params)] \
+                + params[len(params_signature):]
+        repaired['params'] = params
+
+        error = self.command_error(repaired)
+        if error is not None:
+            logger.warning("Dropped invalid command %s: %s", command, error)
+            return None
+        logger.info("Repaired command %s into %s", command, repaired)
+        return repaired
+
+    def parse_answer(self, text: str) -> Dict[str, Any]:
+        """
+        Parse and validate an LLM answer, repairing it once when needed. Never raises: an answer that cannot
+        be understood becomes the no action answer
+        """
+        answer = self.__load_json(text)
+        if not isinstance(answer, dict):
+            logger.warning("Unusable LLM answer: %s", text)
+            return {"answer": NO_ACTION_ANSWER, "commands": []}
+
+        commands = answer.get('commands')
+        if commands is None:
+            commands = []
+        elif not isinstance(commands, list):
+            commands = [commands]
+        valid_commands = [command for command in map(self.repair_command, commands) if command is not None]
+        answer_text = answer.get('answer')
+        if commands and not valid_commands:
+            answer_text = NO_ACTION_ANSWER
+        elif not isinstance(answer_text, str):
+            answer_text = '' if valid_commands else NO_ACTION_ANSWER
+        return {"answer": answer_text, "commands": valid_commands}
+
+    @staticmethod
+    def __load_json(text: str) -> Any:
+        if not text:
+            return None
+        json_text = text[text.find('{'):text.rfind('}') + 1]
+        try:
+            return json.loads(json_text)
+        except ValueError:
+            pass
+        try:
+            return json.loads(_TRAILING_COMMA.sub(r'\1', json_text))
+        except ValueError:
+            return None
+
+    @staticmethod
+    def __param_error(param: ParamSignature, value: Any) -> Optional[str]:
+        if param.kind == 'list' and not isinstance(value, list):
+            return f"{param.name} must be a list"
+        if param.kind == 'int' and (isinstance(value, bool) or not isinstance(value, int)):
+            return f"{param.name} must be an integer"
+        if param.kind == 'str' and not isinstance(value, str):
+            return f"{param.name} must be a string"
+        if param.kind == 'literal' and value not in param.literals:
+            return f"{param.name} must be one of {sorted(param.literals)}"
+        return None
+
+    @staticmethod
+    def __repair_value(param: ParamSignature, value: Any) -> Any:
+        if param.kind == 'list' and not isinstance(value, list):
+            value = [value]
+        if param.kind == 'list':
+            return [int(item) if isinstance(item, str) and item.strip().isdigit() else item for item in value]
+        if param.kind == 'int' and isinstance(value, (str, float)) and str(value).strip().replace('.', '', 1).isdigit():
+            return int(float(value))
+        if param.kind == 'str' and isinstance(value, (int, float)):
+            return str(value)
+        return value
+
+    @staticmethod
+    def __parse_param(param: str) -> ParamSignature:
+        match = _PARAM.match(param.strip())
+        if match is None:
+            return ParamSignature(param.strip(), None, None, True)
+        annotation = (match.group('annotation') or '').strip()
+        required = match.group('default') is None
+        if annotation.startswith('Literal['):
+            literals = ast.literal_eval(f"({annotation[len('Literal['):-1]},)")
+            return ParamSignature(match.group('name'), 'literal', frozenset(literals), required)
+        if annotation.startswith(('list', 'List')):
+            return ParamSignature(match.group('name'), 'list', None, required)
+        if annotation in ('int', 'str'):
+            return ParamSignature(match.group('name'), annotation, None, required)
+        return ParamSignature(match.group('name'), None, None, required)
@@ -0,0 +1,99 @@
+import logging
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from llm.token_counter import count_tokens
+from services.file_logger import FileLoggerService
+
+logger = logging.getLogger(__name__)
+file_logger = FileLoggerService("logs/llm_prompt.log")
+
+Message = Dict[str, Any]
+
+
+class ConversationHistory:
+    """
+    Messages sent to a chat LLM: a static system prefix (context, configurations, documentations)
+    followed by a sliding window of the most recent turns.
+
+    The window is bounded both in turns and in tokens. Evicted turns are dropped, or folded into a short
+    summary of the previous requests when summarize is enabled. The history can be used from several threads,
+    a hedged call may still be running when the next request is built.
+    """
+
+    SUMMARY_MAX_REQUESTS = 5
+
+    def __init__(self, max_turns: int = 6, max_tokens: int = 1500, summarize: bool = False):
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.summarize = summarize
+        self.system_messages: List[Message] = []
+        self.system_tokens = 0
+        self.turns: Deque[Tuple[Message, Message]] = deque()
+        self.turns_tokens = 0
+        self.evicted_requests: Deque[str] = deque(maxlen=self.SUMMARY_MAX_REQUESTS)
+        self.last_prompt_tokens = 0
+        self._lock = threading.RLock()
+
+    def add_system_message(self, content: str) -> None:
+        self.system_messages.append({"role": "system", "content": content})
+        self.system_tokens += count_tokens(content)
+
+    def build(self, request: str) -> List[Message]:
+        """
+        Return the messages to send for a new request and record the prompt size
+        """
+        with self._lock:
+            messages = list(self.system_messages)
+            summary = self.__summary()
+            if summary:
+                messages.append({"role": "system", "content": summary})
+            for user_message, assistant_message in self.turns:
+                messages.append(user_message)
+                messages.append(assistant_message)
+            messages.append({"role": "user", "content": request})
+
+            self.last_prompt_tokens = (self.system_tokens + count_tokens(summary) + self.turns_tokens
+                                       + count_tokens(request))
+        file_logger.info(f"prompt of {len(messages)} messages: {self.system_tokens} system tokens, "
+                         f"{len(self.turns)} turns of {self.turns_tokens} tokens, {self.last_prompt_tokens} tokens in total")
+        return messages
+
+    def add_turn(self, request: str, answer: str) -> None:
+        with self._lock:
+            self.turns.append(({"role": "user", "content": request}, {"role": "assistant", "content": answer}))
+            self.turns_tokens += count_tokens(request) + count_tokens(answer)
+            while self.turns and (len(self.turns) > self.max_turns or self.turns_tokens > self.max_tokens):
+                user_message, assistant_message = self.turns.popleft()
+                self.turns_tokens -= (count_tokens(user_message["content"])
+                                      + count_tokens(assistant_message["content"]))
+                if self.summarize:
+                    self.evicted_requests.append(user_message["content"])
+
+    def discard_turn(self, request: str) -> bool:
+        """
+        Remove the most recent turn of request, return False when there is none
+        """
+        with self._lock:
+            for index in range(len(self.turns) - 1, -1, -1):
+                user_message, assistant_message = self.turns[index]
+                if user_message["content"] == request:
+                    del self.turns[index]
+                    self.turns_tokens -= count_tokens(request) + count_tokens(assistant_message["content"])
+                    return True
+        return False
+
+    def reset(self) -> None:
+        """
+        Forget every turn, the system prefix is kept
+        """
+        with self._lock:
+            self.turns.clear()
+            self.turns_tokens = 0
+            self.evicted_requests.clear()
+
+    def __summary(self) -> Optional[str]:
+        if not self.evicted_requests:
+            return None
+        return "Demandes précédentes de l'utilisateur, déjà traitées : " + " ; ".join(self.evicted_requests)
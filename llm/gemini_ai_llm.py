@@ -8,44 +8,78 @@ import logging
 logger = logging.getLogger(__name__)
 
 class GeminiAILLM(LLMInterface):
+    MODEL = "gemini-2.5-flash-lite"
+    CHAT_LIFETIME = timedelta(hours=24)
+    # The cached context outlives the chat using it, so a chat never points to an expired cache
+    CACHE_TTL = timedelta(hours=25)
 
     def __init__(self):
         self.client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
         self.chat = None
         self.chat_initialization_timestamp = None
 
-    def add_configuration_file_to_prompt(self, configuration_file):
-        self.llm_context = self.llm_context + f"""
-        This file describes you the configuration of a service manager you have access to. You can use it to understand how you can use it.
-        {configuration_file}
-        """
-
-    def add_manager_documentation_to_prompt(self, manager_file):
-        self.llm_context = self.llm_context + f"""
-        This file describes you all the functions you can use from a specific service manager, with their parameters and descriptions.
-        {manager_file}
-        """
+    def add_plugs_context_to_prompt(self, plugs_context):
+        self.llm_context = f"{self.llm_context}\n\n{plugs_context}"
 
     def interpret_request(self, request):
         self.init_chat_if_needed()
         answer = self.chat.send_message(request)
-        return self.__sanitize_answer(answer.text)
+        self.__record_usage(answer.usage_metadata)
+        return answer.text
+
+    def interpret_request_stream(self, request):
+        self.init_chat_if_needed()
+        usage_metadata = None
+        for chunk in self.chat.send_message_stream(request):
+            usage_metadata = chunk.usage_metadata or usage_metadata
+            if chunk.text:
+                yield chunk.text
+        self.__record_usage(usage_metadata)
 
     def init_chat_if_needed(self):
-        if self.chat is None or (datetime.now() - self.chat_initialization_timestamp) > timedelta(hours=24):
+        if self.chat is None or (datetime.now() - self.chat_initialization_timestamp) > self.CHAT_LIFETIME:
             logger.info("Initializing chat")
-            self.chat = self.client.chats.create(
-                model="gemini-2.5-flash-lite",
-                config=types.GenerateContentConfig(
-                    system_instruction=self.llm_context
-                ),
-            )
+            cached_context = self.__get_cached_context()
+            structured_output = {"response_mime_type": "application/json",
+                                 "response_json_schema": self.response_json_schema()}
+            if cached_context is not None:
+                config = types.GenerateContentConfig(cached_content=cached_context.name, **structured_output)
+            else:
+                config = types.GenerateContentConfig(system_instruction=self.llm_context, **structured_output)
+            self.chat = self.client.chats.create(model=self.MODEL, config=config)
             self.chat_initialization_timestamp = datetime.now()
 
-    @staticmethod
-    def __sanitize_answer(text_answer):
-        if text_answer.startswith("```json"):
-            text_answer = text_answer.replace("```json", "").strip()
-        if text_answer.endswith("```"):
-            text_answer = text_answer[:-3].strip()
-        return text_answer
\ No newline at end of file
+    def __get_cached_context(self):
+        """
+        Return the Gemini cache holding the system context of this prompt version, reusing the one created by a
+        previous run when it still exists. None when caching is unavailable (e.g. context below the minimum size)
+        """
+        display_name = f"alfred-{self.prompt_version}"
+        ttl = f"{int(self.CACHE_TTL.total_seconds())}s"
+        try:
+            for cached_content in self.client.caches.list():
+                if cached_content.display_name == display_name and cached_content.model.endswith(self.MODEL):
+                    logger.info("Reusing the cached context %s", cached_content.name)
+                    return self.client.caches.update(
+                        name=cached_content.name,
+                        config=types.UpdateCachedContentConfig(ttl=ttl)
+                    )
+            cached_content = self.client.caches.create(
+                model=self.MODEL,
+                config=types.CreateCachedContentConfig(
+                    display_name=display_name,
+                    system_instruction=self.llm_context,
+                    ttl=ttl
+                )
+            )
+            logger.info("Created the cached context %s", cached_content.name)
+            return cached_content
+        except Exception:
+            logger.warning("Context caching unavailable, the system context is sent with the chat", exc_info=True)
+            return None
+
+    def __record_usage(self, usage_metadata):
+        if usage_metadata is None:
+            return
+        self.record_usage(usage_metadata.prompt_token_count, usage_metadata.cached_content_token_count,
+                          usage_metadata.candidates_token_count)
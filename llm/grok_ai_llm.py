@@ -1,3 +1,4 @@
+import json
 import logging
 import os
 import threading
@@ -5,6 +6,7 @@ from typing import Any, Dict, List, Optional
 
 import requests
 
+from llm.conversation_history import ConversationHistory
 from llm.llm_abstract_class import LLMInterface
 
 
@@ -21,7 +23,7 @@ class GrokAiLLM(LLMInterface):
     _session_lock = threading.Lock()
     _session_api_key: str = None
 
-    API_URL = "https://api.x.ai/v1/messages"
+    API_URL = "https://api.x.ai/v1/chat/completions"
     MODEL = "grok-2-mini"
     REQUEST_TIMEOUT = (3.05, 30)  # (connect timeout, read timeout)
 
@@ -32,7 +34,7 @@ class GrokAiLLM(LLMInterface):
                     cls._instance = super().__new__(cls)
         return cls._instance
 
-    def __init__(self):
+    def __init__(self, history_max_turns=6, history_max_tokens=1500, summarize_history=False):
         if getattr(self, "_initialized", False):
             return
 
@@ -41,8 +43,8 @@ class GrokAiLLM(LLMInterface):
             raise ValueError("GROK_API_KEY environment variable is not set")
 
         self.session = self._get_or_create_session(self.api_key)
-        self.base_messages: List[Dict[str, Any]] = [{"role": "system", "content": self.llm_context}]
-        self.messages: List[Dict[str, Any]] = list(self.base_messages)
+        self.history = ConversationHistory(history_max_turns, history_max_tokens, summarize_history)
+        self.history.add_system_message(self.llm_context)
 
         self._initialized = True
 
@@ -63,40 +65,73 @@ class GrokAiLLM(LLMInterface):
         assert cls._session is not None
         return cls._session
 
-    def add_configuration_file_to_prompt(self, configuration_file):
-        self._append_system_message(
-            f"""Ce fichier te permet de prendre connaissance, de la configuration d'un des manager de service auquel tu as accès.
-        Tu peux t'en servir pour prendre connaissance de toute la configuration dont tu pourrais avoir besoin
-        {configuration_file}"""
-        )
-
-    def add_manager_documentation_to_prompt(self, manager_file):
-        self._append_system_message(
-            f"""Ce fichier te permet de prendre connaissance, du manager de service auquel tu as accès
-        Tu peux l'utiliser pour t'aider à reconnaître la commande vocale à exécuter etc... chaque méthode documentée est utilisable etc...
-        {manager_file}"""
-        )
-
-    def _append_system_message(self, content: str) -> None:
-        message = {"role": "system", "content": content}
-        self.base_messages.append(message)
-        self.messages.append({"role": "system", "content": content})
+    def add_plugs_context_to_prompt(self, plugs_context):
+        self.history.add_system_message(plugs_context)
 
     def interpret_request(self, request):
-        self.messages.append({"role": "user", "content": request})
-
-        payload = {"model": self.MODEL, "messages": self.messages}
+        payload = {"model": self.MODEL, "messages": self.history.build(request),
+                   "response_format": self.__response_format()}
         try:
-            response = self.session.post(self.API_URL, json=payload, timeout=self.REQUEST_TIMEOUT)
+            response = self.session.post(self.API_URL, json=payload, headers=self.__cache_headers(),
+                                         timeout=self.REQUEST_TIMEOUT)
             response.raise_for_status()
         except requests.RequestException as exc:
             logger.error("Grok API request failed: %s", exc, exc_info=True)
             raise
 
-        answer = self._extract_answer(response.json())
-        self.messages.append({"role": "assistant", "content": answer})
+        response_json = response.json()
+        answer = self._extract_answer(response_json)
+        self.__record_usage(response_json.get("usage"))
+        self.history.add_turn(request, answer)
         return answer
 
+    def interpret_request_stream(self, request):
+        payload = {"model": self.MODEL, "messages": self.history.build(request), "stream": True,
+                   "stream_options": {"include_usage": True}, "response_format": self.__response_format()}
+        try:
+            response = self.session.post(self.API_URL, json=payload, headers=self.__cache_headers(),
+                                         timeout=self.REQUEST_TIMEOUT, stream=True)
+            response.raise_for_status()
+        except requests.RequestException as exc:
+            logger.error("Grok API streaming request failed: %s", exc, exc_info=True)
+            raise
+
+        answer_parts: List[str] = []
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                if chunk.get("usage"):
+                    self.__record_usage(chunk["usage"])
+                choices = chunk.get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    answer_parts.append(delta)
+                    yield delta
+
+        self.history.add_turn(request, "".join(answer_parts))
+
+    def __response_format(self) -> Dict[str, Any]:
+        return {"type": "json_schema",
+                "json_schema": {"name": "assistant_answer", "schema": self.response_json_schema(), "strict": True}}
+
+    def __cache_headers(self) -> Dict[str, str]:
+        """
+        xAI caches the prompt prefix per server, the conversation id keeps every call made with the same
+        prompt version on the server already holding it
+        """
+        return {"x-grok-conv-id": f"alfred-{self.prompt_version}"}
+
+    def __record_usage(self, usage: Optional[Dict[str, Any]]) -> None:
+        if not usage:
+            return
+        details = usage.get("prompt_tokens_details") or {}
+        self.record_usage(usage.get("prompt_tokens"), details.get("cached_tokens"), usage.get("completion_tokens"))
+
     @staticmethod
     def _extract_answer(response_json: Dict[str, Any]) -> str:
         choices = response_json.get("choices")
@@ -127,4 +162,4 @@ class GrokAiLLM(LLMInterface):
         raise ValueError("Invalid Grok response: missing assistant content")
 
     def reset_conversation(self):
-        self.messages = list(self.base_messages)
+        self.history.reset()
@@ -1,10 +1,18 @@
-import json
+import hashlib
 import logging
+import textwrap
 from abc import ABC, abstractmethod
 
+from llm.command_schema import CommandSchema
+from llm.prompt_builder import PromptBuilder
+from services.async_runtime import iterate_blocking, run_blocking
+from services.file_logger import FileLoggerService
+
+usage_file_logger = FileLoggerService("logs/llm_usage.log")
+
 
 class LLMInterface(ABC):
-    llm_context = """
+    llm_context = textwrap.dedent("""
                 You are a voice assistant. Your job is to interpret a single user utterance and map it to one or more commands.
 
                 You have the full list of available managers and their commands, with names, descriptions and parameters.  
@@ -39,42 +47,88 @@ class LLMInterface(ABC):
                 }
                 
                 Your goal is to understand the user’s intent and answer in JSON only, in a concise, structured way, without any noise.
-            """
+            """).strip()
+
+    prompt_fingerprint = None
+    tokens_per_plug = {}
+    last_usage = None
+    command_schema = None
 
     @abstractmethod
     def __init__(self):
         pass
 
     def configure_services_for_prompt(self, services):
-        for service in services:
-            logging.getLogger(__name__).info('Configuring service for prompt : %s', service)
-            self.configure_service_for_prompt(service)
-
-    def configure_service_for_prompt(self, service_name):
-        with open(self.__get_plug_configuration_path(service_name), 'r',
-                  encoding='utf-8') as manager_configuration_file:
-            manager_configuration = json.load(manager_configuration_file)
-            self.add_configuration_file_to_prompt(manager_configuration)
-        with open(self.__get_plug_documentation_path(service_name), 'r', encoding='utf-8') as manager_documentation_file:
-            documentation = manager_documentation_file.read()
-            self.add_manager_documentation_to_prompt(documentation)
-
-    @staticmethod
-    def __get_plug_configuration_path(service_name: str) -> str:
-        return 'plugs/' + service_name + '_plug/' + service_name + '_configuration.json'
-
-    @staticmethod
-    def __get_plug_documentation_path(service_name: str) -> str:
-        return 'plugs/' + service_name + '_plug/' + service_name + '_documentation.json'
+        """
+        Add the compact context of every service to the prompt and fingerprint the result,
+        the fingerprint changes as soon as the system prompt or one of the plug files is edited
+        """
+        logging.getLogger(__name__).info('Configuring services for prompt : %s', services)
+        prompt_builder = PromptBuilder()
+        plugs_context = prompt_builder.build(services)
+        self.tokens_per_plug = prompt_builder.tokens_per_plug
+        self.command_schema = CommandSchema.from_documentation(services)
+        self.prompt_fingerprint = hashlib.sha256(f"{self.llm_context}\n{plugs_context}".encode('utf-8')).hexdigest()
+        self.add_plugs_context_to_prompt(plugs_context)
 
-    @abstractmethod
-    def add_configuration_file_to_prompt(self, configuration_file):
-        pass
+    def response_json_schema(self):
+        """
+        JSON schema the answers must follow, for the providers supporting structured outputs
+        """
+        return self.command_schema.json_schema() if self.command_schema else {"type": "object"}
+
+    @property
+    def prompt_version(self):
+        """
+        Short hash of the static system prefix, used to name the provider side caches of this prefix
+        """
+        return self.prompt_fingerprint[:16] if self.prompt_fingerprint else 'unversioned'
+
+    def record_usage(self, prompt_tokens, cached_tokens, output_tokens):
+        """
+        Keep and log the token usage reported by the provider for the last call
+        """
+        prompt_tokens = prompt_tokens or 0
+        cached_tokens = cached_tokens or 0
+        self.last_usage = {
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "uncached_tokens": prompt_tokens - cached_tokens,
+            "output_tokens": output_tokens or 0,
+        }
+        usage_file_logger.info(f"{type(self).__name__} prompt {self.prompt_version}: {prompt_tokens} prompt tokens "
+                               f"({cached_tokens} cached, {prompt_tokens - cached_tokens} uncached), "
+                               f"{self.last_usage['output_tokens']} output tokens")
+
+    def discard_turn(self, request):
+        """
+        Forget the turn of request kept in the conversation history, its answer was not used (a hedged call that
+        lost the race). Backends without a history have nothing to forget
+        """
+        history = getattr(self, 'history', None)
+        if history is not None:
+            history.discard_turn(request)
 
     @abstractmethod
-    def add_manager_documentation_to_prompt(self, manager_file):
+    def add_plugs_context_to_prompt(self, plugs_context):
         pass
 
     @abstractmethod
     def interpret_request(self, request):
         pass
+
+    def interpret_request_stream(self, request):
+        """
+        Yield the answer of the LLM chunk by chunk, backends without streaming support yield it in one piece
+        """
+        yield self.interpret_request(request)
+
+    async def interpret_request_async(self, request):
+        """
+        Awaitable variant of interpret_request, the blocking SDK call runs on the bounded blocking pool
+        """
+        return await run_blocking(self.interpret_request, request)
+
+    async def interpret_request_stream_async(self, request):
+        async for chunk in iterate_blocking(self.interpret_request_stream(request)):
+            yield chunk
@@ -0,0 +1,286 @@
+import contextvars
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Deque, Dict, List, Optional
+
+from llm.llm_abstract_class import LLMInterface
+from services.file_logger import FileLoggerService
+from services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+file_logger = FileLoggerService("logs/llm_router.log")
+
+
+class BackendStats:
+    """
+    Rolling latencies and outcomes of the last window calls made to a backend
+    """
+
+    def __init__(self, window: int = 50):
+        self.latencies_ms: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.last_failure_at = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency_ms: float, success: bool) -> None:
+        with self._lock:
+            self.outcomes.append(success)
+            if success:
+                self.latencies_ms.append(latency_ms)
+            else:
+                self.last_failure_at = time.monotonic()
+
+    @property
+    def sampled(self) -> bool:
+        with self._lock:
+            return bool(self.latencies_ms)
+
+    def percentile(self, percentile: float) -> float:
+        with self._lock:
+            latencies = sorted(self.latencies_ms)
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(percentile / 100 * len(latencies)))]
+
+    @property
+    def error_rate(self) -> float:
+        with self._lock:
+            return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"calls": len(self.outcomes), "p50_ms": self.percentile(50), "p95_ms": self.percentile(95),
+                "error_rate": self.error_rate}
+
+
+class _Race:
+    """
+    Calls of the backends for one request, the first one claiming the race wins and the others lost it
+    """
+
+    def __init__(self):
+        self.winner: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def claim(self, name: str) -> bool:
+        with self._lock:
+            if self.winner is None:
+                self.winner = name
+            return self.winner == name
+
+
+# Put in the chunk queue by a streaming call once it is over
+_STREAM_END = object()
+
+
+class LLMRouter(LLMInterface):
+    """
+    LLMInterface spreading the requests over several backends.
+
+    Every request goes to the fastest healthy backend (lowest rolling p50), backends without any latency sample
+    yet come after the sampled ones in their configuration order. A backend is unhealthy while its error rate is
+    above max_error_rate, and is tried again once unhealthy_cooldown seconds have passed since its last failure.
+    When hedge_delay is set and the first backend has not answered after hedge_delay seconds, the same request is
+    sent to the next backend: the first valid JSON answer wins, for a streaming request the first backend to
+    yield a chunk wins and is the only one streamed. Failed calls fall back to the next backend.
+
+    The recorded latency is the time to the whole answer for interpret_request and the time to the first chunk
+    for a stream, measured on the call and not on the consumer. A losing call is stopped as soon as possible (a
+    stream is closed at its first chunk) and its turn is removed from the history of its backend, so a stateful
+    backend never keeps the answer of a request it did not serve.
+    """
+
+    def __init__(self, backends: Dict[str, LLMInterface], hedge_delay: Optional[float] = None, window: int = 50,
+                 max_error_rate: float = 0.5, unhealthy_cooldown: float = 60):
+        if not backends:
+            raise ValueError("The LLM router needs at least one backend")
+        self.backends = backends
+        self.hedge_delay = hedge_delay
+        self.max_error_rate = max_error_rate
+        self.unhealthy_cooldown = unhealthy_cooldown
+        self.stats = {name: BackendStats(window) for name in backends}
+        self.last_backend: Optional[str] = None
+        self._executor = ThreadPoolExecutor(max_workers=2 * len(backends), thread_name_prefix="llm-router")
+
+    def configure_services_for_prompt(self, services):
+        for backend in self.backends.values():
+            backend.configure_services_for_prompt(services)
+        first_backend = next(iter(self.backends.values()))
+        self.prompt_fingerprint = first_backend.prompt_fingerprint
+        self.tokens_per_plug = first_backend.tokens_per_plug
+        self.command_schema = first_backend.command_schema
+
+    def add_plugs_context_to_prompt(self, plugs_context):
+        for backend in self.backends.values():
+            backend.add_plugs_context_to_prompt(plugs_context)
+
+    def ranked_backends(self) -> List[str]:
+        """
+        Backend names from the most to the least suitable: healthy ones first, then by rolling p50
+        """
+        now = time.monotonic()
+
+        def rank(name):
+            stats = self.stats[name]
+            unhealthy = (stats.error_rate > self.max_error_rate
+                         and now - stats.last_failure_at < self.unhealthy_cooldown)
+            return unhealthy, not stats.sampled, stats.percentile(50)
+
+        return sorted(self.backends, key=rank)
+
+    def interpret_request(self, request):
+        remaining = self.ranked_backends()
+        pending = {}
+        race = _Race()
+
+        def call_next_backend():
+            name = remaining.pop(0)
+            hedged = bool(pending)
+            future = self._executor.submit(contextvars.copy_context().run, self.__timed_call, name, request, race,
+                                           hedged)
+            pending[future] = name
+
+        call_next_backend()
+        while pending:
+            hedging = self.hedge_delay is not None and remaining
+            done, _ = wait(pending, timeout=self.hedge_delay if hedging else None, return_when=FIRST_COMPLETED)
+            if not done:
+                logger.info("No answer after %s s, hedging request \"%s\" to %s", self.hedge_delay, request,
+                            remaining[0])
+                call_next_backend()
+                continue
+            for future in done:
+                name = pending.pop(future)
+                answer = future.result()
+                if answer is not None:
+                    self.__use_answer_of(name)
+                    return answer
+            if not pending and remaining:
+                call_next_backend()
+        raise RuntimeError(f"No LLM backend could interpret \"{request}\"")
+
+    def interpret_request_stream(self, request):
+        remaining = self.ranked_backends()
+        running = set()
+        race = _Race()
+        chunks: queue.Queue = queue.Queue()
+
+        def stream_next_backend():
+            name = remaining.pop(0)
+            hedged = bool(running)
+            running.add(name)
+            self._executor.submit(contextvars.copy_context().run, self.__stream_call, name, request, race, chunks,
+                                  hedged)
+
+        stream_next_backend()
+        while True:
+            hedging = race.winner is None and self.hedge_delay is not None and remaining
+            try:
+                name, item = chunks.get(timeout=self.hedge_delay if hedging else None)
+            except queue.Empty:
+                logger.info("No chunk after %s s, hedging request \"%s\" to %s", self.hedge_delay, request,
+                            remaining[0])
+                stream_next_backend()
+                continue
+            if item is _STREAM_END:
+                running.discard(name)
+                if name == race.winner:
+                    self.__use_answer_of(name)
+                    return
+                if race.winner is None and not running:
+                    if not remaining:
+                        raise RuntimeError(f"No LLM backend could interpret \"{request}\"")
+                    stream_next_backend()
+            elif isinstance(item, Exception):
+                if name == race.winner:
+                    raise item
+            elif name == race.winner:
+                yield item
+
+    def reset_conversation(self):
+        for backend in self.backends.values():
+            if hasattr(backend, 'reset_conversation'):
+                backend.reset_conversation()
+
+    def routing_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.as_dict() for name, stats in self.stats.items()}
+
+    def __timed_call(self, name: str, request: str, race: _Race, hedged: bool = False) -> Optional[str]:
+        """
+        Call a backend and return its answer, or None when it failed, did not answer valid JSON or lost the race
+        """
+        with tracer.span("llm.backend", backend=name, hedged=hedged) as span:
+            start = time.perf_counter()
+            try:
+                answer = self.backends[name].interpret_request(request)
+            except Exception as exc:
+                logger.exception("LLM backend %s failed", name)
+                span.set_error(exc)
+                self.__record(name, start, False)
+                return None
+            valid = self.__is_valid_answer(answer)
+            span.set_attribute("valid", valid)
+            self.__record(name, start, valid)
+            if valid and not race.claim(name):
+                span.set_attribute("lost", True)
+                self.backends[name].discard_turn(request)
+                return None
+            return answer if valid else None
+
+    def __stream_call(self, name: str, request: str, race: _Race, chunks: queue.Queue, hedged: bool) -> None:
+        """
+        Stream a backend into chunks as (name, chunk) items, then (name, exception) if it failed and (name,
+        _STREAM_END). The first chunk claims the race, a backend that lost it is closed without streaming further.
+        A stream closed or failing before its end never records its turn, only an empty stream must discard it
+        """
+        with tracer.span("llm.backend", backend=name, hedged=hedged, streamed=True) as span:
+            start = time.perf_counter()
+            stream = self.backends[name].interpret_request_stream(request)
+            won = False
+            try:
+                for chunk in stream:
+                    if not won:
+                        self.__record(name, start, True)
+                        if not race.claim(name):
+                            span.set_attribute("lost", True)
+                            break
+                        won = True
+                    chunks.put((name, chunk))
+                else:
+                    if not won:
+                        # An empty stream is no answer
+                        self.__record(name, start, False)
+                        self.backends[name].discard_turn(request)
+            except Exception as exc:
+                logger.exception("LLM backend %s failed to stream", name)
+                span.set_error(exc)
+                self.__record(name, start, False)
+                chunks.put((name, exc))
+            finally:
+                stream.close()
+                chunks.put((name, _STREAM_END))
+
+    def __record(self, name: str, start: float, success: bool) -> None:
+        latency_ms = (time.perf_counter() - start) * 1000
+        stats = self.stats[name]
+        stats.record(latency_ms, success)
+        file_logger.info(f"{name} {'answered' if success else 'failed'} in {latency_ms:.0f} ms, "
+                         f"p50 {stats.percentile(50):.0f} ms, p95 {stats.percentile(95):.0f} ms, "
+                         f"error rate {stats.error_rate:.0%}")
+
+    def __use_answer_of(self, name: str) -> None:
+        self.last_backend = name
+        self.last_usage = self.backends[name].last_usage
+
+    @staticmethod
+    def __is_valid_answer(answer: Optional[str]) -> bool:
+        if not answer:
+            return False
+        try:
+            return isinstance(json.loads(answer[answer.find('{'):answer.rfind('}') + 1]), dict)
+        except ValueError:
+            return False
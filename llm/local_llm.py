@@ -0,0 +1,142 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+from llm.conversation_history import ConversationHistory
+from llm.llm_abstract_class import LLMInterface
+
+try:
+    from llama_cpp import Llama, LlamaRAMCache
+except ImportError:  # pragma: no cover - optional dependency, the local backend is then unavailable
+    Llama = None
+    LlamaRAMCache = None
+
+logger = logging.getLogger(__name__)
+
+# Put in the chunk queue once the generation of a streamed answer is over
+_GENERATION_END = object()
+
+
+class LocalLLM(LLMInterface):
+    """
+    LLMInterface running a small quantised GGUF model on the CPU with llama.cpp, so requests are interpreted
+    without leaving the house and keep working when the internet is down.
+
+    The model is loaded once per process and warmed up as soon as the prompt is configured, the evaluated system
+    prefix is then kept in a RAM cache and reused by every request. Answers are constrained to the JSON object
+    of the command schema.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self, model_path=None, n_ctx=4096, n_threads=None, max_tokens=256, cache_size_mb=512,
+                 history_max_turns=2, history_max_tokens=400):
+        if getattr(self, "_initialized", False):
+            return
+        if Llama is None:
+            raise ImportError("llama-cpp-python is required by the local LLM backend")
+        model_path = model_path or os.environ.get("LOCAL_LLM_MODEL_PATH")
+        if not model_path or not os.path.exists(model_path):
+            raise FileNotFoundError(f"Local LLM model not found: {model_path}")
+
+        start = time.perf_counter()
+        self.model = Llama(model_path=model_path, n_ctx=n_ctx, n_threads=n_threads, verbose=False)
+        self.model.set_cache(LlamaRAMCache(capacity_bytes=cache_size_mb * 1024 * 1024))
+        logger.info("Local model %s loaded in %.0f ms", model_path, (time.perf_counter() - start) * 1000)
+        self.max_tokens = max_tokens
+        self.history = ConversationHistory(history_max_turns, history_max_tokens)
+        self.history.add_system_message(self.llm_context)
+        # llama.cpp contexts are not thread safe, hedged and concurrent requests are serialized
+        self._model_lock = threading.Lock()
+        self._initialized = True
+
+    def configure_services_for_prompt(self, services):
+        super().configure_services_for_prompt(services)
+        self.warm_up()
+
+    def add_plugs_context_to_prompt(self, plugs_context):
+        self.history.add_system_message(plugs_context)
+
+    def warm_up(self):
+        """
+        Evaluate the system prefix once so the first real request only pays for its own tokens
+        """
+        start = time.perf_counter()
+        with self._model_lock:
+            self.model.create_chat_completion(messages=self.history.build("ping"), max_tokens=1)
+        logger.info("Local model warmed up in %.0f ms", (time.perf_counter() - start) * 1000)
+
+    def interpret_request(self, request):
+        with self._model_lock:
+            response = self.model.create_chat_completion(**self.__completion_parameters(request))
+        answer = response["choices"][0]["message"]["content"]
+        self.__record_usage(response.get("usage"))
+        self.history.add_turn(request, answer)
+        return answer
+
+    def interpret_request_stream(self, request):
+        """
+        The answer is generated on its own thread into a queue, so the model lock is never held while the consumer
+        handles a chunk. A consumer closing the stream stops the generation and nothing is kept in the history
+        """
+        chunks: queue.Queue = queue.Queue()
+        cancelled = threading.Event()
+        threading.Thread(target=self.__generate, args=(request, chunks, cancelled), name="local-llm-stream",
+                         daemon=True).start()
+        try:
+            while True:
+                item = chunks.get()
+                if item is _GENERATION_END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            cancelled.set()
+
+    def __generate(self, request, chunks: queue.Queue, cancelled: threading.Event) -> None:
+        answer_parts = []
+        try:
+            with self._model_lock:
+                stream = self.model.create_chat_completion(stream=True, **self.__completion_parameters(request))
+                try:
+                    for chunk in stream:
+                        if cancelled.is_set():
+                            return
+                        delta = chunk["choices"][0].get("delta", {}).get("content")
+                        if delta:
+                            answer_parts.append(delta)
+                            chunks.put(delta)
+                finally:
+                    stream.close()
+            self.history.add_turn(request, "".join(answer_parts))
+        except Exception as exc:
+            logger.exception("Local model failed to stream the answer of \"%s\"", request)
+            chunks.put(exc)
+        finally:
+            chunks.put(_GENERATION_END)
+
+    def reset_conversation(self):
+        self.history.reset()
+
+    def __completion_parameters(self, request):
+        return {
+            "messages": self.history.build(request),
+            "response_format": {"type": "json_object", "schema": self.response_json_schema()},
+            "temperature": 0,
+            "max_tokens": self.max_tokens,
+        }
+
+    def __record_usage(self, usage):
+        if usage:
+            self.record_usage(usage.get("prompt_tokens"), 0, usage.get("completion_tokens"))
@@ -1,46 +1,78 @@
 import os
 from openai import OpenAI
 
+from llm.conversation_history import ConversationHistory
 from llm.llm_abstract_class import LLMInterface
 
 
 class OpenAiLLM(LLMInterface):
-    def __init__(self):
+    MODEL = "gpt-4.1-nano"
+
+    def __init__(self, history_max_turns=6, history_max_tokens=1500, summarize_history=False):
         self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-        self.base_prompt = [{"role": "system", "content": self.llm_context}]
-        self.messages = list(self.base_prompt)
-
-    def add_configuration_file_to_prompt(self, configuration_file):
-        self.messages.append({"role": "system", "content":
-            f"""Ce fichier te permet de prendre connaissance, de la configuration d'un des manager de service auquel tu as accès.
-                Tu peux t'en servir pour prendre connaissance de toute la configuration dont tu pourrais avoir besoin
-             {configuration_file}"""
-        })
-
-    def add_manager_documentation_to_prompt(self, manager_file):
-        self.messages.append({"role": "system", "content":
-            f"""Ce fichier te permet de prendre connaissance, du manager de service auquel tu as accès
-                Tu peux l'utiliser pour t'aider à reconnaître la commande vocale à exécuter etc... chaque méthode documentée est utilisable etc...
-             {manager_file}"""
-        })
+        self.history = ConversationHistory(history_max_turns, history_max_tokens, summarize_history)
+        self.history.add_system_message(self.llm_context)
 
-    def interpret_request(self, request):
-        # Append the new user message to the persistent conversation
-        self.messages.append({"role": "user", "content": request})
+    def add_plugs_context_to_prompt(self, plugs_context):
+        self.history.add_system_message(plugs_context)
 
+    def interpret_request(self, request):
         # Note: gpt-5-nano does not accept an explicit temperature; only the default (1) is supported.
         response = self.client.chat.completions.create(
-            model="gpt-4.1-nano",
-            messages=self.messages
+            model=self.MODEL,
+            messages=self.history.build(request),
+            response_format=self.__response_format(),
+            extra_body=self.__cache_parameters()
         )
 
         answer = response.choices[0].message.content
+        self.__record_usage(response.usage)
 
-        # Persist assistant answer inside the ongoing conversation for future turns
-        self.messages.append({"role": "assistant", "content": answer})
+        # Persist the turn inside the bounded conversation window for future requests
+        self.history.add_turn(request, answer)
 
         return answer
 
+    def interpret_request_stream(self, request):
+        stream = self.client.chat.completions.create(
+            model=self.MODEL,
+            messages=self.history.build(request),
+            stream=True,
+            stream_options={"include_usage": True},
+            response_format=self.__response_format(),
+            extra_body=self.__cache_parameters()
+        )
+
+        answer_parts = []
+        for chunk in stream:
+            if chunk.usage is not None:
+                self.__record_usage(chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                answer_parts.append(delta)
+                yield delta
+
+        self.history.add_turn(request, "".join(answer_parts))
+
+    def __response_format(self):
+        return {"type": "json_schema",
+                "json_schema": {"name": "assistant_answer", "schema": self.response_json_schema(), "strict": True}}
+
+    def __cache_parameters(self):
+        """
+        The system messages always come first and are byte-identical between calls, so OpenAI caches them
+        automatically; the cache key routes every call made with the same prompt version to the same cache
+        """
+        return {"prompt_cache_key": f"alfred-{self.prompt_version}"}
+
+    def __record_usage(self, usage):
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.record_usage(usage.prompt_tokens, getattr(details, "cached_tokens", 0), usage.completion_tokens)
+
     def reset_conversation(self):
         """Reset the persistent conversation to the initial base prompt."""
-        self.messages = list(self.base_prompt)
+        self.history.reset()
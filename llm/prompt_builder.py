@@ -0,0 +1,108 @@
+import json
+import logging
+from typing import Any, Callable, Dict, Iterable, List
+
+from llm.token_counter import count_tokens
+from services.file_logger import FileLoggerService
+
+logger = logging.getLogger(__name__)
+file_logger = FileLoggerService("logs/llm_prompt.log")
+
+# Configuration keys the LLM never needs: connection details, secrets and tuning of the plugs
+PROMPT_EXCLUDED_KEYS = frozenset({
+    'manager_name', 'manager_description',
+    'ip', 'bridge_ip', 'url', 'token', 'access_token',
+    'connect_timeout', 'read_timeout', 'max_retries', 'retry_backoff', 'pool_size', 'use_websocket',
+    'state_cache_max_age', 'max_commands_per_second', 'group_command_cost', 'command_timeout',
+})
+
+PLUGS_CONTEXT_PREAMBLE = ("Available managers as JSON, manager_name -> description, configuration "
+                          "and commands (signature -> usage):")
+
+
+def _minify(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+def _compact_hue_configuration(configuration: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Lights grouped by room as id -> name, the paired lights as groups and the details only for the lights having some
+    """
+    rooms: Dict[str, Dict[str, str]] = {}
+    details: Dict[str, str] = {}
+    paired_groups = set()
+    for light in configuration.get('hue_lights', []):
+        rooms.setdefault(light['room'], {})[str(light['id'])] = light['name']
+        if light.get('details'):
+            details[str(light['id'])] = light['details']
+        if light.get('paired'):
+            paired_groups.add(tuple(sorted({int(light['id']), *map(int, light['paired'])})))
+    compacted = {'lights_by_room': rooms}
+    if paired_groups:
+        compacted['paired_lights'] = [list(group) for group in sorted(paired_groups)]
+    if details:
+        compacted['details'] = details
+    return compacted
+
+
+def _compact_roborock_configuration(configuration: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rooms as name -> ids, a room can be split in several segments
+    """
+    rooms: Dict[str, List[int]] = {}
+    for room in configuration.get('rooms', []):
+        rooms.setdefault(room['name'], []).append(int(room['id']))
+    return {'rooms': {name: sorted(ids) for name, ids in rooms.items()}}
+
+
+CONFIGURATION_COMPACTORS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    'hue': _compact_hue_configuration,
+    'roborock': _compact_roborock_configuration,
+}
+
+
+class PromptBuilder:
+    """
+    Build the part of the system prompt describing the plugs: one canonical, minified JSON document holding,
+    for each manager, its description, the configuration the LLM needs and its commands.
+
+    The output only depends on the plug files and not on their formatting or key order, so the prompt stays
+    byte-identical as long as the plugs do not change.
+    """
+
+    def __init__(self, plugs_directory: str = 'plugs'):
+        self.plugs_directory = plugs_directory
+        self.tokens_per_plug: Dict[str, int] = {}
+
+    def build(self, managers: Iterable[str]) -> str:
+        plugs = {}
+        for manager_name in sorted(set(managers)):
+            plugs[manager_name] = self.plug_context(manager_name)
+            self.tokens_per_plug[manager_name] = count_tokens(_minify(plugs[manager_name]))
+        plugs_context = f"{PLUGS_CONTEXT_PREAMBLE}\n{_minify(plugs)}"
+        file_logger.info(f"plugs context of {count_tokens(plugs_context)} tokens, per plug: {self.tokens_per_plug}")
+        return plugs_context
+
+    def plug_context(self, manager_name: str) -> Dict[str, Any]:
+        configuration = self.__load(manager_name, 'configuration')
+        documentation = self.__load(manager_name, 'documentation')
+        compact_configuration = CONFIGURATION_COMPACTORS.get(manager_name, self.__strip_excluded_keys)(configuration)
+        context = {
+            'description': configuration.get('manager_description') or documentation.get('description', ''),
+            'commands': {
+                f"{function['name']}({', '.join(function['params'])})": ' '.join(function['usage'].split())
+                for function in documentation.get('functions', [])
+            },
+        }
+        if compact_configuration:
+            context['configuration'] = compact_configuration
+        return context
+
+    @staticmethod
+    def __strip_excluded_keys(configuration: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in configuration.items() if key not in PROMPT_EXCLUDED_KEYS}
+
+    def __load(self, manager_name: str, kind: str) -> Dict[str, Any]:
+        path = f"{self.plugs_directory}/{manager_name}_plug/{manager_name}_{kind}.json"
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
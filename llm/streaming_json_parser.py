@@ -0,0 +1,126 @@
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingAnswerParser:
+    """
+    Incremental parser of the {"answer": ..., "commands": [...]} object produced by the LLM.
+
+    Chunks are scanned as they arrive: every object of the "commands" list is handed to on_command as soon as
+    its closing brace is received and the "answer" text is handed to on_answer as soon as its string closes.
+    When on_answer_delta is given, it also receives the answer text piece by piece while the string is received.
+    Anything written before the first opening brace (a code fence for instance) is ignored.
+    """
+
+    def __init__(self, on_command: Callable[[Dict[str, Any]], None], on_answer: Callable[[str], None],
+                 on_answer_delta: Optional[Callable[[str], None]] = None):
+        self.on_command = on_command
+        self.on_answer = on_answer
+        self.on_answer_delta = on_answer_delta
+        self.text = ''
+        self._position = 0
+        # One entry per open container: [kind, expecting_key, current_key]
+        self._stack: List[list] = []
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._command_start: Optional[int] = None
+        self._in_answer = False
+        self._answer_emitted = 0
+        self._finished = False
+
+    def feed(self, chunk: str) -> None:
+        if not chunk:
+            return
+        self.text += chunk
+        text = self.text
+        while self._position < len(text) and not self._finished:
+            self.__consume(text, self._position)
+            self._position += 1
+        if self._in_answer:
+            self.__emit_answer_delta(text[self._string_start + 1:self._position])
+
+    def __consume(self, text: str, index: int) -> None:
+        char = text[index]
+        if self._in_string:
+            if self._escaped:
+                self._escaped = False
+            elif char == '\\':
+                self._escaped = True
+            elif char == '"':
+                self._in_string = False
+                self.__close_string(text, index)
+            return
+
+        if not self._stack:
+            if char == '{':
+                self._stack.append(['{', True, None])
+            return
+
+        container = self._stack[-1]
+        if char == '"':
+            self._in_string = True
+            self._string_start = index
+            self._in_answer = (self.on_answer_delta is not None and len(self._stack) == 1
+                               and not container[1] and container[2] == 'answer')
+        elif char in '{[':
+            if self.__in_commands_list() and char == '{':
+                self._command_start = index
+            self._stack.append([char, char == '{', None])
+        elif char in '}]':
+            self._stack.pop()
+            if not self._stack:
+                self._finished = True
+            elif char == '}' and self._command_start is not None and self.__in_commands_list():
+                self.__emit_command(text[self._command_start:index + 1])
+                self._command_start = None
+        elif char == ':' and container[0] == '{':
+            container[1] = False
+        elif char == ',' and container[0] == '{':
+            container[1] = True
+
+    def __close_string(self, text: str, index: int) -> None:
+        container = self._stack[-1]
+        if container[0] != '{':
+            return
+        raw_string = text[self._string_start:index + 1]
+        if container[1]:
+            container[2] = json.loads(raw_string)
+        elif len(self._stack) == 1 and container[2] == 'answer':
+            answer = json.loads(raw_string)
+            if self._in_answer:
+                self._in_answer = False
+                if len(answer) > self._answer_emitted:
+                    self.on_answer_delta(answer[self._answer_emitted:])
+            self.on_answer(answer)
+
+    def __emit_answer_delta(self, raw_partial: str) -> None:
+        # The partial string may end in the middle of an escape sequence, which is left for the next chunk
+        escape_start = raw_partial.rfind('\\', max(0, len(raw_partial) - 6))
+        for end in (len(raw_partial), escape_start):
+            if end < 0:
+                continue
+            try:
+                partial = json.loads(f'"{raw_partial[:end]}"')
+                break
+            except ValueError:
+                continue
+        else:
+            return
+        if len(partial) > self._answer_emitted:
+            self.on_answer_delta(partial[self._answer_emitted:])
+            self._answer_emitted = len(partial)
+
+    def __in_commands_list(self) -> bool:
+        return len(self._stack) == 2 and self._stack[0][2] == 'commands' and self._stack[1][0] == '['
+
+    def __emit_command(self, raw_command: str) -> None:
+        try:
+            command = json.loads(raw_command)
+        except ValueError:
+            logger.error("Unable to parse the streamed command %s", raw_command)
+            return
+        self.on_command(command)
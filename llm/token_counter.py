@@ -0,0 +1,26 @@
+import logging
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency, tokens are estimated instead
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+_encoding = None
+if tiktoken is not None:
+    try:
+        _encoding = tiktoken.get_encoding("o200k_base")
+    except Exception:  # pragma: no cover - the encoding file could not be downloaded
+        logger.warning("tiktoken encoding unavailable, token counts will be estimated")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a text with tiktoken when available, otherwise estimate them (about 4 characters per token)
+    """
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
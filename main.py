@@ -1,78 +1,184 @@
+import asyncio
 import sys
 import logging
 import json
-
-import speech_recognition as sr
+import time
 
 from command_interpreter import CommandInterpreter
+from llm.command_schema import NO_ACTION_ANSWER
+from services.audio_capture import AudioCapture, VoiceActivityDetector
+from services.async_runtime import configure_blocking_pool, run_blocking
 from services.command_understander import CommandUnderstander
-from services.file_logger import FileLoggerService
+from services.intent_matcher import STOCK_ANSWERS
 from services.sentry_service import SentryService
+from services.speech_to_text import SpeechToTextError, create_speech_to_text
+from services.text_normalizer import SPOKEN_FILLER_WORDS, tokenize
+from services.tracing import configure_tracing, tracer
+from services.tts_audio_cache import TtsAudioCache
+from services.voice_pipeline import VoicePipeline
+from services.wake_word_detector import WakeWordDetector
 from speaker import Speaker
-from datetime import datetime
 
 logger = logging.getLogger(__name__)
-file_logger = FileLoggerService("logs/stt.log")
 
 file_path = 'configuration.json'
 
+STT_SAMPLE_RATE = 16000
+
 
 class Main:
     def __init__(self):
         with open(file_path, 'r', encoding='utf-8') as configuration_file:
             self.configuration = json.load(configuration_file)
             self.ci = CommandInterpreter(self.configuration)
-            self.speaker = Speaker()
+            self.speaker = self.__create_speaker()
             self.command_understanding = CommandUnderstander(configuration=self.configuration)
+            self.speech_to_text = create_speech_to_text(
+                self.configuration,
+                on_partial=lambda partial: logger.debug("Partial transcript: %s", partial)
+            )
+            self.wake_word_detector = self.__create_wake_word_detector()
+
+    def __create_speaker(self):
+        tts_cache_configuration = self.configuration.get('tts_cache', {})
+        if not tts_cache_configuration.get('enabled', True):
+            return Speaker()
+        audio_cache = TtsAudioCache(
+            directory=tts_cache_configuration.get('path', 'cache/tts'),
+            memory_max_bytes=tts_cache_configuration.get('memory_max_mb', 16) * 1024 * 1024,
+            disk_max_bytes=tts_cache_configuration.get('disk_max_mb', 128) * 1024 * 1024
+        )
+        return Speaker(audio_cache, prewarm_phrases=[*STOCK_ANSWERS.values(), NO_ACTION_ANSWER])
 
     def main(self):
         SentryService()
-        recognizer = sr.Recognizer()
+        tracing_configuration = self.configuration.get('tracing', {})
+        configure_tracing(tracing_configuration.get('path', 'logs/traces.jsonl'),
+                          tracing_configuration.get('enabled', True))
+        configure_blocking_pool(self.configuration.get('blocking_workers', 8))
         if "--chat" in sys.argv:
             self.test_chat()
         else:
-            self.constant_listening(recognizer)
+            self.constant_listening()
 
     def __handle_command(self, command):
-        llm_answer_as_json = self.command_understanding.interpret_and_jsonify(command_phrase=command)
-        if 'commands' in llm_answer_as_json:
-            logger.info("Commands to execute: %s", llm_answer_as_json['commands'])
-            self.ci.handle_request(llm_answer_as_json['commands'])
-        self.speaker.say(llm_answer_as_json['answer'])
-
-    def constant_listening(self, recognizer):
-        with sr.Microphone() as source:
-            logger.info("Calibrating microphone... Please wait.")
-            recognizer.adjust_for_ambient_noise(source, duration=5)
-            # Increase sensitivity for distant speech
-            # Disable dynamic adjustment so our manual threshold stays fixed
-            recognizer.dynamic_energy_threshold = False
-            # Lower the threshold to be more sensitive to quieter voices
-            # (typical values range widely; keeping a sensible floor)
-            current_threshold = recognizer.energy_threshold
-            recognizer.energy_threshold = max(50, int(current_threshold * 0.6))
-            # Make VAD less strict so short gaps don't cut speech
-            recognizer.pause_threshold = 0.5
-            recognizer.non_speaking_duration = 0.2
-            logger.info("Microphone calibrated. Start speaking.")
-
-            while True:
-                try:
-                    audio = recognizer.listen(source, timeout=2, phrase_time_limit=12)
-                    start = datetime.now()
-                    text = recognizer.recognize_google(audio, language="fr-FR")
-                    end = datetime.now()
-                    delta = end - start
-                    file_logger.info(f"{end} transcript command in {delta.total_seconds() * 1000} milliseconds", )
-                    if (self.configuration['assistant_name'] in text):
-                        self.__handle_command(text)
-
-                except sr.WaitTimeoutError:
-                    logger.warning("Listening timed out while waiting for phrase to start")
-                except sr.UnknownValueError:
-                    logger.warning("Google Speech Recognition could not understand audio")
-                except sr.RequestError as e:
-                    logger.error("Could not request results from Google Speech Recognition service; %s", e)
+        with tracer.activate(tracer.start_trace("chat")):
+            llm_answer_as_json = self.command_understanding.interpret_and_dispatch(
+                command_phrase=command,
+                on_command=self.ci.submit_command,
+                on_answer=lambda answer: logger.info("Answer: %s", answer)
+            )
+            self.speaker.say(llm_answer_as_json['answer'])
+
+    def __create_wake_word_detector(self):
+        """
+        Local wake word detection, when it is unavailable every phrase is transcribed and filtered on the transcript
+        """
+        wake_word_configuration = self.configuration.get('wake_word', {})
+        if not wake_word_configuration.get('enabled', True):
+            return None
+        model_path = wake_word_configuration.get(
+            'model_path', self.configuration.get('speech_to_text', {}).get('vosk', {}).get('model_path'))
+        try:
+            return WakeWordDetector(
+                self.configuration['assistant_name'],
+                model_path,
+                sample_rate=STT_SAMPLE_RATE,
+                armed_seconds=wake_word_configuration.get('armed_seconds', 8),
+                # Barge-in: the assistant stops talking as soon as it is called
+                on_detection=self.speaker.stop
+            )
+        except Exception:
+            logger.exception("Wake word detection unavailable, every phrase will be transcribed")
+            return None
+
+    def __transcribe(self, pcm):
+        with tracer.span("stt", engine=self.speech_to_text.name) as span:
+            try:
+                text = self.speech_to_text.transcribe(pcm, STT_SAMPLE_RATE)
+            except SpeechToTextError as e:
+                span.set_error(e)
+                logger.error("%s", e)
+                return None
+            span.set_attribute("transcript.characters", len(text) if text else 0)
+        if not text:
+            return None
+        assistant_name = self.configuration['assistant_name'].lower()
+        # A phrase made of the wake word only is no request, it keeps the detector armed for the command that follows
+        if not tokenize(text, assistant_name, SPOKEN_FILLER_WORDS):
+            return None
+        if self.wake_word_detector is not None:
+            self.wake_word_detector.disarm()
+            return text
+        if assistant_name in text.lower():
+            return text
+        return None
+
+    def constant_listening(self):
+        asyncio.run(self.__listen())
+
+    async def __listen(self):
+        pipeline = VoicePipeline(
+            transcribe=lambda audio: run_blocking(self.__transcribe, audio),
+            interpret=self.__interpret,
+            execute=self.ci.handle_command_async,
+            speak=self.__speak,
+            queue_size=self.configuration.get('pipeline', {}).get('queue_size', 4),
+            max_in_flight_commands=self.configuration.get('command_workers', 4)
+        )
+        await pipeline.start()
+        # The microphone is read by a dedicated thread, everything downstream runs on the event loop
+        await asyncio.to_thread(self.__capture, pipeline)
+
+    async def __interpret(self, text, on_command, on_answer):
+        # The first sentences are spoken while the answer is streamed, the speech stage only says the rest
+        answer = self.speaker.answer()
+
+        async def submit_answer(answer_text):
+            await on_answer(answer.complete(answer_text))
+
+        await self.command_understanding.interpret_and_dispatch_async(
+            text, on_command, submit_answer, on_answer_delta=answer.feed)
+
+    async def __speak(self, text):
+        self.speaker.say(text)
+
+    def __capture(self, pipeline):
+        capture_configuration = self.configuration.get('audio_capture', {})
+
+        def submit(segment, end):
+            trace = tracer.start_trace()
+            if trace is not None:
+                # The segment ended at end, its capture started when its first sample was recorded
+                duration_ns = len(segment) * 1_000_000_000 // STT_SAMPLE_RATE
+                trace.record_span("capture", end - duration_ns, end,
+                                  **{"audio.duration_ms": duration_ns // 1_000_000})
+            pipeline.submit_audio(segment, trace)
+
+        def on_segment(segment):
+            end = time.time_ns()
+            if self.wake_word_detector is None:
+                submit(segment, end)
+                return
+            # Only the segments during which the wake word was heard, or following it, are transcribed
+            self.wake_word_detector.submit_segment(lambda: submit(segment, end))
+
+        if self.wake_word_detector is not None:
+            self.wake_word_detector.start()
+        AudioCapture(
+            on_segment=on_segment,
+            on_frame=self.wake_word_detector.submit_frame if self.wake_word_detector is not None else None,
+            sample_rate=STT_SAMPLE_RATE,
+            frame_ms=capture_configuration.get('frame_ms', 30),
+            ring_seconds=capture_configuration.get('ring_seconds', 30),
+            calibration_seconds=capture_configuration.get('calibration_seconds', 2),
+            start_speech_ms=capture_configuration.get('start_speech_ms', 90),
+            end_silence_ms=capture_configuration.get('end_silence_ms', 500),
+            pre_roll_ms=capture_configuration.get('pre_roll_ms', 300),
+            max_segment_seconds=capture_configuration.get('max_segment_seconds', 12),
+            device_index=capture_configuration.get('device_index'),
+            vad=VoiceActivityDetector(energy_factor=capture_configuration.get('energy_factor', 3.0))
+        ).run()
 
     def test_chat(self):
         while True:
@@ -1,38 +1,128 @@
 import json
 import os
 import logging
-from typing import Literal
+import time
+from typing import Literal, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from plugs.home_assistant_plug.home_assistant_websocket_client import (HomeAssistantWebSocketClient,
+                                                                       HomeAssistantWebSocketError)
 from plugs.parent_manager import ParentManager
+from services.file_logger import FileLoggerService
 
 logger = logging.getLogger(__name__)
+file_logger = FileLoggerService("logs/home_assistant.log")
 
 class HomeAssistantManager(ParentManager):
     """
     This class is used to interact with my Home Assistant instance through the REST API.
     """
 
-    def __init__(self, config_file='plugs/home_assistant_plug/home_assistant_configuration.json'):
+    def __init__(self, config_file='plugs/home_assistant_plug/home_assistant_configuration.json',
+                 session: Optional[requests.Session] = None, use_websocket: Optional[bool] = None,
+                 url: Optional[str] = None):
         super().__init__()
         self.manager_name = "home_assistant"
         with open(config_file) as config_file:
             self.config = json.load(config_file)
-            self.ha_url = self.config['url']
+            self.ha_url = url or self.config['url']
             self.access_token = os.environ['HOME_ASSISTANT_TOKEN']
+        self.timeout = (self.config.get('connect_timeout', 3.05), self.config.get('read_timeout', 10))
+        self.session = session if session is not None else self.__create_session()
+        self.__warm_up()
+        if use_websocket is None:
+            use_websocket = self.config.get('use_websocket', False)
+        self.websocket_client = self.__start_websocket_client() if use_websocket else None
+
+    def __create_session(self) -> requests.Session:
+        """
+        Create the keep-alive session reused by every call.
+        Connection failures are retried for every method since the request never reached Home Assistant,
+        read and status failures are only retried for idempotent methods.
+        """
+        session = requests.Session()
+        session.headers.update({
+            'Authorization': f"Bearer {self.access_token}",
+            'Content-Type': 'application/json'
+        })
+        retries = Retry(
+            total=self.config.get('max_retries', 3),
+            connect=self.config.get('max_retries', 3),
+            read=self.config.get('max_retries', 3),
+            status=self.config.get('max_retries', 3),
+            backoff_factor=self.config.get('retry_backoff', 0.2),
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({'GET', 'HEAD', 'OPTIONS'}),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.config.get('pool_size', 4), max_retries=retries)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def __warm_up(self):
+        """
+        Open the connection at startup so the first command does not pay the connection setup
+        """
+        start = time.perf_counter()
+        try:
+            response = self.session.get(f"{self.ha_url}/api/", timeout=self.timeout)
+            file_logger.info(f"warm up {response.status_code} in {(time.perf_counter() - start) * 1000:.1f} milliseconds")
+        except requests.RequestException as exc:
+            logger.warning("Unable to warm up the Home Assistant connection: %s", exc)
+
+    def __start_websocket_client(self) -> Optional[HomeAssistantWebSocketClient]:
+        """
+        Connect the websocket used for service calls and for the entity state mirror, REST stays the fallback
+        """
+        try:
+            client = HomeAssistantWebSocketClient(self.ha_url, self.access_token, call_timeout=self.timeout[1])
+        except HomeAssistantWebSocketError as exc:
+            logger.warning("Home Assistant websocket disabled: %s", exc)
+            return None
+        if not client.start(timeout=self.timeout[0]):
+            logger.warning("Home Assistant websocket not ready yet, REST is used until it connects")
+        return client
+
+    def entity_state(self, entity_id: str) -> Optional[str]:
+        """
+        Current state of an entity ("on", "off"...), read from the websocket mirror without any round trip when it is
+        connected, from the REST API otherwise. None when the entity is unknown
+        """
+        if self.websocket_client is not None and self.websocket_client.connected:
+            state = self.websocket_client.get_state(entity_id)
+            return state.get('state') if state is not None else None
+        response = self.session.get(f"{self.ha_url}/api/states/{entity_id}", timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json().get('state')
 
     def use_ha_script(self, script_name: Literal['switch_on_tv_box', 'switch_off_tv_box', 'android_tv_pause', 'android_tv_play']):
         """
         This method is used to execute any Home Assistant script.
         """
+        if self.websocket_client is not None and self.websocket_client.connected:
+            # The mirror tells for free whether the script is still running, Home Assistant would ignore a new run
+            if self.entity_state(f"script.{script_name}") == 'on':
+                logger.info("Script %s is already running, not starting it again", script_name)
+                return
+            logger.info("Executing script: %s over the websocket", script_name)
+            start = time.perf_counter()
+            self.websocket_client.call_service('script', script_name)
+            file_logger.info(f"script {script_name} executed over the websocket in "
+                             f"{(time.perf_counter() - start) * 1000:.1f} milliseconds")
+            return
+
         url = f"{self.ha_url}/api/services/script/{script_name}"
-        headers = {
-            'Authorization': f"Bearer {self.access_token}",
-            'Content-Type': 'application/json'
-        }
         logger.info("Executing script: %s at %s", script_name, url)
-        response = requests.post(url, headers=headers)
+        start = time.perf_counter()
+        response = self.session.post(url, timeout=self.timeout)
+        file_logger.info(f"script {script_name} returned {response.status_code} in "
+                         f"{(time.perf_counter() - start) * 1000:.1f} milliseconds")
 
         if response.status_code == 200:
             logger.info("Script %s executed successfully.", script_name)
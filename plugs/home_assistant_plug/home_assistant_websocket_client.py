@@ -0,0 +1,168 @@
+import itertools
+import json
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import websocket
+except ImportError:  # pragma: no cover - library might not be available during tests
+    websocket = None
+
+logger = logging.getLogger(__name__)
+
+
+class HomeAssistantWebSocketError(Exception):
+    pass
+
+
+class HomeAssistantWebSocketClient:
+    """
+    Client of the Home Assistant WebSocket API.
+
+    It authenticates once, mirrors every entity state in memory (filled by get_states then kept current by the
+    state_changed events) and sends the service calls over the same socket. A background thread reads the socket
+    and reconnects after reconnect_delay seconds when the connection drops.
+    """
+
+    def __init__(self, url: str, access_token: str, call_timeout: float = 10, reconnect_delay: float = 5):
+        if websocket is None:
+            raise HomeAssistantWebSocketError("The websocket-client library is not installed")
+        self.websocket_url = url.replace('https://', 'wss://').replace('http://', 'ws://').rstrip('/') + '/api/websocket'
+        self.access_token = access_token
+        self.call_timeout = call_timeout
+        self.reconnect_delay = reconnect_delay
+        self.states: Dict[str, Dict[str, Any]] = {}
+        self._states_lock = threading.Lock()
+        self._pending: Dict[int, Future] = {}
+        self._message_ids = itertools.count(1)
+        self._send_lock = threading.Lock()
+        self._connection = None
+        self._connected = threading.Event()
+        self._states_loaded = threading.Event()
+        self._closing = threading.Event()
+        self._get_states_id: Optional[int] = None
+        self._thread = threading.Thread(target=self._run_forever, name="home-assistant-websocket", daemon=True)
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    def start(self, timeout: float = 5) -> bool:
+        """
+        Start the reader thread and wait up to timeout seconds for the state mirror to be loaded
+        """
+        self._thread.start()
+        return self._states_loaded.wait(timeout)
+
+    def close(self) -> None:
+        self._closing.set()
+        if self._connection is not None:
+            self._connection.close()
+
+    def get_state(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Last known state of an entity, read from the mirror without any round trip
+        """
+        with self._states_lock:
+            return self.states.get(entity_id)
+
+    def states_snapshot(self, domain: Optional[str] = None) -> Dict[str, str]:
+        """
+        entity_id -> state of every mirrored entity, optionally restricted to a domain ("light", "script"...)
+        """
+        with self._states_lock:
+            return {
+                entity_id: state.get('state')
+                for entity_id, state in self.states.items()
+                if domain is None or entity_id.startswith(f"{domain}.")
+            }
+
+    def call_service(self, domain: str, service: str, service_data: Optional[Dict[str, Any]] = None) -> Any:
+        message = {"type": "call_service", "domain": domain, "service": service}
+        if service_data:
+            message["service_data"] = service_data
+        message_id, future = self.__request(message)
+        try:
+            return future.result(timeout=self.call_timeout)
+        finally:
+            # A call that timed out is forgotten, its late answer is then ignored
+            self._pending.pop(message_id, None)
+
+    def __request(self, message: Dict[str, Any]) -> Tuple[int, Future]:
+        if not self.connected:
+            raise HomeAssistantWebSocketError("Not connected to Home Assistant")
+        future: Future = Future()
+        with self._send_lock:
+            message_id = next(self._message_ids)
+            self._pending[message_id] = future
+            try:
+                self._connection.send(json.dumps({"id": message_id, **message}))
+            except Exception:
+                self._pending.pop(message_id, None)
+                raise
+        return message_id, future
+
+    def _run_forever(self) -> None:
+        while not self._closing.is_set():
+            try:
+                self.__connect()
+                while not self._closing.is_set():
+                    self.__handle_message(json.loads(self._connection.recv()))
+            except Exception as exc:
+                if not self._closing.is_set():
+                    logger.warning("Home Assistant websocket disconnected: %s", exc)
+            finally:
+                self._connected.clear()
+                for future in list(self._pending.values()):
+                    future.set_exception(HomeAssistantWebSocketError("Connection lost"))
+                self._pending.clear()
+            self._closing.wait(self.reconnect_delay)
+
+    def __connect(self) -> None:
+        self._connection = websocket.create_connection(self.websocket_url, timeout=self.call_timeout)
+        if json.loads(self._connection.recv()).get('type') != 'auth_required':
+            raise HomeAssistantWebSocketError("Unexpected handshake from Home Assistant")
+        self._connection.send(json.dumps({"type": "auth", "access_token": self.access_token}))
+        auth_answer = json.loads(self._connection.recv())
+        if auth_answer.get('type') != 'auth_ok':
+            raise HomeAssistantWebSocketError(f"Authentication refused: {auth_answer.get('message')}")
+        # From now on the socket is only read by this thread, it waits for messages without timeout
+        self._connection.settimeout(None)
+
+        with self._send_lock:
+            self._get_states_id = next(self._message_ids)
+            self._connection.send(json.dumps({"id": self._get_states_id, "type": "get_states"}))
+            self._connection.send(json.dumps({"id": next(self._message_ids), "type": "subscribe_events",
+                                              "event_type": "state_changed"}))
+        self._connected.set()
+        logger.info("Connected to the Home Assistant websocket %s", self.websocket_url)
+
+    def __handle_message(self, message: Dict[str, Any]) -> None:
+        if message.get('type') == 'event':
+            data = message.get('event', {}).get('data', {})
+            with self._states_lock:
+                if data.get('new_state') is None:
+                    self.states.pop(data.get('entity_id'), None)
+                else:
+                    self.states[data['entity_id']] = data['new_state']
+            return
+
+        if message.get('type') != 'result':
+            return
+        if message.get('id') == self._get_states_id:
+            with self._states_lock:
+                self.states = {state['entity_id']: state for state in message.get('result') or []}
+            self._states_loaded.set()
+            logger.info("Mirrored %d Home Assistant entity states", len(self.states))
+            return
+
+        future = self._pending.pop(message.get('id'), None)
+        if future is None:
+            return
+        if message.get('success'):
+            future.set_result(message.get('result'))
+        else:
+            error = message.get('error', {})
+            future.set_exception(HomeAssistantWebSocketError(f"{error.get('code')}: {error.get('message')}"))
@@ -0,0 +1,255 @@
+import heapq
+import itertools
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Deque, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from services.file_logger import FileLoggerService
+
+logger = logging.getLogger(__name__)
+file_logger = FileLoggerService("logs/hue_scheduler.log")
+
+USER_PRIORITY = 0
+BACKGROUND_PRIORITY = 10
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at rate tokens per second, holding at most capacity tokens
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    def time_until_available(self, cost: float) -> float:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        return max(0.0, (min(cost, self.capacity) - self._tokens) / self.rate)
+
+    def consume(self, cost: float) -> None:
+        self._tokens -= min(cost, self.capacity)
+
+
+# Bounds of the state parameters an increment can be folded into, hue wraps around instead
+STATE_RANGES = {'bri': (1, 254), 'sat': (0, 254), 'ct': (153, 500)}
+HUE_VALUES = 65536
+MAX_INCREMENT = {'bri_inc': 254, 'sat_inc': 254, 'ct_inc': 65534, 'hue_inc': 65534}
+
+
+class _PendingWrite:
+    def __init__(self, kind: str, target: int, state: Dict[str, Any], priority: int, sequence: int):
+        self.kind = kind
+        self.target = target
+        self.state = dict(state)
+        self.priority = priority
+        self.sequence = sequence
+        self.queued = True
+        self.enqueued_at = time.monotonic()
+        self.futures: List[Future] = []
+
+    def can_merge(self, state: Dict[str, Any]) -> bool:
+        """
+        False when an increment of state can't be folded into an absolute value of this write (xy_inc...)
+        """
+        for parameter in state:
+            absolute = parameter[:-len('_inc')]
+            if parameter.endswith('_inc') and absolute in self.state and absolute not in (*STATE_RANGES, 'hue'):
+                return False
+        return True
+
+    def merge(self, state: Dict[str, Any], priority: int) -> None:
+        """
+        Fold a newer write into this one: absolute values replace the pending value and increment, increments are
+        added to the pending increment or folded into the pending absolute value, so bri and bri_inc are never sent
+        together
+        """
+        for parameter, value in state.items():
+            if not parameter.endswith('_inc'):
+                self.state[parameter] = value
+                self.state.pop(f"{parameter}_inc", None)
+                continue
+            absolute = parameter[:-len('_inc')]
+            if absolute == 'hue' and absolute in self.state:
+                self.state[absolute] = (self.state[absolute] + value) % HUE_VALUES
+            elif absolute in self.state:
+                low, high = STATE_RANGES[absolute]
+                self.state[absolute] = max(low, min(high, self.state[absolute] + value))
+            elif parameter in self.state:
+                limit = MAX_INCREMENT.get(parameter)
+                total = self.state[parameter] + value
+                self.state[parameter] = total if limit is None else max(-limit, min(limit, total))
+            else:
+                self.state[parameter] = value
+        self.priority = min(self.priority, priority)
+
+
+class HueCommandScheduler:
+    """
+    Single sender of the writes made to a Hue bridge, keeping the bridge under its throughput limits.
+
+    Writes go through a priority queue (user commands before background ones, then FIFO) and a token bucket
+    allowing max_commands_per_second light commands, a group command costing group_command_cost tokens.
+    A write queued for a light or group that already has a pending write is merged into it, so superseded
+    values are never sent. The merged write keeps its place in the queue, and merging is only done when no write
+    touching the same lights is queued after the pending one, otherwise the new write is queued behind it: the
+    bridge always receives the writes of a light in the order they were made, so the latest intent wins.
+    The lights of the groups come from update_groups, a group of unknown lights overlaps every write.
+    """
+
+    _schedulers: Dict[Any, "HueCommandScheduler"] = {}
+    _schedulers_lock = threading.Lock()
+
+    def __init__(self, bridge, max_commands_per_second: float = 10, group_command_cost: float = 10):
+        self.bridge = bridge
+        self.bucket = TokenBucket(max_commands_per_second, max_commands_per_second)
+        self.group_command_cost = group_command_cost
+        self._heap: List[Tuple[int, int, _PendingWrite]] = []
+        # Last queued write of each light or group, the only one newer writes can be merged into
+        self._pending: Dict[Tuple[str, int], _PendingWrite] = {}
+        self._group_lights: Dict[int, FrozenSet[int]] = {}
+        self._sequences = itertools.count()
+        self._condition = threading.Condition()
+        self._queued = 0
+        self.sent = 0
+        self.collapsed = 0
+        self.wait_times_ms: Deque[float] = deque(maxlen=500)
+        self._thread = threading.Thread(target=self._run, name="hue-scheduler", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def for_bridge(cls, bridge, **kwargs) -> "HueCommandScheduler":
+        """
+        Return the scheduler of a bridge, creating it on first use so every user of a bridge shares its limits
+        """
+        key = getattr(bridge, 'ip', None) or id(bridge)
+        with cls._schedulers_lock:
+            if key not in cls._schedulers:
+                cls._schedulers[key] = cls(bridge, **kwargs)
+            return cls._schedulers[key]
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    def stats(self) -> Dict[str, Any]:
+        wait_times = list(self.wait_times_ms)
+        return {
+            "queue_depth": self.queue_depth,
+            "sent": self.sent,
+            "collapsed": self.collapsed,
+            "wait_ms_p50": statistics.median(wait_times) if wait_times else 0.0,
+            "wait_ms_max": max(wait_times, default=0.0),
+        }
+
+    def update_groups(self, groups: Dict[int, Iterable[int]]) -> None:
+        """
+        Lights of each group of the bridge (group 0 being every light), used to tell which writes overlap
+        """
+        with self._condition:
+            self._group_lights = {int(group_id): frozenset(map(int, lights)) for group_id, lights in groups.items()}
+
+    def submit_light(self, light_id: int, state: Dict[str, Any], priority: int = USER_PRIORITY) -> Future:
+        return self.__submit('light', int(light_id), state, priority)
+
+    def submit_group(self, group_id: int, state: Dict[str, Any], priority: int = USER_PRIORITY) -> Future:
+        return self.__submit('group', int(group_id), state, priority)
+
+    def __submit(self, kind: str, target: int, state: Dict[str, Any], priority: int) -> Future:
+        future: Future = Future()
+        key = (kind, target)
+        with self._condition:
+            pending = self._pending.get(key)
+            if pending is not None and pending.can_merge(state) and not self.__overtaken(pending):
+                previous_priority = pending.priority
+                pending.merge(state, priority)
+                self.collapsed += 1
+                if pending.priority != previous_priority:
+                    heapq.heappush(self._heap, (pending.priority, pending.sequence, pending))
+            else:
+                pending = _PendingWrite(kind, target, state, priority, next(self._sequences))
+                self._pending[key] = pending
+                self._queued += 1
+                heapq.heappush(self._heap, (pending.priority, pending.sequence, pending))
+            pending.futures.append(future)
+            self._condition.notify()
+        return future
+
+    def __overtaken(self, pending: _PendingWrite) -> bool:
+        """
+        True when a write queued after pending touches some of its lights, merging into pending would reorder them
+        """
+        lights = self.__lights_of(pending.kind, pending.target)
+        for other in self._pending.values():
+            if other.sequence <= pending.sequence:
+                continue
+            other_lights = self.__lights_of(other.kind, other.target)
+            if lights is None or other_lights is None or lights & other_lights:
+                return True
+        return False
+
+    def __lights_of(self, kind: str, target: int) -> Optional[FrozenSet[int]]:
+        if kind == 'light':
+            return frozenset((target,))
+        return self._group_lights.get(target)
+
+    def _run(self) -> None:
+        while True:
+            write = self.__next_write()
+            try:
+                if write.kind == 'group':
+                    result = self.bridge.set_group(write.target, write.state)
+                else:
+                    result = self.bridge.set_light(write.target, write.state)
+            except Exception as exc:
+                logger.exception("Hue %s %s write %s failed", write.kind, write.target, write.state)
+                for future in write.futures:
+                    future.set_exception(exc)
+                continue
+            for future in write.futures:
+                future.set_result(result)
+
+    def __next_write(self) -> _PendingWrite:
+        """
+        Wait for the most urgent write and for the tokens it costs, then take it out of the queue
+        """
+        with self._condition:
+            while True:
+                write = self.__peek()
+                if write is None:
+                    self._condition.wait()
+                    continue
+                cost = self.group_command_cost if write.kind == 'group' else 1
+                delay = self.bucket.time_until_available(cost)
+                if delay > 0:
+                    # Writes queued meanwhile can still be merged into the waiting ones
+                    self._condition.wait(delay)
+                    continue
+                self.bucket.consume(cost)
+                heapq.heappop(self._heap)
+                write.queued = False
+                self._queued -= 1
+                if self._pending.get((write.kind, write.target)) is write:
+                    del self._pending[(write.kind, write.target)]
+                wait_time_ms = (time.monotonic() - write.enqueued_at) * 1000
+                self.wait_times_ms.append(wait_time_ms)
+                self.sent += 1
+                file_logger.info(f"{write.kind} {write.target} {write.state} sent after {wait_time_ms:.1f} ms, "
+                                 f"queue depth {self._queued}, {self.collapsed} writes collapsed so far")
+                return write
+
+    def __peek(self) -> Optional[_PendingWrite]:
+        while self._heap:
+            priority, _, pending = self._heap[0]
+            # Entries of sent writes and of writes whose priority was raised by a merge are stale
+            if pending.queued and pending.priority == priority:
+                return pending
+            heapq.heappop(self._heap)
+        return None
@@ -15,3 +15,7 @@ class HueConfigurationType(BaseModel):
     manager_name: str
     manager_description: str
     hue_lights: list[HueLightConfigurationType]
+    state_cache_max_age: float = 10
+    max_commands_per_second: float = 10
+    group_command_cost: float = 10
+    command_timeout: float = 30
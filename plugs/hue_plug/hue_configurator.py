@@ -8,6 +8,7 @@ from pathlib import Path
 
 from phue import Bridge
 
+from plugs.hue_plug.hue_command_scheduler import BACKGROUND_PRIORITY, HueCommandScheduler
 from plugs.parent_configurator import ParentConfigurator
 
 logger = logging.getLogger(__name__)
@@ -28,6 +29,7 @@ class HueConfigurator(ParentConfigurator):
 
         self.bridge = Bridge(bridge_ip)
         self.bridge.connect()
+        self.scheduler = HueCommandScheduler.for_bridge(self.bridge)
 
     @property
     def configured_lights(self) -> List[Dict]:
@@ -97,7 +99,7 @@ class HueConfigurator(ParentConfigurator):
         def _blink_loop() -> None:
             while not stop_event.is_set():
                 try:
-                    self.bridge.set_light(int(light_id), "alert", "lselect")
+                    self.scheduler.submit_light(int(light_id), {"alert": "lselect"}, BACKGROUND_PRIORITY).result()
                 except Exception:  # pragma: no cover - depends on hardware
                     logger.exception("Unable to trigger blinking for light %s", light_id)
                     break
@@ -116,7 +118,7 @@ class HueConfigurator(ParentConfigurator):
             thread.join(timeout=2)
 
         try:
-            self.bridge.set_light(int(light_id), "alert", "none")
+            self.scheduler.submit_light(int(light_id), {"alert": "none"}).result()
         except Exception:  # pragma: no cover - depends on hardware
             logger.exception("Unable to stop blinking for light %s", light_id)
 
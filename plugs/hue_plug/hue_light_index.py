@@ -0,0 +1,81 @@
+from typing import Dict, FrozenSet, Iterable, List, Union
+
+from plugs.hue_plug.hue_configuration_type import HueLightConfigurationType
+from services.text_normalizer import normalize_text
+
+
+class HueLightIndex:
+    """
+    Indexes built once from the configured lights: room -> ids, name -> ids and, for every light,
+    the transitive closure of the lights it is paired with.
+    Room and name lookups ignore case and accents.
+    """
+
+    def __init__(self, lights: Iterable[HueLightConfigurationType]):
+        lights = list(lights)
+        paired_by_id = {int(light.id): [int(paired_id) for paired_id in light.paired] for light in lights}
+        self.paired_groups: Dict[int, FrozenSet[int]] = self.__paired_closures(paired_by_id)
+        self.all_ids: List[int] = sorted(paired_by_id)
+        self.room_names: Dict[str, str] = {}
+        self.room_ids: Dict[str, List[int]] = {}
+        self.name_ids: Dict[str, List[int]] = {}
+
+        rooms: Dict[str, set] = {}
+        names: Dict[str, set] = {}
+        for light in lights:
+            room_key = normalize_text(light.room)
+            self.room_names.setdefault(room_key, light.room)
+            rooms.setdefault(room_key, set()).update(self.paired_groups[int(light.id)])
+            names.setdefault(normalize_text(light.name), set()).add(int(light.id))
+        self.room_ids = {room: sorted(ids) for room, ids in rooms.items()}
+        self.name_ids = {name: sorted(ids) for name, ids in names.items()}
+
+    def ids_of_lights(self, lights: Iterable[Union[int, str]]) -> List[int]:
+        """
+        Ids of lights given by id or by name, the LLM sometimes answers "Lampe salon" instead of its id
+        """
+        ids = set()
+        for light in lights:
+            if isinstance(light, int) or str(light).strip().isdigit():
+                ids.add(int(light))
+                continue
+            name_key = normalize_text(light)
+            if name_key not in self.name_ids:
+                raise ValueError(f"Unknown light '{light}'")
+            ids.update(self.name_ids[name_key])
+        return sorted(ids)
+
+    def expand(self, lights_indexes: Iterable[int]) -> List[int]:
+        """
+        Add the lights paired with the given ones
+        """
+        expanded = set()
+        for light_id in lights_indexes:
+            expanded.update(self.paired_groups.get(int(light_id), {int(light_id)}))
+        return sorted(expanded)
+
+    def ids_of_rooms(self, rooms: Iterable[str]) -> List[int]:
+        ids = set()
+        for room in rooms:
+            room_key = normalize_text(room)
+            if room_key not in self.room_ids:
+                raise ValueError(f"Unknown room '{room}', known rooms are {sorted(self.room_names.values())}")
+            ids.update(self.room_ids[room_key])
+        return sorted(ids)
+
+    @staticmethod
+    def __paired_closures(paired_by_id: Dict[int, List[int]]) -> Dict[int, FrozenSet[int]]:
+        closures: Dict[int, FrozenSet[int]] = {}
+        for light_id in paired_by_id:
+            if light_id in closures:
+                continue
+            group, pending = set(), [light_id]
+            while pending:
+                current = pending.pop()
+                if current not in group:
+                    group.add(current)
+                    pending.extend(paired_by_id.get(current, []))
+            frozen_group = frozenset(group & paired_by_id.keys())
+            for member in frozen_group:
+                closures[member] = frozen_group
+        return closures
@@ -0,0 +1,105 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, FrozenSet, Iterable, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class HueLightStateCache:
+    """
+    Cached model of the light states and groups of a Hue bridge, used to turn writes into diffs.
+
+    The whole model is fetched with two calls (all lights, all groups) and refreshed when older than max_age
+    seconds. After each write the cache is updated optimistically with the requested state.
+    """
+
+    def __init__(self, bridge, max_age: float = 10):
+        self.bridge = bridge
+        self.max_age = max_age
+        self.light_states: Dict[int, Dict[str, Any]] = {}
+        self.groups: Dict[int, FrozenSet[int]] = {}
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self) -> None:
+        lights = self.bridge.get_light()
+        groups = self.bridge.get_group()
+        with self._lock:
+            self.light_states = {int(light_id): dict(light.get('state', {})) for light_id, light in lights.items()}
+            self.groups = {
+                int(group_id): frozenset(int(light_id) for light_id in group.get('lights', []))
+                for group_id, group in groups.items()
+            }
+            # Group 0 is the implicit group of every light known by the bridge
+            self.groups[0] = frozenset(self.light_states)
+            self._refreshed_at = time.monotonic()
+        logger.debug("Hue state cache refreshed: %d lights, %d groups", len(self.light_states), len(self.groups))
+
+    def refresh_if_stale(self) -> None:
+        if time.monotonic() - self._refreshed_at > self.max_age:
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Unable to refresh the Hue state cache, every light will be written")
+                self.invalidate(self.light_states)
+
+    def plan(self, lights_indexes: Iterable[int], state: Dict[str, Any], relative: bool = False,
+             group_command_cost: float = 1) -> Tuple[List[int], List[int]]:
+        """
+        Return the groups and the remaining lights to write so that every requested light ends in the given state.
+
+        Lights already in the requested state are skipped. A group can be used when each of its lights is either
+        to be written or already in the requested state, and is only used when it saves more light writes than
+        group_command_cost, its cost counted in light writes. Relative changes (bri_inc) are never skipped and
+        only use groups made exclusively of requested lights.
+        """
+        requested = set(lights_indexes)
+        with self._lock:
+            if relative:
+                needed = requested
+                harmless: Set[int] = set()
+            else:
+                needed = {light_id for light_id in requested if not self.__is_in_state(light_id, state)}
+                harmless = {light_id for light_id in self.light_states if self.__is_in_state(light_id, state)}
+
+            selected_groups: List[int] = []
+            remaining = set(needed)
+            usable_groups = [
+                (group_id, lights) for group_id, lights in self.groups.items()
+                if lights and lights <= needed | harmless
+            ]
+            while remaining:
+                best_group, best_lights = max(usable_groups, key=lambda group: len(group[1] & remaining),
+                                              default=(None, frozenset()))
+                if len(best_lights & remaining) <= group_command_cost:
+                    break
+                selected_groups.append(best_group)
+                remaining -= best_lights
+        return selected_groups, sorted(remaining)
+
+    def update(self, lights_indexes: Iterable[int], state: Dict[str, Any]) -> None:
+        with self._lock:
+            for light_id in lights_indexes:
+                self.light_states.setdefault(int(light_id), {}).update(state)
+
+    def invalidate(self, lights_indexes: Iterable[int], parameters: Iterable[str] = None) -> None:
+        """
+        Forget the cached parameters of some lights (all of them if parameters is None)
+        """
+        with self._lock:
+            for light_id in list(lights_indexes):
+                light_state = self.light_states.get(int(light_id))
+                if light_state is None:
+                    continue
+                if parameters is None:
+                    light_state.clear()
+                else:
+                    for parameter in parameters:
+                        light_state.pop(parameter, None)
+
+    def __is_in_state(self, light_id: int, state: Dict[str, Any]) -> bool:
+        light_state = self.light_states.get(light_id)
+        if not light_state or not light_state.get('reachable', True):
+            return False
+        return all(parameter in light_state and light_state[parameter] == value for parameter, value in state.items())
@@ -2,7 +2,10 @@ from phue import Bridge
 import json
 import logging
 
+from plugs.hue_plug.hue_command_scheduler import HueCommandScheduler
 from plugs.hue_plug.hue_configuration_type import HueConfigurationType, HueLightConfigurationType
+from plugs.hue_plug.hue_light_index import HueLightIndex
+from plugs.hue_plug.hue_light_state_cache import HueLightStateCache
 from plugs.parent_manager import ParentManager
 
 logger = logging.getLogger(__name__)
@@ -13,23 +16,63 @@ class HueManager(ParentManager):
     This class is used to manage the lights of the house through the Hue Bridge
     """
 
-    def __init__(self, config_file='plugs/hue_plug/hue_configuration.json'):
+    independent_commands = frozenset({'get_lights', 'get_light', 'scan_hue_devices_not_configured'})
+
+    def __init__(self, config_file='plugs/hue_plug/hue_configuration.json', bridge=None):
         super().__init__()
         self.manager_name = "hue"
         with open(config_file) as config_file:
             data = json.load(config_file)
             self.config = HueConfigurationType(**data)
-            self.bridge = Bridge(self.config.bridge_ip)
-            self.bridge.connect()
+        self.light_index = HueLightIndex(self.config.hue_lights)
+        if bridge is None:
+            bridge = Bridge(self.config.bridge_ip)
+            bridge.connect()
+        self.bridge = bridge
+        self.scheduler = HueCommandScheduler.for_bridge(
+            self.bridge,
+            max_commands_per_second=self.config.max_commands_per_second,
+            group_command_cost=self.config.group_command_cost
+        )
+        self.state_cache = HueLightStateCache(self.bridge, max_age=self.config.state_cache_max_age)
+        self.state_cache.refresh_if_stale()
+        self.scheduler.update_groups(self.state_cache.groups)
+
+    def __apply_state(self, lights_indexes: list[int], state: dict, relative: bool = False):
+        """
+        Write a state to the lights, skipping the ones already in this state and using groups when possible
+        """
+        self.state_cache.refresh_if_stale()
+        self.scheduler.update_groups(self.state_cache.groups)
+        groups, lights = self.state_cache.plan(lights_indexes, state, relative, self.scheduler.group_command_cost)
+        logger.info("Applying %s to lights %s with %d group and %d light calls",
+                    state, lights_indexes, len(groups), len(lights))
+        writes = [self.scheduler.submit_group(group_id, state) for group_id in groups]
+        writes += [self.scheduler.submit_light(light_id, state) for light_id in lights]
+        for write in writes:
+            write.result(timeout=self.config.command_timeout)
+        if relative:
+            self.state_cache.invalidate(lights_indexes, [parameter.replace('_inc', '') for parameter in state])
+        else:
+            self.state_cache.update(lights_indexes, state)
+
+    def __handle_lights_indexes(self, lights_indexes: list[int]):
+        """
+        Handle the case where a single index is provided as an int instead of a list,
+        resolve the lights given by name and add the lights paired with the requested ones
+        """
+        if isinstance(lights_indexes, (int, str)):
+            lights_indexes = [lights_indexes]
+        return self.light_index.expand(self.light_index.ids_of_lights(lights_indexes))
 
     @staticmethod
-    def __handle_lights_indexes(lights_indexes: list[int]):
+    def __handle_rooms(rooms: list[str]):
         """
-        Handle the case where a single index is provided as an int instead of a list
+        Handle the case where a single room is provided as a string instead of a list
         """
-        if isinstance(lights_indexes, int):
-            lights_indexes = [lights_indexes]
-        return list(map(int, lights_indexes))
+        if isinstance(rooms, str):
+            rooms = [rooms]
+        return list(rooms)
 
     def get_lights(self):
         """ Get list of lights connected to the Hue Bridge """
@@ -54,7 +97,7 @@ class HueManager(ParentManager):
         lights_indexes (int list): List of indexes of lights to turn on
         """
         lights_indexes = self.__handle_lights_indexes(lights_indexes)
-        self.bridge.set_light(lights_indexes, 'on', True)
+        self.__apply_state(lights_indexes, {'on': True})
 
     def turn_off_lights(self, lights_indexes: list[int]):
         """
@@ -64,7 +107,7 @@ class HueManager(ParentManager):
         lights_indexes (int list): List of indexes of lights to turn off, it is required. To turn off all the lights, use all the ids
         """
         lights_indexes = self.__handle_lights_indexes(lights_indexes)
-        self.bridge.set_light(lights_indexes, 'on', False)
+        self.__apply_state(lights_indexes, {'on': False})
 
     def set_lights_brightness(self, lights_indexes: list[int], brightness):
         """
@@ -76,8 +119,7 @@ class HueManager(ParentManager):
         """
         lights_indexes = self.__handle_lights_indexes(lights_indexes)
         try:
-            for index in lights_indexes:
-                self.bridge.set_light(index, 'bri', brightness)
+            self.__apply_state(lights_indexes, {'bri': int(brightness)})
         except Exception:
             logger.exception("Error while setting brightness of lights %s", lights_indexes)
 
@@ -92,7 +134,7 @@ class HueManager(ParentManager):
         lights_indexes = self.__handle_lights_indexes(lights_indexes)
         inc = int(increase_percentage / 100 * 254)
         try:
-            self.bridge.set_light(lights_indexes, 'bri_inc', inc)
+            self.__apply_state(lights_indexes, {'bri_inc': inc}, relative=True)
         except Exception:
             logger.exception("Error while increasing brightness of light %s", lights_indexes)
 
@@ -107,10 +149,41 @@ class HueManager(ParentManager):
         lights_indexes = self.__handle_lights_indexes(lights_indexes)
         inc = -int(decrease_percentage / 100 * 254)
         try:
-            self.bridge.set_light(lights_indexes, 'bri_inc', inc)
+            self.__apply_state(lights_indexes, {'bri_inc': inc}, relative=True)
         except Exception:
             logger.exception("Error while decreasing brightness of light %s", lights_indexes)
 
+    def turn_on_rooms(self, rooms: list[str]):
+        """
+        Turn on every light of the specified rooms
+
+        Parameters:
+        rooms (str list): List of the room names as written in the configuration
+        """
+        lights_indexes = self.light_index.ids_of_rooms(self.__handle_rooms(rooms))
+        self.__apply_state(lights_indexes, {'on': True})
+
+    def turn_off_rooms(self, rooms: list[str]):
+        """
+        Turn off every light of the specified rooms
+
+        Parameters:
+        rooms (str list): List of the room names as written in the configuration
+        """
+        lights_indexes = self.light_index.ids_of_rooms(self.__handle_rooms(rooms))
+        self.__apply_state(lights_indexes, {'on': False})
+
+    def set_rooms_brightness(self, rooms: list[str], brightness):
+        """
+        Set brightness of every light of the specified rooms
+
+        Parameters:
+        rooms (str list): List of the room names as written in the configuration
+        brightness (int): Brightness value to set (0-254)
+        """
+        lights_indexes = self.light_index.ids_of_rooms(self.__handle_rooms(rooms))
+        self.__apply_state(lights_indexes, {'bri': int(brightness)})
+
     def scan_hue_devices_not_configured(self):
         """
         Scan hue devices and compare the id list to the ids configured in the hue_manager configuration
@@ -1,8 +1,13 @@
 import logging
 
+from services.async_runtime import run_blocking
+
 logger = logging.getLogger(__name__)
 
 class ParentManager:
+    # Commands that can run concurrently with any other command of the same manager (read only commands...)
+    independent_commands = frozenset()
+
     def __init__(self):
         self.manager_name = "Parent"
 
@@ -12,8 +17,17 @@ class ParentManager:
         logger.info("Executing command: %s with params: %s", command_name, params)
         try:
             method_to_call = getattr(self, command_name)
-            method_to_call(*params)
         except AttributeError:
             logger.error("%s manager has no method named %s", self.manager_name, command_name)
+            raise
+        try:
+            return method_to_call(*params)
         except TypeError:
-            logger.error("%s throw an error because params passed to %s don't fit with the function signature", self.manager_name, command_name)
\ No newline at end of file
+            logger.error("%s throw an error because params passed to %s don't fit with the function signature", self.manager_name, command_name)
+            raise
+
+    async def handle_command_async(self, command):
+        """
+        Awaitable variant of handle_command, managers relying on blocking libraries run on the bounded blocking pool
+        """
+        return await run_blocking(self.handle_command, command)
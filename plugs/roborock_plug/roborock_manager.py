@@ -13,14 +13,16 @@ class RoborockManager(ParentManager):
     Manager used to control a Roborock S7 vacuum cleaner.
     """
 
-    def __init__(self, config_file='plugs/roborock_plug/roborock_configuration.json'):
+    def __init__(self, config_file='plugs/roborock_plug/roborock_configuration.json', vacuum=None):
         super().__init__()
         self.manager_name = "roborock"
         with open(config_file) as conf_file:
             self.config = json.load(conf_file)
             self.ip = self.config.get('ip')
             self.token = self.config.get('token')
-        if RoborockVacuum is not None:
+        if vacuum is not None:
+            self.vacuum = vacuum
+        elif RoborockVacuum is not None:
             self.vacuum = RoborockVacuum(self.ip, self.token)
             # result = self.vacuum.get_room_mapping()
             # self.vacuum.segment_clean(segments=[21], repeat=1)
@@ -44,4 +46,5 @@ class RoborockManager(ParentManager):
         """
         Clean specific rooms by their IDs, repeat the cleaning the number_of_cleaning specified times.
         """
-        self.vacuum.segment_clean(segments=rooms_id, repeat=number_of_cleaning)
\ No newline at end of file
+        # RoborockVacuum.segment_clean takes no repeat count, the raw command carries it along the segments
+        self.vacuum.send("app_segment_clean", [{"segments": rooms_id, "repeat": number_of_cleaning}])
\ No newline at end of file
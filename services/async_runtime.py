@@ -0,0 +1,59 @@
+"""Helpers running the blocking third-party libraries (phue, requests, miio, LLM SDKs...) from asyncio code.
+
+Every blocking call goes through one bounded thread pool so that many in-flight operations share a
+fixed number of threads instead of one thread per task.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterable, Optional
+
+_blocking_pool: Optional[ThreadPoolExecutor] = None
+_blocking_pool_lock = threading.Lock()
+_DEFAULT_BLOCKING_WORKERS = 8
+
+
+def configure_blocking_pool(max_workers: int) -> None:
+    """
+    Replace the pool used for blocking calls, must be called before the first call to run_blocking
+    """
+    global _blocking_pool
+    with _blocking_pool_lock:
+        if _blocking_pool is not None:
+            _blocking_pool.shutdown(wait=False)
+        _blocking_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="blocking")
+
+
+def get_blocking_pool() -> ThreadPoolExecutor:
+    global _blocking_pool
+    if _blocking_pool is None:
+        with _blocking_pool_lock:
+            if _blocking_pool is None:
+                _blocking_pool = ThreadPoolExecutor(max_workers=_DEFAULT_BLOCKING_WORKERS,
+                                                    thread_name_prefix="blocking")
+    return _blocking_pool
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a blocking callable on the bounded pool and await its result, in a copy of the caller context
+    so that the current trace follows the call
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_blocking_pool(), functools.partial(context.run, func, *args, **kwargs))
+
+
+async def iterate_blocking(iterable: Iterable[Any]) -> AsyncIterator[Any]:
+    """
+    Consume a blocking iterator (a streamed LLM answer for instance) without blocking the event loop
+    """
+    iterator = iter(iterable)
+    exhausted = object()
+    while True:
+        item = await run_blocking(next, iterator, exhausted)
+        if item is exhausted:
+            return
+        yield item
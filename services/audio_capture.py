@@ -0,0 +1,157 @@
+"""Continuous microphone capture cut into speech segments.
+
+A single thread reads the microphone without interruption and writes fixed-size frames into a preallocated
+numpy ring buffer (one row per frame). Each block read is classified frame by frame with vectorised energy and
+zero-crossing rate computations, and a small state machine turns the speech frames into segments: a segment
+starts after start_speech_ms of speech (keeping pre_roll_ms of audio before it) and ends after end_silence_ms of
+silence or max_segment_seconds.
+
+Frames are handed to on_frame as views on the ring buffer, valid until the ring wraps over them ring_seconds
+later, so a consumer keeping a frame must copy it. Segments are copied out of the ring when they are emitted:
+they can wait in the transcription queue for longer than ring_seconds.
+"""
+import logging
+from typing import Callable, Optional
+
+import numpy as np
+import pyaudio
+
+logger = logging.getLogger(__name__)
+
+
+class AudioRingBuffer:
+    """
+    Preallocated ring of capacity_frames frames of frame_samples 16-bit samples, addressed by absolute frame index
+    """
+
+    def __init__(self, capacity_frames: int, frame_samples: int):
+        self.capacity = capacity_frames
+        self.frames = np.zeros((capacity_frames, frame_samples), dtype=np.int16)
+        self.written = 0
+
+    def write(self, block: np.ndarray) -> int:
+        """
+        Write a block of frames (frames x samples), return the absolute index of its first frame
+        """
+        first_index = self.written
+        self.frames[np.arange(first_index, first_index + len(block)) % self.capacity] = block
+        self.written += len(block)
+        return first_index
+
+    def segment(self, start: int, end: int) -> np.ndarray:
+        """
+        Copy of the samples of the frames [start, end) as a flat array
+        """
+        start = max(start, 0, self.written - self.capacity)
+        return self.frames[np.arange(start, end) % self.capacity].reshape(-1)
+
+
+class VoiceActivityDetector:
+    """
+    Frame classification on short-term energy and zero-crossing rate: speech frames are louder than the
+    calibrated noise floor and have a zero-crossing rate in the voice range (hiss and clicks are outside)
+    """
+
+    def __init__(self, energy_factor: float = 3.0, min_energy: float = 2.0e4,
+                 zcr_min: float = 0.01, zcr_max: float = 0.35):
+        self.energy_factor = energy_factor
+        self.min_energy = min_energy
+        self.zcr_min = zcr_min
+        self.zcr_max = zcr_max
+        self.energy_threshold = min_energy
+
+    @staticmethod
+    def features(frames: np.ndarray):
+        samples = frames.astype(np.float32)
+        energy = np.mean(samples * samples, axis=1)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frames.shape[1]
+        return energy, zcr
+
+    def calibrate(self, frames: np.ndarray) -> None:
+        energy, _ = self.features(frames)
+        self.energy_threshold = max(self.min_energy, float(np.median(energy)) * self.energy_factor)
+        logger.info("Voice activity energy threshold calibrated to %.0f", self.energy_threshold)
+
+    def is_speech(self, frames: np.ndarray) -> np.ndarray:
+        energy, zcr = self.features(frames)
+        return (energy > self.energy_threshold) & (zcr >= self.zcr_min) & (zcr <= self.zcr_max)
+
+
+class AudioCapture:
+    """
+    Read the microphone forever, call on_frame with every frame and on_segment with every speech segment
+    """
+
+    def __init__(self, on_segment: Callable[[np.ndarray], None],
+                 on_frame: Optional[Callable[[np.ndarray], None]] = None,
+                 sample_rate: int = 16000, frame_ms: int = 30, frames_per_read: int = 3, ring_seconds: float = 30,
+                 calibration_seconds: float = 2, start_speech_ms: int = 90, end_silence_ms: int = 500,
+                 pre_roll_ms: int = 300, max_segment_seconds: float = 12, device_index: Optional[int] = None,
+                 vad: Optional[VoiceActivityDetector] = None):
+        self.on_segment = on_segment
+        self.on_frame = on_frame
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.frames_per_read = frames_per_read
+        self.device_index = device_index
+        self.vad = vad or VoiceActivityDetector()
+        self.ring = AudioRingBuffer(int(ring_seconds * 1000 / frame_ms), self.frame_samples)
+        self.calibration_frames = max(1, int(calibration_seconds * 1000 / frame_ms))
+        self.start_speech_frames = max(1, start_speech_ms // frame_ms)
+        self.end_silence_frames = max(1, end_silence_ms // frame_ms)
+        self.pre_roll_frames = pre_roll_ms // frame_ms
+        self.max_segment_frames = int(max_segment_seconds * 1000 / frame_ms)
+        self.segments = 0
+        self._speech_run = 0
+        self._silence_run = 0
+        self._segment_start: Optional[int] = None
+
+    def run(self) -> None:
+        audio = pyaudio.PyAudio()
+        stream = audio.open(format=pyaudio.paInt16, channels=1, rate=self.sample_rate, input=True,
+                            input_device_index=self.device_index,
+                            frames_per_buffer=self.frame_samples * self.frames_per_read)
+        try:
+            logger.info("Calibrating microphone... Please wait.")
+            calibration_reads = -(-self.calibration_frames // self.frames_per_read)
+            self.vad.calibrate(np.concatenate([self.__read(stream) for _ in range(calibration_reads)]))
+            logger.info("Microphone calibrated. Start speaking.")
+            while True:
+                self.process_block(self.__read(stream))
+        finally:
+            stream.stop_stream()
+            stream.close()
+            audio.terminate()
+
+    def process_block(self, block: np.ndarray) -> None:
+        """
+        Store a block of frames (frames x samples) and advance the segmentation
+        """
+        first_index = self.ring.write(block)
+        speech = self.vad.is_speech(block)
+        for offset, is_speech in enumerate(speech):
+            index = first_index + offset
+            if self.on_frame is not None:
+                self.on_frame(self.ring.frames[index % self.ring.capacity])
+            self.__advance(index, bool(is_speech))
+
+    def __advance(self, index: int, is_speech: bool) -> None:
+        if self._segment_start is None:
+            self._speech_run = self._speech_run + 1 if is_speech else 0
+            if self._speech_run >= self.start_speech_frames:
+                self._segment_start = index - self._speech_run + 1 - self.pre_roll_frames
+                self._silence_run = 0
+            return
+        self._silence_run = 0 if is_speech else self._silence_run + 1
+        end = index + 1
+        if self._silence_run >= self.end_silence_frames or end - self._segment_start >= self.max_segment_frames:
+            segment = self.ring.segment(self._segment_start, end)
+            self._segment_start = None
+            self._speech_run = 0
+            self.segments += 1
+            self.on_segment(segment)
+
+    def __read(self, stream) -> np.ndarray:
+        data = stream.read(self.frame_samples * self.frames_per_read, exception_on_overflow=False)
+        return np.frombuffer(data, dtype=np.int16).reshape(self.frames_per_read, self.frame_samples)
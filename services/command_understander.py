@@ -1,27 +1,163 @@
 import logging
-import json
-from datetime import datetime
 
 from llm.gemini_ai_llm import GeminiAILLM
 from llm.grok_ai_llm import GrokAiLLM
+from llm.llm_router import LLMRouter
+from llm.local_llm import LocalLLM
 from llm.open_ai_llm import OpenAiLLM
+from llm.streaming_json_parser import StreamingAnswerParser
 from services.file_logger import FileLoggerService
+from services.intent_matcher import IntentMatcher
+from services.response_cache import ResponseCache
+from services.tracing import tracer
 
 logger = logging.getLogger(__name__)
 file_logger = FileLoggerService("logs/command_log.log")
 
+LLM_BACKENDS = {
+    'gemini': GeminiAILLM,
+    'openai': OpenAiLLM,
+    'grok': GrokAiLLM,
+    'local': LocalLLM,
+}
+
 class CommandUnderstander:
-    def __init__(self, configuration):
+    def __init__(self, configuration, llm=None):
         managers = configuration['available_managers']
-        self.llm = GeminiAILLM()
+        self.llm = llm if llm is not None else self.__create_llm(configuration.get('llm', {}))
         self.llm.configure_services_for_prompt(managers)
+        self.intent_matcher = IntentMatcher(configuration)
+        cache_configuration = configuration.get('response_cache', {})
+        self.response_cache = None
+        if cache_configuration.get('enabled', True):
+            self.response_cache = ResponseCache(
+                path=cache_configuration.get('path', 'cache/llm_responses.json'),
+                max_entries=cache_configuration.get('max_entries', 512),
+                ttl_seconds=cache_configuration.get('ttl_hours', 168) * 3600,
+                prompt_fingerprint=self.llm.prompt_fingerprint,
+                wake_word=configuration.get('assistant_name')
+            )
+
+    @staticmethod
+    def __create_llm(llm_configuration):
+        """
+        Route the requests over the configured backends, a backend that cannot be created (missing API key,
+        missing local model...) is left out. The options of a backend are read from the section named after it
+        """
+        backends = {}
+        for backend_name in llm_configuration.get('backends', ['gemini']):
+            try:
+                backends[backend_name] = LLM_BACKENDS[backend_name](**llm_configuration.get(backend_name, {}))
+            except Exception:
+                logger.exception("LLM backend %s unavailable", backend_name)
+        hedge_delay_ms = llm_configuration.get('hedge_delay_ms')
+        return LLMRouter(
+            backends,
+            hedge_delay=hedge_delay_ms / 1000 if hedge_delay_ms is not None else None,
+            window=llm_configuration.get('latency_window', 50),
+            max_error_rate=llm_configuration.get('max_error_rate', 0.5),
+            unhealthy_cooldown=llm_configuration.get('unhealthy_cooldown_s', 60)
+        )
 
     def interpret_and_jsonify(self, command_phrase):
         logger.info("Exec command %s", command_phrase)
-        start = datetime.now()
-        llm_answer = self.llm.interpret_request(command_phrase)
-        end = datetime.now()
-        delta = end - start
-        file_logger.info(f"{end} interpret \"{command_phrase}\" in {delta.total_seconds() * 1000} milliseconds")
+        known_answer = self.__known_answer(command_phrase)
+        if known_answer is not None:
+            return known_answer
+        with tracer.span("llm", streamed=False) as span:
+            llm_answer = self.llm.interpret_request(command_phrase)
+            self.__trace_usage(span)
         logger.info("Llm answer: %s", llm_answer)
-        return json.loads(llm_answer)
\ No newline at end of file
+        return self.__remember(command_phrase, llm_answer)
+
+    def interpret_and_dispatch(self, command_phrase, on_command, on_answer, on_answer_delta=None):
+        """
+        Interpret a command phrase while the LLM is still streaming its answer: every command is handed to
+        on_command as soon as it is complete and the answer text to on_answer as soon as it is closed.
+        on_answer_delta, when given, receives the answer text piece by piece while it is streamed
+        """
+        logger.info("Exec command %s", command_phrase)
+        known_answer = self.__known_answer(command_phrase)
+        if known_answer is not None:
+            for command in known_answer.get('commands', []):
+                on_command(command)
+            on_answer(known_answer['answer'])
+            return known_answer
+        parser = StreamingAnswerParser(self.__validated(on_command), on_answer, on_answer_delta)
+        with tracer.span("llm", streamed=True) as span:
+            for chunk in self.llm.interpret_request_stream(command_phrase):
+                parser.feed(chunk)
+            self.__trace_usage(span)
+        logger.info("Llm answer: %s", parser.text)
+        return self.__remember(command_phrase, parser.text)
+
+    async def interpret_and_dispatch_async(self, command_phrase, on_command, on_answer, on_answer_delta=None):
+        """
+        Awaitable variant of interpret_and_dispatch, on_command and on_answer are coroutine functions,
+        on_answer_delta is a plain function
+        """
+        logger.info("Exec command %s", command_phrase)
+        known_answer = self.__known_answer(command_phrase)
+        if known_answer is not None:
+            for command in known_answer.get('commands', []):
+                await on_command(command)
+            await on_answer(known_answer['answer'])
+            return known_answer
+        # The parser callbacks are synchronous, parsed items are awaited after each chunk
+        parsed_items = []
+        parser = StreamingAnswerParser(self.__validated(lambda command: parsed_items.append((on_command, command))),
+                                       lambda answer: parsed_items.append((on_answer, answer)),
+                                       on_answer_delta)
+        with tracer.span("llm", streamed=True) as span:
+            async for chunk in self.llm.interpret_request_stream_async(command_phrase):
+                parser.feed(chunk)
+                while parsed_items:
+                    callback, item = parsed_items.pop(0)
+                    await callback(item)
+            self.__trace_usage(span)
+        logger.info("Llm answer: %s", parser.text)
+        return self.__remember(command_phrase, parser.text)
+
+    def __known_answer(self, command_phrase):
+        """
+        Answer without the LLM, from the local intent matcher or from the response cache
+        """
+        with tracer.span("intent_match") as span:
+            local_answer = self.intent_matcher.match(command_phrase)
+            if local_answer is not None:
+                logger.info("Command matched locally: %s", local_answer)
+                span.set_attribute("source", "intent_matcher")
+                return local_answer
+            if self.response_cache is not None:
+                cached_answer = self.response_cache.get(command_phrase)
+                file_logger.info(f"response cache {'hit' if cached_answer is not None else 'miss'} for \"{command_phrase}\", "
+                                 f"hit rate {self.response_cache.hit_rate:.1%}")
+                span.set_attribute("source", "response_cache" if cached_answer is not None else None)
+                return cached_answer
+            return None
+
+    def __trace_usage(self, span):
+        """
+        Attach the backend that answered and the token usage it reported to the LLM span
+        """
+        span.set_attribute("backend", getattr(self.llm, 'last_backend', None) or type(self.llm).__name__)
+        usage = self.llm.last_usage or {}
+        span.set_attribute("tokens.prompt", usage.get("prompt_tokens"))
+        span.set_attribute("tokens.cached", usage.get("cached_tokens"))
+        span.set_attribute("tokens.completion", usage.get("output_tokens"))
+
+    def __validated(self, on_command):
+        """
+        Wrap a command callback so that streamed commands are checked against the command schema before dispatch
+        """
+        def on_valid_command(command):
+            command = self.llm.command_schema.repair_command(command)
+            if command is not None:
+                on_command(command)
+        return on_valid_command
+
+    def __remember(self, command_phrase, llm_answer):
+        llm_answer_as_json = self.llm.command_schema.parse_answer(llm_answer)
+        if self.response_cache is not None and llm_answer_as_json['commands']:
+            self.response_cache.put(command_phrase, llm_answer_as_json)
+        return llm_answer_as_json
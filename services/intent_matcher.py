@@ -0,0 +1,196 @@
+import json
+import logging
+import re
+from itertools import combinations
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from plugs.hue_plug.hue_configuration_type import HueConfigurationType
+from plugs.hue_plug.hue_light_index import HueLightIndex
+from services.text_normalizer import SPOKEN_FILLER_WORDS, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Words mapped to the action they express, everything that is neither an action, a filler nor a known target
+# makes the utterance fall back to the LLM
+ACTION_WORDS = {
+    'allume': 'on', 'allumer': 'on', 'allumez': 'on',
+    'eteins': 'off', 'eteindre': 'off', 'eteignez': 'off', 'coupe': 'off', 'couper': 'off',
+    'aspire': 'clean', 'aspirer': 'clean', 'nettoie': 'clean', 'nettoyer': 'clean',
+    'arrete': 'stop', 'arreter': 'stop', 'stoppe': 'stop', 'stop': 'stop',
+    'pause': 'pause',
+    'reprends': 'play', 'reprendre': 'play', 'lecture': 'play',
+}
+
+FILLER_WORDS = SPOKEN_FILLER_WORDS | {
+    'le', 'la', 'les', 'l', 'un', 'une', 'du', 'de', 'des', 'd', 'dans', 'sur', 'a', 'au', 'aux', 'en',
+    'lumiere', 'lumieres', 'lampe', 'lampes', 'eclairage', 'passe', 'mets', 'met',
+    'veux', 'voudrais', 'je', 'me', 'bien', 'maintenant',
+}
+
+# The vacuum is only addressed when it is named or given a room: "stop" alone is also how the speech is interrupted
+VACUUM_WORDS = ('aspirateur', 'robot')
+
+# Verbs only understood as an action once the vacuum is named: "lance l'aspirateur" but not "lance le salon"
+VACUUM_ACTION_WORDS = {'lance': 'clean'}
+
+ALL_WORDS = ('tout', 'toute', 'toutes', 'tous', 'maison')
+
+TARGET_SEPARATORS = {'et'}
+
+# Home Assistant script names are written in english ("switch_on_tv_box")
+SCRIPT_ACTION_WORDS = {'on': 'on', 'off': 'off', 'pause': 'pause', 'play': 'play'}
+SCRIPT_WORD_SYNONYMS = {'tele': 'tv', 'television': 'tv'}
+
+STOCK_ANSWERS = {
+    'on': "Bien, Monsieur, c'est allumé.",
+    'off': "Bien, Monsieur, c'est éteint.",
+    'clean': "Fort bien, Monsieur, je lance le nettoyage.",
+    'stop': "Entendu, Monsieur, l'aspirateur regagne sa base.",
+    'pause': "Bien, Monsieur, je mets en pause.",
+    'play': "Bien, Monsieur, je reprends la lecture.",
+}
+
+# (action, target words) -> (manager name, command name, ids or script name)
+IntentKey = Tuple[str, FrozenSet[str]]
+IntentValue = Tuple[str, str, Any]
+
+_AMBIGUOUS = ('', '', None)
+
+
+class IntentMatcher:
+    """
+    Deterministic matcher answering the most common utterances without calling the LLM.
+
+    Every (action, target) pair the plugs can serve is precomputed from the plug documentations and
+    configurations, matching an utterance is then a tokenization followed by dictionary lookups.
+    An utterance only matches when every word is understood, anything else returns None.
+    """
+
+    def __init__(self, configuration):
+        self.wake_word = configuration.get('assistant_name')
+        self._intents: Dict[IntentKey, IntentValue] = {}
+        for manager_name in configuration.get('available_managers', []):
+            documented_commands = self.__load_documented_commands(manager_name)
+            builder = getattr(self, f'_register_{manager_name}_intents', None)
+            if builder is not None:
+                builder(self.__load_configuration(manager_name), documented_commands)
+        logger.info("Local intent matcher ready with %d intents", len(self._intents))
+
+    def match(self, utterance: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the {"answer", "commands"} structure for the utterance, or None if it must go to the LLM
+        """
+        tokens = [SCRIPT_WORD_SYNONYMS.get(token, token)
+                  for token in tokenize(utterance, self.wake_word) if token not in FILLER_WORDS]
+        action_words = ACTION_WORDS
+        if any(token in VACUUM_WORDS for token in tokens):
+            action_words = {**ACTION_WORDS, **VACUUM_ACTION_WORDS}
+        actions = {action_words[token] for token in tokens if token in action_words}
+        if len(actions) != 1:
+            return None
+        action = actions.pop()
+
+        groups: List[List[str]] = [[]]
+        for token in tokens:
+            if token in TARGET_SEPARATORS:
+                groups.append([])
+            elif token not in action_words:
+                groups[-1].append(token)
+
+        resolved = [self._intents.get((action, frozenset(group))) for group in groups]
+        if any(value is None or value is _AMBIGUOUS for value in resolved):
+            return None
+
+        manager_name, command_name, _ = resolved[0]
+        if any(value[:2] != (manager_name, command_name) for value in resolved):
+            return None
+        arguments = [value[2] for value in resolved]
+        if len(arguments) > 1 and not all(isinstance(argument, list) for argument in arguments):
+            return None
+
+        if arguments[0] is None:
+            params = []
+        elif isinstance(arguments[0], list):
+            params = [sorted({light_id for argument in arguments for light_id in argument})]
+        else:
+            params = [arguments[0]]
+
+        return {
+            "answer": STOCK_ANSWERS[action],
+            "commands": [{"manager_name": manager_name, "command_name": command_name, "params": params}]
+        }
+
+    def _register(self, action: str, words: Iterable[str], value: IntentValue) -> None:
+        key = (action, frozenset(word for word in words if word not in FILLER_WORDS))
+        existing = self._intents.get(key)
+        if existing is None:
+            self._intents[key] = value
+        elif existing != value:
+            self._intents[key] = _AMBIGUOUS
+
+    def _register_all_targets(self, action: str, value: IntentValue, extra_words: Iterable[str] = ()) -> None:
+        for size in range(1, len(ALL_WORDS) + 1):
+            for words in combinations(ALL_WORDS, size):
+                self._register(action, [*extra_words, *words], value)
+
+    def _register_hue_intents(self, configuration, documented_commands):
+        config = HueConfigurationType(**configuration)
+        light_index = HueLightIndex(config.hue_lights)
+
+        for action, command_name in (('on', 'turn_on_lights'), ('off', 'turn_off_lights')):
+            if command_name not in documented_commands:
+                continue
+            for light in config.hue_lights:
+                self._register(action, tokenize(light.name),
+                               ('hue', command_name, sorted(light_index.paired_groups[int(light.id)])))
+            for room_key, ids in light_index.room_ids.items():
+                self._register(action, tokenize(light_index.room_names[room_key]), ('hue', command_name, ids))
+            self._register_all_targets(action, ('hue', command_name, light_index.all_ids))
+
+    def _register_roborock_intents(self, configuration, documented_commands):
+        if 'clean_room' in documented_commands:
+            rooms: Dict[str, List[int]] = {}
+            for room in configuration.get('rooms', []):
+                rooms.setdefault(room['name'], []).append(int(room['id']))
+            for room, ids in rooms.items():
+                for vacuum_words in ((), *((word,) for word in VACUUM_WORDS)):
+                    self._register('clean', [*vacuum_words, *tokenize(room)], ('roborock', 'clean_room', sorted(ids)))
+        for vacuum_word in VACUUM_WORDS:
+            if 'clean_entire_house' in documented_commands:
+                self._register('clean', [vacuum_word], ('roborock', 'clean_entire_house', None))
+                self._register_all_targets('clean', ('roborock', 'clean_entire_house', None), [vacuum_word])
+            if 'finish_cleaning' in documented_commands:
+                self._register('stop', [vacuum_word], ('roborock', 'finish_cleaning', None))
+        if 'clean_entire_house' in documented_commands:
+            self._register_all_targets('clean', ('roborock', 'clean_entire_house', None))
+
+    def _register_home_assistant_intents(self, configuration, documented_commands):
+        for script_name in documented_commands.get('use_ha_script', []):
+            words = script_name.split('_')
+            actions = {SCRIPT_ACTION_WORDS[word] for word in words if word in SCRIPT_ACTION_WORDS}
+            if len(actions) != 1:
+                continue
+            action = actions.pop()
+            target = [word for word in words if word not in SCRIPT_ACTION_WORDS and word != 'switch']
+            # "allume la tv" must reach "switch_on_tv_box": register every subset of the target words,
+            # collisions between scripts are marked ambiguous by _register
+            for size in range(1, len(target) + 1):
+                for words_subset in combinations(target, size):
+                    self._register(action, words_subset, ('home_assistant', 'use_ha_script', script_name))
+
+    @staticmethod
+    def __load_configuration(manager_name: str) -> Dict[str, Any]:
+        with open(f'plugs/{manager_name}_plug/{manager_name}_configuration.json', 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    @staticmethod
+    def __load_documented_commands(manager_name: str) -> Dict[str, List[str]]:
+        """
+        Map every documented command name to the literal values found in its params
+        """
+        with open(f'plugs/{manager_name}_plug/{manager_name}_documentation.json', 'r', encoding='utf-8') as file:
+            documentation = json.load(file)
+        return {
+            function['name']: re.findall(r"'(\w+)'", ','.join(function.get('params', [])))
+            for function in documentation.get('functions', [])
+        }
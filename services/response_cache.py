@@ -0,0 +1,101 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from services.text_normalizer import normalize_transcript
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Persistent LRU cache of the LLM answers, keyed on the normalized transcript and on the prompt fingerprint.
+
+    Entries expire after ttl_seconds, the least recently used ones are evicted above max_entries and the
+    whole cache is written to path after every insertion so it survives restarts.
+    """
+
+    def __init__(self, path: str = 'cache/llm_responses.json', max_entries: int = 512,
+                 ttl_seconds: float = 7 * 24 * 3600, prompt_fingerprint: str = '', wake_word: Optional[str] = None):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.prompt_fingerprint = prompt_fingerprint or ''
+        self.wake_word = wake_word
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.__load()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "hit_rate": self.hit_rate}
+
+    def key_for(self, command_phrase: str) -> str:
+        transcript = normalize_transcript(command_phrase, self.wake_word)
+        return hashlib.sha256(f"{self.prompt_fingerprint}\n{transcript}".encode('utf-8')).hexdigest()
+
+    def get(self, command_phrase: str) -> Optional[Dict[str, Any]]:
+        key = self.key_for(command_phrase)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry['created_at'] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry['answer']
+
+    def put(self, command_phrase: str, answer: Dict[str, Any]) -> None:
+        key = self.key_for(command_phrase)
+        with self._lock:
+            self._entries[key] = {
+                "transcript": normalize_transcript(command_phrase, self.wake_word),
+                "answer": answer,
+                "created_at": time.time(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.__save()
+
+    def __load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as cache_file:
+                stored_entries = json.load(cache_file)
+        except (OSError, ValueError):
+            logger.exception("Unable to read the response cache %s, starting with an empty cache", self.path)
+            return
+        now = time.time()
+        for key, entry in stored_entries.items():
+            if now - entry.get('created_at', 0) <= self.ttl_seconds:
+                self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        logger.info("Loaded %d cached LLM answers from %s", len(self._entries), self.path)
+
+    def __save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        try:
+            with open(temporary_path, 'w', encoding='utf-8') as cache_file:
+                json.dump(self._entries, cache_file, ensure_ascii=False)
+            os.replace(temporary_path, self.path)
+        except OSError:
+            logger.exception("Unable to write the response cache to %s", self.path)
@@ -0,0 +1,217 @@
+"""Speech to text engines used by the voice pipeline.
+
+Every engine takes raw 16-bit mono PCM. GoogleSpeechToText sends it to the Google Web Speech API through
+speech_recognition; VoskSpeechToText decodes it on the CPU with a Vosk model kept loaded for the whole process
+and reports partial results while decoding. create_speech_to_text picks the engine from the "speech_to_text"
+section of the configuration, with an optional fallback engine.
+"""
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional
+
+import speech_recognition as sr
+
+try:
+    import vosk
+except ImportError:  # pragma: no cover - optional dependency, the local engine is then unavailable
+    vosk = None
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_WIDTH = 2
+
+
+class SpeechToTextError(Exception):
+    pass
+
+
+class SpeechToTextStream(ABC):
+    """
+    Incremental transcription of a phrase fed frame by frame
+    """
+
+    @abstractmethod
+    def accept(self, pcm) -> Optional[str]:
+        """
+        Feed the next frames, return the partial transcript when the engine has one
+        """
+
+    @abstractmethod
+    def finish(self) -> Optional[str]:
+        """
+        Return the final transcript, None when nothing was understood
+        """
+
+
+class _BufferedStream(SpeechToTextStream):
+    """
+    Stream of the engines without incremental decoding: frames are buffered and transcribed at the end
+    """
+
+    def __init__(self, engine: "SpeechToText", sample_rate: int):
+        self.engine = engine
+        self.sample_rate = sample_rate
+        self.frames: List[bytes] = []
+
+    def accept(self, pcm) -> Optional[str]:
+        self.frames.append(bytes(pcm))
+        return None
+
+    def finish(self) -> Optional[str]:
+        return self.engine.transcribe(b''.join(self.frames), self.sample_rate)
+
+
+class SpeechToText(ABC):
+    name = None
+
+    @abstractmethod
+    def transcribe(self, pcm, sample_rate: int) -> Optional[str]:
+        """
+        Transcribe a whole phrase, None when nothing was understood. Raise SpeechToTextError when the engine failed
+        """
+
+    def start_stream(self, sample_rate: int) -> SpeechToTextStream:
+        return _BufferedStream(self, sample_rate)
+
+
+class GoogleSpeechToText(SpeechToText):
+    name = "google"
+
+    def __init__(self, language: str = "fr-FR"):
+        self.language = language
+        self.recognizer = sr.Recognizer()
+
+    def transcribe(self, pcm, sample_rate: int) -> Optional[str]:
+        try:
+            return self.recognizer.recognize_google(sr.AudioData(bytes(pcm), sample_rate, SAMPLE_WIDTH),
+                                                    language=self.language)
+        except sr.UnknownValueError:
+            logger.warning("Google Speech Recognition could not understand audio")
+            return None
+        except sr.RequestError as e:
+            raise SpeechToTextError(f"Could not request results from Google Speech Recognition service; {e}") from e
+
+
+class _VoskStream(SpeechToTextStream):
+    """
+    Vosk closes a segment at every pause it takes for an endpoint (AcceptWaveform returns True), the text of the
+    closed segments is kept and joined with the last one, so a phrase with a pause is transcribed whole
+    """
+
+    def __init__(self, recognizer, on_partial: Optional[Callable[[str], None]]):
+        self.recognizer = recognizer
+        self.on_partial = on_partial
+        self.segments: List[str] = []
+        self.last_partial = ''
+
+    def accept(self, pcm) -> Optional[str]:
+        if self.recognizer.AcceptWaveform(bytes(pcm)):
+            segment = json.loads(self.recognizer.Result()).get('text', '')
+            if segment:
+                self.segments.append(segment)
+            partial = self.__joined('')
+        else:
+            partial = self.__joined(json.loads(self.recognizer.PartialResult()).get('partial', ''))
+        if partial and partial != self.last_partial:
+            self.last_partial = partial
+            if self.on_partial is not None:
+                self.on_partial(partial)
+        return partial or None
+
+    def finish(self) -> Optional[str]:
+        return self.__joined(json.loads(self.recognizer.FinalResult()).get('text', '')) or None
+
+    def __joined(self, current: str) -> str:
+        return ' '.join([*self.segments, current] if current else self.segments)
+
+
+class VoskSpeechToText(SpeechToText):
+    """
+    Local engine, the model is loaded once per path and shared by every instance
+    """
+
+    name = "vosk"
+
+    _models: Dict[str, object] = {}
+    _models_lock = threading.Lock()
+
+    # Frames handed to the recognizer at once when a whole phrase is transcribed
+    CHUNK_BYTES = 8000
+
+    def __init__(self, model_path: str, on_partial: Optional[Callable[[str], None]] = None):
+        if vosk is None:
+            raise SpeechToTextError("The vosk library is not installed")
+        vosk.SetLogLevel(-1)
+        with self._models_lock:
+            if model_path not in self._models:
+                logger.info("Loading Vosk model %s", model_path)
+                self._models[model_path] = vosk.Model(model_path)
+            self.model = self._models[model_path]
+        self.on_partial = on_partial
+
+    def create_recognizer(self, sample_rate: int, grammar: Optional[List[str]] = None):
+        if grammar is None:
+            return vosk.KaldiRecognizer(self.model, sample_rate)
+        return vosk.KaldiRecognizer(self.model, sample_rate, json.dumps(grammar, ensure_ascii=False))
+
+    def start_stream(self, sample_rate: int) -> SpeechToTextStream:
+        return _VoskStream(self.create_recognizer(sample_rate), self.on_partial)
+
+    def transcribe(self, pcm, sample_rate: int) -> Optional[str]:
+        stream = self.start_stream(sample_rate)
+        pcm = memoryview(pcm).cast('B')
+        for offset in range(0, len(pcm), self.CHUNK_BYTES):
+            stream.accept(pcm[offset:offset + self.CHUNK_BYTES])
+        return stream.finish()
+
+
+class FallbackSpeechToText(SpeechToText):
+    """
+    Use the primary engine and switch to the fallback one for the phrases the primary engine failed on
+    """
+
+    def __init__(self, primary: SpeechToText, fallback: SpeechToText):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f"{primary.name} (fallback {fallback.name})"
+
+    def transcribe(self, pcm, sample_rate: int) -> Optional[str]:
+        try:
+            return self.primary.transcribe(pcm, sample_rate)
+        except Exception:
+            logger.exception("%s speech to text failed, using %s", self.primary.name, self.fallback.name)
+            return self.fallback.transcribe(pcm, sample_rate)
+
+    def start_stream(self, sample_rate: int) -> SpeechToTextStream:
+        return self.primary.start_stream(sample_rate)
+
+
+def create_speech_to_text(configuration, on_partial: Optional[Callable[[str], None]] = None) -> SpeechToText:
+    """
+    Build the engine configured in the "speech_to_text" section, Google when the section is missing.
+    When the configured engine cannot be created the fallback engine is used alone
+    """
+    stt_configuration = configuration.get('speech_to_text', {})
+    language = stt_configuration.get('language', 'fr-FR')
+
+    def create(engine_name):
+        if engine_name == 'google':
+            return GoogleSpeechToText(language)
+        if engine_name == 'vosk':
+            return VoskSpeechToText(stt_configuration.get('vosk', {}).get('model_path'), on_partial)
+        raise SpeechToTextError(f"Unknown speech to text engine {engine_name}")
+
+    engine_name = stt_configuration.get('engine', 'google')
+    fallback_name = stt_configuration.get('fallback')
+    try:
+        engine = create(engine_name)
+    except Exception:
+        if not fallback_name:
+            raise
+        logger.exception("Speech to text engine %s unavailable, using %s", engine_name, fallback_name)
+        return create(fallback_name)
+    if fallback_name and fallback_name != engine_name:
+        return FallbackSpeechToText(engine, create(fallback_name))
+    return engine
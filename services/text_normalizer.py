@@ -0,0 +1,43 @@
+import re
+import unicodedata
+from typing import Iterable, List, Optional
+
+_NON_WORD_PATTERN = re.compile(r"[^a-z0-9]+")
+
+# Words carrying no intent in a spoken request, already normalized
+SPOKEN_FILLER_WORDS = frozenset({
+    'euh', 'heu', 'hum', 'bon', 'alors', 'donc', 'hein', 'ben', 'bah', 'voila', 'please', 'merci',
+    'stp', 'svp', 's', 'il', 'te', 'vous', 'plait', 'peux', 'pourrais', 'pouvez', 'tu', 'moi',
+})
+
+
+def strip_accents(text: str) -> str:
+    """
+    Remove the diacritics of a text ("éteins" becomes "eteins")
+    """
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def normalize_text(text: str) -> str:
+    """
+    Lowercase a text, remove its accents and replace punctuation (apostrophes included) by single spaces
+    """
+    return _NON_WORD_PATTERN.sub(' ', strip_accents(text).lower()).strip()
+
+
+def tokenize(text: str, wake_word: Optional[str] = None, ignored_words: Iterable[str] = ()) -> List[str]:
+    """
+    Split a normalized text into words, dropping every occurrence of the wake word and of the ignored words
+    """
+    ignored_words = set(ignored_words)
+    if wake_word:
+        ignored_words.add(normalize_text(wake_word))
+    return [token for token in normalize_text(text).split() if token not in ignored_words]
+
+
+def normalize_transcript(text: str, wake_word: Optional[str] = None) -> str:
+    """
+    Canonical form of a transcript: no case, no accents, no wake word and no filler words
+    """
+    return ' '.join(tokenize(text, wake_word, SPOKEN_FILLER_WORDS))
@@ -0,0 +1,208 @@
+"""Per utterance tracing of the voice pipeline.
+
+Every captured phrase starts a Trace with its own trace id, each stage it goes through (capture, speech to
+text, LLM, manager commands, speech) records a Span in it. The current trace and span live in context
+variables: asyncio tasks inherit them when they are created and run_blocking hands them over to the blocking
+pool, so the code of a stage only has to open `tracer.span(...)` to be attached to the right utterance.
+
+Finished spans are appended to a JSON lines file with the field names of the OpenTelemetry span model
+(trace_id, span_id, parent_span_id, start_time_unix_nano...) by a writer thread, so that ending a span on
+the event loop never waits for the disk. trace_summary.py reports the latency percentiles of every stage from
+this file.
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("current_trace", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, trace: "Trace", name: str, parent_span_id: Optional[str] = None,
+                 attributes: Optional[Dict[str, Any]] = None, start_time_unix_nano: Optional[int] = None):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = "OK"
+        self.start_time_unix_nano = start_time_unix_nano or time.time_ns()
+        self.end_time_unix_nano: Optional[int] = None
+        self._start_counter = time.perf_counter_ns()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_error(self, error: BaseException) -> None:
+        self.status = "ERROR"
+        self.attributes["error.type"] = type(error).__name__
+        self.attributes["error.message"] = str(error)
+
+    def end(self, end_time_unix_nano: Optional[int] = None) -> None:
+        if self.end_time_unix_nano is not None:
+            return
+        # The duration comes from the monotonic clock, the wall clock only anchors the span
+        self.end_time_unix_nano = end_time_unix_nano or (
+            self.start_time_unix_nano + time.perf_counter_ns() - self._start_counter)
+        self.trace.tracer.export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_time_unix_nano,
+            "end_time_unix_nano": self.end_time_unix_nano,
+            "duration_ms": round((self.end_time_unix_nano - self.start_time_unix_nano) / 1e6, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoSpan:
+    """
+    Span handed out when there is no current trace (or tracing is disabled), every call is a no-op
+    """
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_error(self, error: BaseException) -> None:
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+class Trace:
+    """
+    One utterance, from its capture to the end of the spoken answer
+    """
+
+    def __init__(self, tracer: "Tracer", name: str = "utterance"):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = os.urandom(16).hex()
+
+    def record_span(self, name: str, start_time_unix_nano: int, end_time_unix_nano: int,
+                    **attributes) -> Span:
+        """
+        Record a span measured elsewhere, the capture of the audio for instance
+        """
+        span = Span(self, name, None, attributes, start_time_unix_nano)
+        span.end(end_time_unix_nano)
+        return span
+
+
+class Tracer:
+    """
+    Create the traces and write their finished spans to path, one JSON object per line
+    """
+
+    def __init__(self, path: str = 'logs/traces.jsonl', enabled: bool = True):
+        self.path = path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._pending: queue.Queue = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._file = None
+
+    def start_trace(self, name: str = "utterance") -> Optional[Trace]:
+        return Trace(self, name) if self.enabled else None
+
+    @staticmethod
+    def current_trace() -> Optional[Trace]:
+        return _current_trace.get()
+
+    @contextmanager
+    def activate(self, trace: Optional[Trace]) -> Iterator[Optional[Trace]]:
+        """
+        Make trace the current one for the enclosed code, the tasks it creates included
+        """
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(None)
+        try:
+            yield trace
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Any]:
+        """
+        Time the enclosed code as a child of the current span, an exception marks the span as failed
+        """
+        trace = _current_trace.get()
+        if trace is None:
+            yield NO_SPAN
+            return
+        parent = _current_span.get()
+        span = Span(trace, name, parent.span_id if parent is not None else None, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as error:
+            span.set_error(error)
+            raise
+        finally:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # Closed from another context than the one it was opened in (a generator resumed by another thread)
+                _current_span.set(parent)
+            span.end()
+
+    def export(self, span: Span) -> None:
+        """
+        Hand a finished span to the writer thread, never blocks
+        """
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_spans, name="trace-writer", daemon=True)
+                self._writer.start()
+        self._pending.put(span)
+
+    def flush(self) -> None:
+        """
+        Wait until every span exported so far is written to the file
+        """
+        self._pending.join()
+
+    def _write_spans(self) -> None:
+        while True:
+            span = self._pending.get()
+            try:
+                if self._file is None:
+                    Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+                    self._file = open(self.path, 'a', encoding='utf-8')
+                self._file.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+                # Flushed once the spans of a burst are written rather than after every one of them
+                if self._pending.empty():
+                    self._file.flush()
+            except OSError:
+                logger.exception("Unable to write the span %s to %s", span.name, self.path)
+            finally:
+                self._pending.task_done()
+
+
+tracer = Tracer()
+
+
+def configure_tracing(path: str = 'logs/traces.jsonl', enabled: bool = True) -> None:
+    """
+    Set the output of the shared tracer, must be called before the first trace is started
+    """
+    tracer.path = path
+    tracer.enabled = enabled
@@ -0,0 +1,112 @@
+import hashlib
+import logging
+import os
+import threading
+import wave
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RenderedAudio(NamedTuple):
+    frames: bytes
+    sample_rate: int
+    sample_width: int
+    channels: int
+
+
+class TtsAudioCache:
+    """
+    Synthesised speech keyed by (text, voice, rate), stored as WAV files in directory and kept in memory.
+
+    Both stores are LRU bounded in bytes: the memory one by memory_max_bytes, the disk one by disk_max_bytes
+    (the modification time of a file is refreshed each time it is used). The disk store survives restarts,
+    so a phrase is only synthesised once.
+    """
+
+    def __init__(self, directory: str = 'cache/tts', memory_max_bytes: int = 16 * 1024 * 1024,
+                 disk_max_bytes: int = 128 * 1024 * 1024):
+        self.directory = directory
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: "OrderedDict[str, RenderedAudio]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key_for(text: str, voice: str, rate: int) -> str:
+        return hashlib.sha256(f"{voice}\n{rate}\n{text.strip()}".encode('utf-8')).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.wav")
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            if key in self._entries:
+                return True
+        return os.path.exists(self.path_for(key))
+
+    def get(self, key: str) -> Optional[RenderedAudio]:
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return audio
+        audio = self.__load(key)
+        with self._lock:
+            if audio is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.__keep_in_memory(key, audio)
+        return audio
+
+    def store(self, key: str, rendered_path: str) -> Optional[RenderedAudio]:
+        """
+        Move a freshly rendered WAV file into the store and keep its audio in memory
+        """
+        os.replace(rendered_path, self.path_for(key))
+        audio = self.__load(key)
+        if audio is not None:
+            with self._lock:
+                self.__keep_in_memory(key, audio)
+            self.__evict_from_disk()
+        return audio
+
+    def __keep_in_memory(self, key: str, audio: RenderedAudio) -> None:
+        if key in self._entries:
+            self._memory_bytes -= len(self._entries.pop(key).frames)
+        self._entries[key] = audio
+        self._memory_bytes += len(audio.frames)
+        while self._memory_bytes > self.memory_max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._memory_bytes -= len(evicted.frames)
+
+    def __load(self, key: str) -> Optional[RenderedAudio]:
+        path = self.path_for(key)
+        try:
+            with wave.open(path, 'rb') as wav_file:
+                audio = RenderedAudio(wav_file.readframes(wav_file.getnframes()), wav_file.getframerate(),
+                                      wav_file.getsampwidth(), wav_file.getnchannels())
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (wave.Error, EOFError):
+            logger.warning("Dropping the unreadable cached speech %s", path)
+            os.remove(path)
+            return None
+        return audio if audio.frames else None
+
+    def __evict_from_disk(self) -> None:
+        files = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.wav')]
+        total_bytes = sum(entry.stat().st_size for entry in files)
+        for entry in sorted(files, key=lambda file_entry: file_entry.stat().st_mtime):
+            if total_bytes <= self.disk_max_bytes:
+                break
+            total_bytes -= entry.stat().st_size
+            os.remove(entry.path)
@@ -0,0 +1,141 @@
+"""Staged voice pipeline: capture -> transcription -> interpretation -> execution -> speech.
+
+Every stage is an asyncio task fed by a bounded queue, all of them sharing one event loop.
+The queue right behind the microphone drops its oldest item when full so that
+capture never blocks; every other stage applies backpressure by suspending the
+upstream stage until there is room, which eventually pushes the overflow back
+to the capture queue where stale audio is discarded first.
+
+The interpretation stage streams the LLM answer and forwards every command to
+the execution stage and the answer text to the speech stage as soon as each
+of them is complete, so lights can react before the model has finished.
+Commands run as tasks, at most max_in_flight_commands at a time.
+
+Every item travels with the trace of its utterance, which is made current while the item is handled.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from services.tracing import Trace, tracer
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineStage:
+    """
+    A single asyncio task consuming a bounded queue and awaiting a handler for each item.
+    """
+
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable[None]], maxsize: int = 4,
+                 drop_oldest: bool = False):
+        self.name = name
+        self.handler = handler
+        self.drop_oldest = drop_oldest
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name=f"pipeline-{self.name}")
+
+    async def submit(self, item: Any) -> None:
+        """
+        Queue an item for this stage, dropping the oldest pending one or waiting depending on the stage policy
+        """
+        if self.drop_oldest:
+            self.submit_nowait(item)
+        else:
+            await self.queue.put((tracer.current_trace(), item))
+
+    def submit_nowait(self, item: Any, trace: Optional[Trace] = None) -> None:
+        trace = trace or tracer.current_trace()
+        while True:
+            try:
+                self.queue.put_nowait((trace, item))
+                return
+            except asyncio.QueueFull:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                    logger.warning("Pipeline stage %s is saturated, dropped its oldest item (%d dropped so far)",
+                                   self.name, self.dropped)
+                except asyncio.QueueEmpty:
+                    pass
+
+    async def _run(self) -> None:
+        while True:
+            trace, item = await self.queue.get()
+            try:
+                with tracer.activate(trace):
+                    await self.handler(item)
+            except Exception:
+                logger.exception("Pipeline stage %s failed to handle an item", self.name)
+
+
+class VoicePipeline:
+    """
+    Wire the transcription, interpretation, execution and speech stages together.
+    """
+
+    def __init__(self,
+                 transcribe: Callable[[Any], Awaitable[Optional[str]]],
+                 interpret: Callable[[str, Callable[[Dict[str, Any]], Awaitable[None]],
+                                      Callable[[str], Awaitable[None]]], Awaitable[Any]],
+                 execute: Callable[[Dict[str, Any]], Awaitable[Any]],
+                 speak: Callable[[str], Awaitable[None]],
+                 queue_size: int = 4,
+                 max_in_flight_commands: int = 4):
+        self._transcribe = transcribe
+        self._interpret = interpret
+        self._execute = execute
+        self._speak = speak
+        self._queue_size = queue_size
+        self._max_in_flight_commands = max_in_flight_commands
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self) -> None:
+        """
+        Create the stages on the running event loop
+        """
+        self._loop = asyncio.get_running_loop()
+        self._in_flight_commands = asyncio.Semaphore(self._max_in_flight_commands)
+        self._command_tasks = set()
+        self.speech = PipelineStage("speech", self._speak, self._queue_size)
+        self.execution = PipelineStage("execution", self._handle_command, self._queue_size)
+        self.interpretation = PipelineStage("interpretation", self._handle_text, self._queue_size)
+        self.transcription = PipelineStage("transcription", self._handle_audio, self._queue_size, drop_oldest=True)
+        for stage in (self.speech, self.execution, self.interpretation, self.transcription):
+            stage.start()
+
+    def submit_audio(self, audio: Any, trace: Optional[Trace] = None) -> None:
+        """
+        Entry point of the capture stage, called from the capture thread and never blocks
+        """
+        self._loop.call_soon_threadsafe(self.transcription.submit_nowait, audio, trace)
+
+    async def _handle_audio(self, audio: Any) -> None:
+        text = await self._transcribe(audio)
+        if text:
+            await self.interpretation.submit(text)
+
+    async def _handle_text(self, text: str) -> None:
+        await self._interpret(text, self.__submit_command, self.__submit_answer)
+
+    async def _handle_command(self, command: Dict[str, Any]) -> None:
+        await self._in_flight_commands.acquire()
+        task = asyncio.create_task(self._execute(command))
+        self._command_tasks.add(task)
+        task.add_done_callback(self.__command_done)
+
+    def __command_done(self, task: asyncio.Task) -> None:
+        self._command_tasks.discard(task)
+        self._in_flight_commands.release()
+
+    async def __submit_command(self, command: Dict[str, Any]) -> None:
+        logger.info("Command to execute: %s", command)
+        await self.execution.submit(command)
+
+    async def __submit_answer(self, answer: str) -> None:
+        if answer:
+            await self.speech.submit(answer)
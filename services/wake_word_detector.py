@@ -0,0 +1,97 @@
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+from services.speech_to_text import VoskSpeechToText
+
+logger = logging.getLogger(__name__)
+
+
+class WakeWordDetector:
+    """
+    Always-on local detection of the assistant name, so only the audio addressed to the assistant reaches STT.
+
+    Frames are decoded by a Vosk recognizer whose grammar only knows the wake word, which is cheap enough to run
+    on every frame. The audio spoken before the detection is not kept here: the capture segments start before the
+    speech onset (its pre_roll_ms) and a segment in which the wake word is heard is transcribed whole, so the
+    command spoken right after (or together with) the wake word is not clipped. A detection arms the detector for
+    armed_seconds: the audio captured meanwhile belongs to the command and on_detection is called (barge-in hook).
+
+    Once started, frames and segment ends are queued by the capture thread and decoded by a worker thread, so
+    the capture never waits for Vosk; a segment is only judged after all of its frames were decoded.
+    """
+
+    def __init__(self, wake_word: str, model_path: str, sample_rate: int = 16000, armed_seconds: float = 8,
+                 on_detection: Optional[Callable[[], None]] = None):
+        self.wake_word = wake_word.lower()
+        self.sample_rate = sample_rate
+        self.armed_seconds = armed_seconds
+        self.on_detection = on_detection
+        self.recognizer = VoskSpeechToText(model_path).create_recognizer(sample_rate, [self.wake_word, "[unk]"])
+        self.armed_until = 0.0
+        self.detections = 0
+        self._addressed = False
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_armed(self) -> bool:
+        return time.monotonic() < self.armed_until
+
+    def disarm(self) -> None:
+        self.armed_until = 0.0
+
+    def process_frame(self, frame) -> bool:
+        """
+        Feed a frame of 16-bit mono PCM, return True when it belongs to a command (wake word heard or armed)
+        """
+        frame = bytes(frame)
+        if self.is_armed:
+            return True
+        if self.recognizer.AcceptWaveform(frame):
+            heard = json.loads(self.recognizer.Result()).get('text', '')
+        else:
+            heard = json.loads(self.recognizer.PartialResult()).get('partial', '')
+        if self.wake_word not in heard.split():
+            return False
+        self.recognizer.Reset()
+        self.detections += 1
+        self.armed_until = time.monotonic() + self.armed_seconds
+        logger.info("Wake word \"%s\" detected", self.wake_word)
+        if self.on_detection is not None:
+            self.on_detection()
+        return True
+
+    def start(self) -> "WakeWordDetector":
+        self._thread = threading.Thread(target=self._run, name="wake-word-detector", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit_frame(self, frame) -> None:
+        """
+        Queue a frame for the worker, the frame is copied so the caller can reuse its buffer
+        """
+        self._queue.put(bytes(frame))
+
+    def submit_segment(self, on_addressed: Callable[[], None]) -> None:
+        """
+        Mark the end of a segment: once the frames queued so far are decoded, the worker calls on_addressed when
+        the wake word was heard during the segment or the detector was armed
+        """
+        self._queue.put(on_addressed)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if callable(item):
+                    addressed, self._addressed = self._addressed, False
+                    if addressed:
+                        item()
+                elif self.process_frame(item):
+                    self._addressed = True
+            except Exception:
+                logger.exception("Wake word detector failed to handle a %s", "segment" if callable(item) else "frame")
@@ -0,0 +1,4 @@
+from .behaviour import DeviceBehaviour
+from .home_assistant import HomeAssistantSimulator
+from .hue_bridge import HueBridgeSimulator
+from .roborock import RoborockSimulator
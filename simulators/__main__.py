@@ -0,0 +1,87 @@
+"""Run the Hue, Home Assistant and Roborock simulators locally, built from the plug configurations.
+
+    python -m simulators --latency-ms 30 --jitter-ms 20 --error-rate 0.01
+
+Then point the plugs at the printed addresses: HueManager(bridge=Bridge(<hue address>, <username>)),
+HomeAssistantManager(url=<home assistant url>) with HOME_ASSISTANT_TOKEN set to the access token, and
+RoborockManager(vacuum=RoborockVacuum(<roborock host>, <token>)).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+from typing import List
+
+from simulators import DeviceBehaviour, HomeAssistantSimulator, HueBridgeSimulator, RoborockSimulator
+
+PLUGS_DIR = Path(__file__).resolve().parent.parent / "plugs"
+
+
+def load_json(path: Path) -> dict:
+    with path.open("r", encoding="utf-8") as json_file:
+        return json.load(json_file)
+
+
+def documented_scripts() -> List[str]:
+    """Script names accepted by use_ha_script, read from the Home Assistant plug documentation."""
+    documentation = load_json(PLUGS_DIR / "home_assistant_plug" / "home_assistant_documentation.json")
+    return [
+        script_name
+        for command in documentation.get("functions", [])
+        for param in command.get("params", [])
+        if param.startswith("script_name")
+        for script_name in re.findall(r"'([^']+)'", param)
+    ]
+
+
+def main() -> None:
+    """Entry point starting the three simulators until interrupted."""
+    parser = argparse.ArgumentParser(description="Local simulators of the Hue bridge, Home Assistant and Roborock.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--hue-port", type=int, default=8001)
+    parser.add_argument("--home-assistant-port", type=int, default=8123)
+    parser.add_argument("--roborock-host", default="127.0.0.1", help="python-miio always uses udp port 54321")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--hue-requests-per-second", type=float, default=10)
+    parser.add_argument("--access-token", default="simulator")
+    parser.add_argument("--seed", type=int, default=None)
+    arguments = parser.parse_args()
+
+    def behaviour(max_requests_per_second=None):
+        return DeviceBehaviour(arguments.latency_ms, arguments.jitter_ms, max_requests_per_second,
+                               error_rate=arguments.error_rate, seed=arguments.seed)
+
+    hue_configuration = load_json(PLUGS_DIR / "hue_plug" / "hue_configuration.json")
+    roborock_configuration = load_json(PLUGS_DIR / "roborock_plug" / "roborock_configuration.json")
+    simulators = [
+        HueBridgeSimulator(hue_configuration["hue_lights"], arguments.host, arguments.hue_port,
+                           behaviour=behaviour(arguments.hue_requests_per_second)),
+        HomeAssistantSimulator(arguments.access_token, documented_scripts(), host=arguments.host,
+                               port=arguments.home_assistant_port, behaviour=behaviour()),
+        RoborockSimulator(roborock_configuration["token"], arguments.roborock_host,
+                          rooms=roborock_configuration.get("rooms", []), behaviour=behaviour()),
+    ]
+    for simulator in simulators:
+        simulator.start()
+    hue, home_assistant, roborock = simulators
+    print(f"Hue bridge      {hue.address} (username {next(iter(hue.usernames))})")
+    print(f"Home Assistant  http://{home_assistant.address} (access token {home_assistant.access_token})")
+    print(f"Roborock        udp {roborock.address} (token from roborock_configuration.json)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for simulator in simulators:
+            simulator.stop()
+            print(f"{simulator.name}: {simulator.behaviour.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import random
+import threading
+import time
+from typing import Optional
+
+ACCEPTED = "accepted"
+RATE_LIMITED = "rate_limited"
+INJECTED_ERROR = "injected_error"
+
+
+class DeviceBehaviour:
+    """
+    Latency, throughput limit and error injection applied by a simulator to every request it receives.
+
+    A request waits latency_ms plus a uniform jitter of up to jitter_ms. Requests above max_requests_per_second
+    (token bucket holding burst requests) are refused, the simulator answers them the way the real device does
+    when it is overloaded, and a fraction error_rate of the accepted ones fail with the error of the device.
+    """
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, max_requests_per_second: Optional[float] = None,
+                 burst: Optional[float] = None, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.max_requests_per_second = max_requests_per_second
+        self.burst = burst if burst is not None else (max_requests_per_second or 0)
+        self.error_rate = error_rate
+        self.requests = 0
+        self.rate_limited = 0
+        self.injected_errors = 0
+        self._random = random.Random(seed)
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def apply(self) -> str:
+        """
+        Count the request, wait for its latency and return ACCEPTED, RATE_LIMITED or INJECTED_ERROR
+        """
+        with self._lock:
+            self.requests += 1
+            delay = (self.latency_ms + self._random.uniform(0, self.jitter_ms)) / 1000
+            if not self.__take_token():
+                self.rate_limited += 1
+                outcome = RATE_LIMITED
+            elif self.error_rate and self._random.random() < self.error_rate:
+                self.injected_errors += 1
+                outcome = INJECTED_ERROR
+            else:
+                outcome = ACCEPTED
+        if delay > 0:
+            time.sleep(delay)
+        return outcome
+
+    def stats(self):
+        return {"requests": self.requests, "rate_limited": self.rate_limited, "injected_errors": self.injected_errors}
+
+    def __take_token(self) -> bool:
+        if not self.max_requests_per_second:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.max_requests_per_second)
+        self._updated_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
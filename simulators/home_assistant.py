@@ -0,0 +1,192 @@
+import itertools
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from simulators.behaviour import ACCEPTED, RATE_LIMITED, DeviceBehaviour
+from simulators.http_simulator import HttpSimulator
+from simulators.websocket import WebSocketClosed, WebSocketConnection
+
+logger = logging.getLogger(__name__)
+
+SERVICE_STATES = {'turn_on': 'on', 'turn_off': 'off'}
+
+
+class HomeAssistantSimulator(HttpSimulator):
+    """
+    Subset of the Home Assistant REST and WebSocket APIs used by the home_assistant plug.
+
+    REST: GET /api/, GET /api/states[/<entity_id>] and POST /api/services/<domain>/<service>.
+    WebSocket (/api/websocket): authentication, get_states, subscribe_events and call_service, state changes
+    being pushed to the subscribed connections as state_changed events. Every request needs access_token.
+
+    A script runs for script_seconds (its entity is "on" meanwhile), turn_on, turn_off and toggle change the
+    state of the targeted entities. A rate limited request is refused with HTTP 429 (REST) or an error result
+    (WebSocket), an injected error with HTTP 500 or an error result.
+    """
+
+    name = "home_assistant"
+
+    _context_ids = itertools.count(1)
+
+    def __init__(self, access_token: str = 'simulator', scripts: Iterable[str] = (),
+                 entities: Optional[Dict[str, str]] = None, host: str = '127.0.0.1', port: int = 0,
+                 behaviour: Optional[DeviceBehaviour] = None, script_seconds: float = 0.5):
+        super().__init__(host, port, behaviour)
+        self.access_token = access_token
+        self.script_seconds = script_seconds
+        self.states: Dict[str, Dict[str, Any]] = {}
+        for script_name in scripts:
+            self.__set_state(f"script.{script_name}", 'off', notify=False)
+        for entity_id, state in (entities or {}).items():
+            self.__set_state(entity_id, state, notify=False)
+        self.service_calls: List[Dict[str, Any]] = []
+        self._subscriptions: Dict[WebSocketConnection, List[int]] = {}
+        self._lock = threading.RLock()
+
+    def handle(self, method: str, path: str, body: Any, headers: Dict[str, str]):
+        if headers.get('Authorization') != f"Bearer {self.access_token}":
+            return 401, {"message": "401: Unauthorized"}
+        outcome = self.behaviour.apply()
+        if outcome == RATE_LIMITED:
+            return 429, {"message": "Too many requests"}
+        if outcome != ACCEPTED:
+            return 500, {"message": "Injected error"}
+
+        parts = [part for part in path.split('?')[0].split('/') if part]
+        if parts == ['api'] and method == 'GET':
+            return 200, {"message": "API running."}
+        if parts[:2] == ['api', 'states'] and method == 'GET':
+            with self._lock:
+                if len(parts) == 2:
+                    return 200, list(self.states.values())
+                state = self.states.get(parts[2])
+            return (200, state) if state is not None else (404, {"message": "Entity not found."})
+        if parts[:2] == ['api', 'services'] and len(parts) == 4 and method == 'POST':
+            changed = self.call_service(parts[2], parts[3], body or {})
+            if changed is None:
+                return 400, {"message": f"Service {parts[2]}.{parts[3]} not found."}
+            return 200, changed
+        return 404, {"message": "Not found"}
+
+    def call_service(self, domain: str, service: str, service_data: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Run a service, return the states it changed or None when the service does not exist
+        """
+        with self._lock:
+            self.service_calls.append({"domain": domain, "service": service, "service_data": service_data})
+            entity_ids = service_data.get('entity_id', [])
+            entity_ids = [entity_ids] if isinstance(entity_ids, str) else list(entity_ids)
+            if domain == 'script' and service not in SERVICE_STATES and service != 'toggle':
+                entity_ids = [f"script.{service}"]
+                service = 'turn_on'
+            if not entity_ids or any(entity_id not in self.states for entity_id in entity_ids):
+                return None
+            changed = []
+            for entity_id in entity_ids:
+                if service == 'toggle':
+                    new_state = 'off' if self.states[entity_id]['state'] == 'on' else 'on'
+                elif service in SERVICE_STATES:
+                    new_state = SERVICE_STATES[service]
+                else:
+                    return None
+                changed.append(self.__set_state(entity_id, new_state))
+                if entity_id.startswith('script.') and new_state == 'on':
+                    timer = threading.Timer(self.script_seconds, self.__end_script, (entity_id,))
+                    timer.daemon = True
+                    timer.start()
+            return changed
+
+    def handle_websocket(self, handler) -> None:
+        if handler.path.split('?')[0].rstrip('/') != '/api/websocket':
+            handler.send_error(404)
+            return
+        connection = WebSocketConnection(handler)
+        if not connection.accept():
+            return
+        try:
+            connection.send(json.dumps({"type": "auth_required", "ha_version": "2025.1.0"}))
+            auth = json.loads(connection.receive())
+            if auth.get('type') != 'auth' or auth.get('access_token') != self.access_token:
+                connection.send(json.dumps({"type": "auth_invalid", "message": "Invalid access token"}))
+                connection.close()
+                return
+            connection.send(json.dumps({"type": "auth_ok", "ha_version": "2025.1.0"}))
+            while True:
+                message = json.loads(connection.receive())
+                connection.send(json.dumps(self.__websocket_result(connection, message)))
+        except (WebSocketClosed, OSError, ValueError):
+            pass
+        finally:
+            with self._lock:
+                self._subscriptions.pop(connection, None)
+            connection.close()
+
+    def __websocket_result(self, connection: WebSocketConnection, message: Dict[str, Any]) -> Dict[str, Any]:
+        message_id = message.get('id')
+        outcome = self.behaviour.apply()
+        if outcome != ACCEPTED:
+            code = "rate_limited" if outcome == RATE_LIMITED else "unknown_error"
+            return self.__error(message_id, code, "Injected error" if code == "unknown_error" else "Too many requests")
+        message_type = message.get('type')
+        if message_type == 'get_states':
+            with self._lock:
+                return {"id": message_id, "type": "result", "success": True, "result": list(self.states.values())}
+        if message_type == 'subscribe_events':
+            with self._lock:
+                self._subscriptions.setdefault(connection, []).append(message_id)
+            return {"id": message_id, "type": "result", "success": True, "result": None}
+        if message_type == 'call_service':
+            changed = self.call_service(message.get('domain'), message.get('service'),
+                                        message.get('service_data') or message.get('target') or {})
+            if changed is None:
+                return self.__error(message_id, "not_found", "Service not found.")
+            return {"id": message_id, "type": "result", "success": True, "result": {"context": self.__context()}}
+        if message_type == 'ping':
+            return {"id": message_id, "type": "pong"}
+        return self.__error(message_id, "unknown_command", "Unknown command.")
+
+    def __end_script(self, entity_id: str) -> None:
+        with self._lock:
+            self.__set_state(entity_id, 'off')
+
+    def __set_state(self, entity_id: str, state: str, notify: bool = True) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc).isoformat()
+        old_state = self.states.get(entity_id)
+        new_state = {
+            "entity_id": entity_id,
+            "state": state,
+            "attributes": {"friendly_name": entity_id.split('.', 1)[-1].replace('_', ' ')},
+            "last_changed": now if old_state is None or old_state['state'] != state else old_state['last_changed'],
+            "last_updated": now,
+            "context": self.__context(),
+        }
+        self.states[entity_id] = new_state
+        if notify:
+            self.__notify(entity_id, old_state, new_state)
+        return new_state
+
+    def __notify(self, entity_id: str, old_state, new_state) -> None:
+        with self._lock:
+            subscriptions = [(connection, list(ids)) for connection, ids in self._subscriptions.items()]
+        for connection, subscription_ids in subscriptions:
+            for subscription_id in subscription_ids:
+                event = {"id": subscription_id, "type": "event", "event": {
+                    "event_type": "state_changed",
+                    "data": {"entity_id": entity_id, "old_state": old_state, "new_state": new_state},
+                    "origin": "LOCAL",
+                    "time_fired": new_state["last_updated"],
+                }}
+                try:
+                    connection.send(json.dumps(event))
+                except WebSocketClosed:
+                    break
+
+    def __context(self) -> Dict[str, Any]:
+        return {"id": f"simulator{next(self._context_ids):026d}", "parent_id": None, "user_id": None}
+
+    @staticmethod
+    def __error(message_id, code: str, message: str) -> Dict[str, Any]:
+        return {"id": message_id, "type": "result", "success": False, "error": {"code": code, "message": message}}
@@ -0,0 +1,111 @@
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+from simulators.behaviour import DeviceBehaviour
+
+logger = logging.getLogger(__name__)
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.__dispatch()
+
+    def do_POST(self):
+        self.__dispatch()
+
+    def do_PUT(self):
+        self.__dispatch()
+
+    def do_DELETE(self):
+        self.__dispatch()
+
+    def __dispatch(self):
+        simulator: HttpSimulator = self.server.simulator
+        if self.headers.get('Upgrade', '').lower() == 'websocket':
+            simulator.handle_websocket(self)
+            self.close_connection = True
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        raw_body = self.rfile.read(length) if length else b''
+        try:
+            body = json.loads(raw_body) if raw_body else None
+        except ValueError:
+            self.__reply(400, {"message": "Invalid JSON"})
+            return
+        status, payload = simulator.handle(self.command, self.path, body, dict(self.headers))
+        self.__reply(status, payload)
+
+    def __reply(self, status: int, payload: Any):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s", self.address_string(), format % args)
+
+
+class HttpSimulator(ABC):
+    """
+    Device simulated behind a local HTTP server, each request is answered by handle() on a server thread.
+
+    port 0 picks a free port, the actual one is in address once started. Subclasses answering websocket upgrades
+    override handle_websocket.
+    """
+
+    name = "http"
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, behaviour: Optional[DeviceBehaviour] = None):
+        self.host = host
+        self.port = port
+        self.behaviour = behaviour or DeviceBehaviour()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    @property
+    def call_count(self) -> int:
+        return self.behaviour.requests
+
+    def start(self) -> "HttpSimulator":
+        self._server = ThreadingHTTPServer((self.host, self.port), _RequestHandler)
+        self._server.daemon_threads = True
+        self._server.simulator = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f"{self.name}-simulator",
+                                        daemon=True)
+        self._thread.start()
+        logger.info("%s simulator listening on %s", self.name, self.address)
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @abstractmethod
+    def handle(self, method: str, path: str, body: Any, headers: Dict[str, str]) -> Tuple[int, Any]:
+        """
+        Answer a request with its status code and its JSON payload
+        """
+
+    def handle_websocket(self, handler: BaseHTTPRequestHandler) -> None:
+        handler.send_error(404)
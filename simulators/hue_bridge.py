@@ -0,0 +1,141 @@
+import logging
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from simulators.behaviour import ACCEPTED, RATE_LIMITED, DeviceBehaviour
+from simulators.http_simulator import HttpSimulator
+
+logger = logging.getLogger(__name__)
+
+LIGHT_PATH = re.compile(r'^/api/(?P<username>[^/]+)/lights/?(?P<light_id>\d+)?(?P<state>/state)?/?$')
+GROUP_PATH = re.compile(r'^/api/(?P<username>[^/]+)/groups/?(?P<group_id>\d+)?(?P<action>/action)?/?$')
+ROOT_PATH = re.compile(r'^/api/(?P<username>[^/]+)/?(?P<config>config)?/?$')
+
+# Ranges of the writable state parameters, the increments are clamped into the range of their parameter
+STATE_RANGES = {'bri': (1, 254), 'hue': (0, 65535), 'sat': (0, 254), 'ct': (153, 500)}
+
+
+class HueBridgeSimulator(HttpSimulator):
+    """
+    Subset of the Hue bridge REST API (v1) used through phue: registration, lights, groups and their states.
+
+    Lights are built from the hue_lights of the plug configuration and the lights of each room form a group,
+    like rooms created with the Hue app. As on a real bridge every answer is HTTP 200, failures are reported as
+    error objects: type 1 for an unknown username, 3 for an unknown resource and 901 when the bridge is
+    overloaded (rate limit) or an error is injected. The default limit is the 10 light commands per second
+    advised by Philips.
+    """
+
+    name = "hue"
+
+    def __init__(self, lights: Iterable[Dict[str, Any]], host: str = '127.0.0.1', port: int = 0,
+                 username: str = 'simulator', behaviour: Optional[DeviceBehaviour] = None):
+        super().__init__(host, port, behaviour or DeviceBehaviour(max_requests_per_second=10))
+        self.usernames = {username}
+        self.lights: Dict[int, Dict[str, Any]] = {}
+        rooms: Dict[str, List[str]] = {}
+        for light in lights:
+            light_id = int(light['id'])
+            self.lights[light_id] = {
+                'state': {'on': False, 'bri': 254, 'ct': 366, 'alert': 'none', 'colormode': 'ct', 'reachable': True},
+                'type': 'Extended color light',
+                'name': light.get('name', f"Light {light_id}"),
+                'modelid': 'LCT015',
+                'uniqueid': f"00:17:88:01:00:00:00:{light_id:02x}-0b",
+            }
+            rooms.setdefault(light.get('room', ''), []).append(str(light_id))
+        self.groups: Dict[int, Dict[str, Any]] = {
+            group_id: {'name': room, 'lights': light_ids, 'type': 'Room', 'action': {'on': False}}
+            for group_id, (room, light_ids) in enumerate(sorted(rooms.items()), start=1)
+        }
+        self.writes: List[Tuple[str, int, Dict[str, Any]]] = []
+        self._lock = threading.Lock()
+
+    def handle(self, method: str, path: str, body: Any, headers: Dict[str, str]):
+        outcome = self.behaviour.apply()
+        if outcome != ACCEPTED:
+            description = "Internal error, 503" if outcome == RATE_LIMITED else "Internal error, injected"
+            return 200, [self.__error(901, path, description)]
+        if path.rstrip('/') == '/api' and method == 'POST':
+            return 200, [{'success': {'username': next(iter(self.usernames))}}]
+        with self._lock:
+            for pattern, handler in ((LIGHT_PATH, self.__lights), (GROUP_PATH, self.__groups),
+                                     (ROOT_PATH, self.__root)):
+                match = pattern.match(path)
+                if match is None:
+                    continue
+                if match['username'] not in self.usernames:
+                    return 200, [self.__error(1, path, "unauthorized user")]
+                return 200, handler(method, path, body, match)
+        return 200, [self.__error(3, path, f"resource, {path}, not available")]
+
+    def __lights(self, method, path, body, match):
+        if match['light_id'] is None:
+            return {str(light_id): light for light_id, light in self.lights.items()}
+        light_id = int(match['light_id'])
+        if light_id not in self.lights:
+            return [self.__error(3, path, f"resource, /lights/{light_id}, not available")]
+        if method == 'GET':
+            return self.lights[light_id]
+        if method == 'PUT' and match['state']:
+            self.writes.append(('light', light_id, dict(body or {})))
+            return self.__apply(path, [light_id], body or {})
+        return [self.__error(4, path, f"method, {method}, not available for resource, {path}")]
+
+    def __groups(self, method, path, body, match):
+        if match['group_id'] is None:
+            return {str(group_id): self.__group(group_id) for group_id in self.groups}
+        group_id = int(match['group_id'])
+        if group_id != 0 and group_id not in self.groups:
+            return [self.__error(3, path, f"resource, /groups/{group_id}, not available")]
+        if method == 'GET':
+            return self.__group(group_id)
+        if method == 'PUT' and match['action']:
+            self.writes.append(('group', group_id, dict(body or {})))
+            light_ids = list(self.lights) if group_id == 0 else [int(light_id) for light_id in
+                                                                  self.groups[group_id]['lights']]
+            return self.__apply(path, light_ids, body or {})
+        return [self.__error(4, path, f"method, {method}, not available for resource, {path}")]
+
+    def __root(self, method, path, body, match):
+        config = {'name': 'Hue simulator', 'apiversion': '1.50.0', 'swversion': '1950207110'}
+        if match['config']:
+            return config
+        return {
+            'lights': {str(light_id): light for light_id, light in self.lights.items()},
+            'groups': {str(group_id): self.__group(group_id) for group_id in self.groups},
+            'config': config,
+        }
+
+    def __group(self, group_id: int) -> Dict[str, Any]:
+        if group_id == 0:
+            return {'name': 'Group 0', 'lights': [str(light_id) for light_id in self.lights], 'type': 'LightGroup',
+                    'action': {}}
+        return self.groups[group_id]
+
+    def __apply(self, path: str, light_ids: List[int], state: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Write a state to lights, answering one success object per parameter like the bridge
+        """
+        answers = []
+        for parameter, value in state.items():
+            if parameter == 'transitiontime':
+                continue
+            for light_id in light_ids:
+                light_state = self.lights[light_id]['state']
+                if parameter.endswith('_inc'):
+                    name = parameter[:-len('_inc')]
+                    low, high = STATE_RANGES.get(name, (0, 254))
+                    light_state[name] = max(low, min(high, light_state.get(name, 0) + value))
+                elif parameter in STATE_RANGES:
+                    low, high = STATE_RANGES[parameter]
+                    light_state[parameter] = max(low, min(high, value))
+                else:
+                    light_state[parameter] = value
+            answers.append({'success': {f"{path.rstrip('/')}/{parameter}": value}})
+        return answers
+
+    @staticmethod
+    def __error(error_type: int, address: str, description: str) -> Dict[str, Any]:
+        return {'error': {'type': error_type, 'address': address, 'description': description}}
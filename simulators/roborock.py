@@ -0,0 +1,194 @@
+"""Roborock vacuum answering the miio protocol on UDP, as python-miio talks to the real one.
+
+A miio packet is a 32 bytes header (magic 0x2131, length, 4 unknown bytes, device id, timestamp, checksum)
+followed by the JSON payload encrypted with AES-128-CBC, the key being md5(token) and the IV md5(key + token).
+The checksum is the md5 of the header (checksum excluded), the token and the encrypted payload. A hello packet
+(32 bytes of header only) is answered with the device id and timestamp, the client then sends commands.
+
+python-miio always uses port 54321, give the simulator another loopback address (127.0.0.2...) to run several
+devices on a host. A rate limited command gets no answer at all, like an overloaded vacuum, so the client
+retries after its timeout; an injected error is answered with a miio error object.
+"""
+import hashlib
+import json
+import logging
+import socket
+import struct
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from simulators.behaviour import ACCEPTED, RATE_LIMITED, DeviceBehaviour
+
+try:
+    from cryptography.hazmat.primitives import padding
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:  # pragma: no cover - optional dependency, the miio simulator is then unavailable
+    Cipher = None
+
+logger = logging.getLogger(__name__)
+
+MIIO_PORT = 54321
+HEADER = struct.Struct('!HHIII16s')
+MAGIC = 0x2131
+
+# Status codes of the vacuum state machine reported by get_status
+CHARGING = 8
+CLEANING = 5
+RETURNING_HOME = 6
+PAUSED = 10
+IDLE = 3
+SEGMENT_CLEANING = 18
+
+
+class RoborockSimulator:
+    """
+    miio vacuum handling the commands used by python-miio RoborockVacuum: miIO.info, get_status, app_start,
+    app_stop, app_pause, app_charge, app_segment_clean and get_room_mapping
+    """
+
+    name = "roborock"
+
+    def __init__(self, token: str, host: str = '127.0.0.1', port: int = MIIO_PORT, device_id: int = 0x0A0B0C0D,
+                 model: str = 'roborock.vacuum.a15', rooms: Iterable[Dict[str, Any]] = (),
+                 behaviour: Optional[DeviceBehaviour] = None):
+        if Cipher is None:
+            raise RuntimeError("The cryptography library is required by the Roborock simulator")
+        self.token = bytes.fromhex(token)
+        self.key = hashlib.md5(self.token).digest()
+        self.iv = hashlib.md5(self.key + self.token).digest()
+        self.host = host
+        self.port = port
+        self.device_id = device_id
+        self.model = model
+        self.rooms = [[int(room['id']), room.get('name', '')] for room in rooms]
+        self.behaviour = behaviour or DeviceBehaviour()
+        self.state = CHARGING
+        self.battery = 100
+        self.cleaned_segments: List[Any] = []
+        self.commands: List[Dict[str, Any]] = []
+        self._started_at = time.time()
+        self._socket: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    @property
+    def call_count(self) -> int:
+        return self.behaviour.requests
+
+    def start(self) -> "RoborockSimulator":
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((self.host, self.port))
+        self.port = self._socket.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve, name="roborock-simulator", daemon=True)
+        self._thread.start()
+        logger.info("Roborock simulator listening on udp %s", self.address)
+        return self
+
+    def stop(self) -> None:
+        server_socket, self._socket = self._socket, None
+        if server_socket is None:
+            return
+        try:
+            # Wakes the thread blocked in recvfrom, which keeps the port bound until it returns
+            server_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._thread.join()
+        server_socket.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _serve(self) -> None:
+        server_socket = self._socket
+        while self._socket is not None:
+            try:
+                packet, client = server_socket.recvfrom(4096)
+            except OSError:
+                return
+            if self._socket is None:
+                return
+            try:
+                answer = self.handle_packet(packet)
+            except Exception:
+                logger.exception("Malformed miio packet from %s", client)
+                continue
+            if answer is not None:
+                server_socket.sendto(answer, client)
+
+    def handle_packet(self, packet: bytes) -> Optional[bytes]:
+        """
+        Answer a hello or command packet, None when nothing must be sent back
+        """
+        magic, length, _, _, _, checksum = HEADER.unpack_from(packet)
+        if magic != MAGIC or length != len(packet):
+            return None
+        if length == HEADER.size:
+            return HEADER.pack(MAGIC, HEADER.size, 0, self.device_id, int(time.time()), b'\xff' * 16)
+        encrypted = packet[HEADER.size:]
+        if hashlib.md5(packet[:16] + self.token + encrypted).digest() != checksum:
+            logger.warning("Dropping a miio packet with a wrong checksum (wrong token?)")
+            return None
+        request = json.loads(self.__decrypt(encrypted).rstrip(b'\x00'))
+        outcome = self.behaviour.apply()
+        if outcome == RATE_LIMITED:
+            return None
+        if outcome != ACCEPTED:
+            answer = {"id": request.get('id'), "error": {"code": -5001, "message": "command execution error"}}
+        else:
+            answer = {"id": request.get('id'), **self.execute(request.get('method'), request.get('params'))}
+        return self.__packet(json.dumps(answer).encode('utf-8'))
+
+    def execute(self, method: str, params: Any) -> Dict[str, Any]:
+        self.commands.append({"method": method, "params": params})
+        if method == 'miIO.info':
+            return {"result": {
+                "model": self.model, "fw_ver": "4.3.5_1736", "hw_ver": "Linux", "mac": "04:CF:8C:00:00:01",
+                "token": self.token.hex(), "life": int(time.time() - self._started_at),
+                "ap": {"ssid": "simulator", "bssid": "00:00:00:00:00:00", "rssi": -40},
+                "netif": {"localIp": self.host, "mask": "255.0.0.0", "gw": "127.0.0.1"},
+            }}
+        if method == 'get_status':
+            return {"result": [{
+                "msg_ver": 2, "msg_seq": len(self.commands), "state": self.state, "battery": self.battery,
+                "clean_time": 0, "clean_area": 0, "error_code": 0, "map_present": 1,
+                "in_cleaning": int(self.state in (CLEANING, SEGMENT_CLEANING)), "in_returning": 0,
+                "in_fresh_state": 1, "lab_status": 1, "water_box_status": 0, "fan_power": 102,
+                "dnd_enabled": 0, "map_status": 3, "lock_status": 0,
+            }]}
+        if method == 'get_room_mapping':
+            return {"result": self.rooms}
+        if method == 'app_segment_clean':
+            # [16, 17] with python-miio, [{"segments": [16, 17], "repeat": 2}] with the repeat count
+            self.cleaned_segments.append(params)
+            self.state = SEGMENT_CLEANING
+            return {"result": ["ok"]}
+        transitions = {'app_start': CLEANING, 'app_stop': IDLE, 'app_pause': PAUSED, 'app_charge': RETURNING_HOME}
+        if method in transitions:
+            self.state = transitions[method]
+            return {"result": ["ok"]}
+        return {"error": {"code": -32601, "message": "Method not found."}}
+
+    def __packet(self, payload: bytes) -> bytes:
+        encrypted = self.__encrypt(payload)
+        header = HEADER.pack(MAGIC, HEADER.size + len(encrypted), 0, self.device_id, int(time.time()), b'')[:16]
+        return header + hashlib.md5(header + self.token + encrypted).digest() + encrypted
+
+    def __encrypt(self, plaintext: bytes) -> bytes:
+        padder = padding.PKCS7(128).padder()
+        padded = padder.update(plaintext) + padder.finalize()
+        encryptor = Cipher(algorithms.AES(self.key), modes.CBC(self.iv)).encryptor()
+        return encryptor.update(padded) + encryptor.finalize()
+
+    def __decrypt(self, ciphertext: bytes) -> bytes:
+        decryptor = Cipher(algorithms.AES(self.key), modes.CBC(self.iv)).decryptor()
+        padded = decryptor.update(ciphertext) + decryptor.finalize()
+        unpadder = padding.PKCS7(128).unpadder()
+        return unpadder.update(padded) + unpadder.finalize()
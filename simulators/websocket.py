@@ -0,0 +1,130 @@
+"""Minimal server side of the WebSocket protocol (RFC 6455), enough for the Home Assistant simulator.
+
+Text messages only: binary frames are ignored, fragmented messages are reassembled, pings are answered and the
+close handshake is honoured. Frames sent by the server are never masked, frames received must be.
+"""
+import base64
+import hashlib
+import struct
+import threading
+from typing import Optional
+
+HANDSHAKE_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+
+class WebSocketClosed(Exception):
+    pass
+
+
+def accept_key(client_key: str) -> str:
+    return base64.b64encode(hashlib.sha1((client_key + HANDSHAKE_GUID).encode('ascii')).digest()).decode('ascii')
+
+
+class WebSocketConnection:
+    """
+    WebSocket over the streams of an http.server request handler, upgraded by accept()
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.rfile = handler.rfile
+        self.wfile = handler.wfile
+        self.closed = False
+        self._send_lock = threading.Lock()
+
+    def accept(self) -> bool:
+        client_key = self.handler.headers.get('Sec-WebSocket-Key')
+        if not client_key or self.handler.headers.get('Sec-WebSocket-Version') != '13':
+            self.handler.send_error(400, "Not a WebSocket handshake")
+            return False
+        self.handler.send_response(101, "Switching Protocols")
+        self.handler.send_header('Upgrade', 'websocket')
+        self.handler.send_header('Connection', 'Upgrade')
+        self.handler.send_header('Sec-WebSocket-Accept', accept_key(client_key))
+        self.handler.end_headers()
+        self.wfile.flush()
+        return True
+
+    def receive(self) -> str:
+        """
+        Wait for the next text message, raise WebSocketClosed when the peer closed the connection
+        """
+        fragments = []
+        while True:
+            fin, opcode, payload = self.__read_frame()
+            if opcode == OPCODE_CLOSE:
+                self.close(struct.unpack('!H', payload[:2])[0] if len(payload) >= 2 else 1000)
+                raise WebSocketClosed()
+            if opcode == OPCODE_PING:
+                self.__send_frame(OPCODE_PONG, payload)
+                continue
+            if opcode == OPCODE_PONG:
+                continue
+            if opcode in (OPCODE_TEXT, OPCODE_BINARY) or (opcode == OPCODE_CONTINUATION and fragments):
+                fragments.append((opcode, payload))
+            if fin and fragments:
+                first_opcode = fragments[0][0]
+                message = b''.join(fragment for _, fragment in fragments)
+                fragments = []
+                if first_opcode == OPCODE_TEXT:
+                    return message.decode('utf-8')
+
+    def send(self, text: str) -> None:
+        self.__send_frame(OPCODE_TEXT, text.encode('utf-8'))
+
+    def close(self, code: int = 1000) -> None:
+        if self.closed:
+            return
+        try:
+            self.__send_frame(OPCODE_CLOSE, struct.pack('!H', code))
+        except (OSError, WebSocketClosed):
+            pass
+        self.closed = True
+
+    def __read_frame(self):
+        header = self.__read_exactly(2)
+        fin = bool(header[0] & 0x80)
+        opcode = header[0] & 0x0F
+        masked = bool(header[1] & 0x80)
+        length = header[1] & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', self.__read_exactly(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', self.__read_exactly(8))[0]
+        mask: Optional[bytes] = self.__read_exactly(4) if masked else None
+        payload = self.__read_exactly(length)
+        if mask is not None:
+            payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+        return fin, opcode, payload
+
+    def __read_exactly(self, size: int) -> bytes:
+        data = self.rfile.read(size) if size else b''
+        if len(data) < size:
+            self.closed = True
+            raise WebSocketClosed()
+        return data
+
+    def __send_frame(self, opcode: int, payload: bytes) -> None:
+        if self.closed:
+            raise WebSocketClosed()
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, length)
+        elif length < 1 << 16:
+            header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+        with self._send_lock:
+            try:
+                self.wfile.write(header + payload)
+                self.wfile.flush()
+            except OSError as exc:
+                self.closed = True
+                raise WebSocketClosed() from exc
@@ -1,10 +1,198 @@
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+
+import pyaudio
 import pyttsx3
 
+from services.tracing import tracer
+from services.tts_audio_cache import TtsAudioCache
+
+logger = logging.getLogger(__name__)
+
+# A sentence can be spoken as soon as its final punctuation is followed by a space
+SENTENCE_END = re.compile(r'(?<=[.!?…;:])\s+')
+
+
+class SpokenAnswer:
+    """
+    The answer of one utterance, spoken sentence by sentence while its text is still arriving.
+
+    Every answer buffers its own text, so an answer that is never completed does not leak into the next one.
+    Once the speaker is stopped, the answer stays silent: its next pieces and its end are dropped.
+    """
+
+    def __init__(self, speaker, generation):
+        self._speaker = speaker
+        self._generation = generation
+        self._text = ''
+        self._fed = False
+
+    @property
+    def stopped(self):
+        return self._generation != self._speaker._generation
+
+    def feed(self, text_delta):
+        """
+        Add a piece of the answer, every complete sentence is spoken right away
+        """
+        if self.stopped:
+            return
+        self._fed = True
+        self._text += text_delta
+        *sentences, self._text = SENTENCE_END.split(self._text)
+        for sentence in sentences:
+            self._speaker.say(sentence)
+
+    def complete(self, text):
+        """
+        End of the answer: return what feed() has not spoken yet, the whole text when it was not fed and
+        nothing when the answer was stopped
+        """
+        if self.stopped:
+            return ''
+        remaining_text = self._text if self._fed else text
+        self._text = ''
+        self._fed = False
+        return remaining_text
+
 
 class Speaker:
-    def __init__(self):
-        self.engine = pyttsx3.init()
+    """
+    Text to speech running on its own worker thread, fed by a queue so that callers never wait for the speech.
+
+    The pyttsx3 engine is created and only used by the worker thread. stop() silences the current sentence and
+    drops the queued ones without tearing down the engine: the engine is stopped from its own started-word
+    callback, which makes it usable for barge-in when the wake word is heard while the assistant speaks.
+    answer() starts an answer spoken sentence by sentence while its text is still arriving.
+
+    With an audio_cache, a sentence spoken a second time is rendered once into the cache and then played from
+    memory, without synthesis. prewarm_phrases are rendered at startup when they are not cached yet.
+
+    Every sentence is spoken in the trace of the utterance that queued it, as a "tts" span.
+    """
+
+    # Number of recently spoken sentences remembered to detect the recurring ones
+    RECENT_SENTENCES = 64
+
+    def __init__(self, audio_cache=None, prewarm_phrases=()):
+        self.audio_cache = audio_cache
+        self._prewarm_phrases = list(prewarm_phrases)
+        self._recent_keys = deque(maxlen=self.RECENT_SENTENCES)
+        self._queue = queue.Queue()
+        self._generation = 0
+        self._interrupted = False
+        self._speaking = threading.Event()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="speaker", daemon=True)
+        self._thread.start()
+        self._ready.wait()
 
     def say(self, text):
-        self.engine.say(text)
-        self.engine.runAndWait()
\ No newline at end of file
+        if text and text.strip():
+            self._queue.put((self._generation, text, tracer.current_trace(), time.perf_counter()))
+
+    def answer(self):
+        """
+        Start the answer of one utterance, fed while it is received and interrupted by stop()
+        """
+        return SpokenAnswer(self, self._generation)
+
+    def stop(self):
+        """
+        Silence the current sentence and forget the queued ones
+        """
+        self._generation += 1
+        if self._speaking.is_set():
+            self._interrupted = True
+            logger.info("Speech interrupted")
+
+    def _run(self):
+        engine = pyttsx3.init()
+        engine.connect('started-word', lambda name, location, length: self.__on_word(engine))
+        self._audio = pyaudio.PyAudio() if self.audio_cache is not None else None
+        self._ready.set()
+        self.__prewarm(engine)
+        while True:
+            generation, text, trace, queued_at = self._queue.get()
+            try:
+                if generation != self._generation:
+                    continue
+                self._interrupted = False
+                self._speaking.set()
+                with tracer.activate(trace), tracer.span("tts", characters=len(text)) as span:
+                    span.set_attribute("queue_wait_ms", round((time.perf_counter() - queued_at) * 1000, 1))
+                    span.set_attribute("cached", self.__speak(engine, text))
+                    span.set_attribute("interrupted", self._interrupted)
+            except Exception:
+                logger.exception("Unable to say \"%s\"", text)
+            finally:
+                self._speaking.clear()
+
+    def __speak(self, engine, text):
+        """
+        Speak a sentence, return whether it was played from the audio cache
+        """
+        if self.audio_cache is None:
+            engine.say(text)
+            engine.runAndWait()
+            return False
+        key = self.__cache_key(engine, text)
+        audio = self.audio_cache.get(key)
+        if audio is not None:
+            self.__play(audio)
+            return True
+        engine.say(text)
+        engine.runAndWait()
+        if key in self._recent_keys and not self._interrupted:
+            self.__render(engine, text, key)
+        else:
+            self._recent_keys.append(key)
+        return False
+
+    def __prewarm(self, engine):
+        if self.audio_cache is None:
+            return
+        for phrase in self._prewarm_phrases:
+            key = self.__cache_key(engine, phrase)
+            if not self.audio_cache.contains(key):
+                self.__render(engine, phrase, key)
+        logger.info("%d phrases ready to be played from the speech cache", len(self._prewarm_phrases))
+
+    def __render(self, engine, text, key):
+        rendered_path = f"{self.audio_cache.path_for(key)}.rendering.wav"
+        try:
+            engine.save_to_file(text, rendered_path)
+            engine.runAndWait()
+            if self._interrupted:
+                os.remove(rendered_path)
+            else:
+                self.audio_cache.store(key, rendered_path)
+        except OSError:
+            logger.exception("Unable to cache the speech of \"%s\"", text)
+
+    def __play(self, audio):
+        stream = self._audio.open(format=self._audio.get_format_from_width(audio.sample_width),
+                                  channels=audio.channels, rate=audio.sample_rate, output=True)
+        # Written by chunks of 50 ms so that stop() cuts the playback quickly
+        chunk_bytes = audio.sample_rate // 20 * audio.sample_width * audio.channels
+        try:
+            for offset in range(0, len(audio.frames), chunk_bytes):
+                if self._interrupted:
+                    break
+                stream.write(audio.frames[offset:offset + chunk_bytes])
+        finally:
+            stream.stop_stream()
+            stream.close()
+
+    @staticmethod
+    def __cache_key(engine, text):
+        return TtsAudioCache.key_for(text, engine.getProperty('voice'), engine.getProperty('rate'))
+
+    def __on_word(self, engine):
+        if self._interrupted:
+            engine.stop()
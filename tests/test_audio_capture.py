@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pyaudio")
+pytest.importorskip("speech_recognition")
+
+from services import speech_to_text
+from services.audio_capture import AudioCapture, VoiceActivityDetector
+from services.speech_to_text import VoskSpeechToText
+from services.wake_word_detector import WakeWordDetector
+
+FRAME_SAMPLES = 480
+
+
+class ThresholdVad(VoiceActivityDetector):
+    """
+    A frame is speech when its first sample is not zero
+    """
+
+    def is_speech(self, frames):
+        return frames[:, 0] != 0
+
+
+def block(*values):
+    return np.array([[value] * FRAME_SAMPLES for value in values], dtype=np.int16)
+
+
+def test_segments_survive_the_ring_wrapping_over_them():
+    segments = []
+    capture = AudioCapture(on_segment=segments.append, sample_rate=16000, frame_ms=30, ring_seconds=0.3,
+                           start_speech_ms=30, end_silence_ms=60, pre_roll_ms=0, vad=ThresholdVad())
+    capture.process_block(block(1, 2, 3, 0, 0))
+    assert len(segments) == 1
+    for _ in range(5):
+        capture.process_block(block(0, 0, 0, 0, 0))
+    assert list(segments[0][::FRAME_SAMPLES]) == [1, 2, 3, 0, 0]
+
+
+class FakeRecognizer:
+    """
+    Wake word recognizer hearing the wake word in the frames whose first sample is 7
+    """
+
+    def __init__(self, model, sample_rate, grammar=None):
+        self.heard = ''
+
+    def AcceptWaveform(self, data):
+        self.heard = "alfred" if np.frombuffer(data, dtype=np.int16)[0] == 7 else ''
+        return False
+
+    def PartialResult(self):
+        return '{"partial": "%s"}' % self.heard
+
+    def Reset(self):
+        pass
+
+
+class FakeVosk:
+    KaldiRecognizer = FakeRecognizer
+
+    @staticmethod
+    def SetLogLevel(level):
+        pass
+
+    @staticmethod
+    def Model(model_path):
+        return object()
+
+
+def test_wake_word_is_decoded_off_the_capture_thread_and_gates_the_segments(monkeypatch):
+    monkeypatch.setattr(speech_to_text, "vosk", FakeVosk)
+    monkeypatch.setattr(VoskSpeechToText, "_models", {})
+    detector = WakeWordDetector("Alfred", "model", armed_seconds=0)
+    decoding = threading.Event()
+    process_frame = detector.process_frame
+
+    def slow_process_frame(frame):
+        decoding.wait(2)
+        return process_frame(frame)
+
+    monkeypatch.setattr(detector, "process_frame", slow_process_frame)
+    detector.start()
+
+    addressed = []
+    done = threading.Event()
+    capture = AudioCapture(on_segment=lambda segment: detector.submit_segment(
+                               lambda: (addressed.append(list(segment[::FRAME_SAMPLES])), done.set())),
+                           on_frame=detector.submit_frame, sample_rate=16000, frame_ms=30, ring_seconds=0.3,
+                           start_speech_ms=30, end_silence_ms=30, pre_roll_ms=0, vad=ThresholdVad())
+    # The capture thread is never held by the decoding of the frames
+    capture.process_block(block(1, 1, 0, 7, 5, 0))
+    assert addressed == []
+    decoding.set()
+    assert done.wait(2)
+    assert addressed == [[7, 5, 0]]
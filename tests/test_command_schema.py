@@ -0,0 +1,60 @@
+from pathlib import Path
+
+import pytest
+
+from llm.command_schema import NO_ACTION_ANSWER, CommandSchema
+
+PLUGS_DIRECTORY = Path(__file__).resolve().parent.parent / "plugs"
+
+
+@pytest.fixture(scope="module")
+def schema():
+    return CommandSchema.from_documentation(["hue", "roborock", "home_assistant"], str(PLUGS_DIRECTORY))
+
+
+def command(manager_name, command_name, *params):
+    return {"manager_name": manager_name, "command_name": command_name, "params": list(params)}
+
+
+def test_a_valid_answer_is_kept_as_is(schema):
+    text = '{"answer": "Bien, Monsieur.", "commands": [{"manager_name": "hue", "command_name": "turn_on_lights", ' \
+           '"params": [[1, 2]]}]}'
+    assert schema.parse_answer(text) == {"answer": "Bien, Monsieur.",
+                                         "commands": [command("hue", "turn_on_lights", [1, 2])]}
+
+
+def test_a_fenced_answer_with_trailing_commas_is_parsed(schema):
+    text = '```json\n{"answer": "Bien.", "commands": [{"manager_name": "roborock", ' \
+           '"command_name": "clean_entire_house", "params": [],},],}\n```'
+    assert schema.parse_answer(text) == {"answer": "Bien.",
+                                         "commands": [command("roborock", "clean_entire_house")]}
+
+
+def test_a_flattened_id_list_is_wrapped(schema):
+    assert schema.repair_command(command("hue", "turn_off_lights", 1, 2, 3)) == \
+        command("hue", "turn_off_lights", [1, 2, 3])
+
+
+def test_numeric_strings_become_integers(schema):
+    assert schema.repair_command(command("roborock", "clean_room", ["16", "17"], "2")) == \
+        command("roborock", "clean_room", [16, 17], 2)
+
+
+def test_a_scalar_given_for_a_list_and_the_manager_name_case_are_repaired(schema):
+    assert schema.repair_command(command(" Hue", "turn_on_rooms", "Salon")) == \
+        command("hue", "turn_on_rooms", ["Salon"])
+
+
+def test_an_unknown_manager_is_dropped_and_the_answer_falls_back(schema):
+    text = '{"answer": "C\'est fait.", "commands": [{"manager_name": "sonos", "command_name": "play", "params": []}]}'
+    assert schema.repair_command(command("sonos", "play")) is None
+    assert schema.parse_answer(text) == {"answer": NO_ACTION_ANSWER, "commands": []}
+
+
+def test_an_unknown_literal_cannot_be_repaired(schema):
+    assert schema.repair_command(command("home_assistant", "use_ha_script", "open_garage")) is None
+
+
+@pytest.mark.parametrize("text", ["", "Je ne sais pas.", "{\"answer\": "])
+def test_an_unreadable_answer_becomes_the_no_action_answer(schema, text):
+    assert schema.parse_answer(text) == {"answer": NO_ACTION_ANSWER, "commands": []}
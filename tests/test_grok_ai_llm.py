@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+pytest.importorskip("requests")
+
+from llm.grok_ai_llm import GrokAiLLM
+
+
+class StreamedResponse:
+    def __init__(self, lines):
+        self.lines = lines
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self, decode_unicode=False):
+        return iter(self.lines)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class RecordingSession:
+    def __init__(self, lines):
+        self.lines = lines
+        self.posts = []
+
+    def post(self, url, **kwargs):
+        self.posts.append((url, kwargs))
+        return StreamedResponse(self.lines)
+
+
+def sse(payload):
+    return f"data: {json.dumps(payload)}"
+
+
+@pytest.fixture
+def grok(monkeypatch):
+    monkeypatch.setenv("GROK_API_KEY", "test")
+    monkeypatch.setattr(GrokAiLLM, "_instance", None)
+    return GrokAiLLM()
+
+
+def test_streamed_answers_come_from_the_chat_completions_endpoint(grok):
+    grok.session = RecordingSession([
+        sse({"choices": [{"delta": {"role": "assistant"}}]}),
+        "",
+        sse({"choices": [{"delta": {"content": '{"answer": "Bien'}}]}),
+        sse({"choices": [{"delta": {"content": '", "commands": []}'}}]}),
+        sse({"choices": [], "usage": {"prompt_tokens": 120, "completion_tokens": 9,
+                                      "prompt_tokens_details": {"cached_tokens": 100}}}),
+        "data: [DONE]",
+    ])
+
+    answer = "".join(grok.interpret_request_stream("allume le salon"))
+
+    assert answer == '{"answer": "Bien", "commands": []}'
+    url, request = grok.session.posts[0]
+    assert url == "https://api.x.ai/v1/chat/completions"
+    assert request["json"]["stream"] is True
+    assert grok.history.turns[-1][1]["content"] == answer
@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+pytest.importorskip("websocket")
+pytest.importorskip("requests")
+
+from plugs.home_assistant_plug.home_assistant_manager import HomeAssistantManager
+from plugs.home_assistant_plug.home_assistant_websocket_client import HomeAssistantWebSocketClient
+from simulators import HomeAssistantSimulator
+
+ACCESS_TOKEN = "test-token"
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def simulator():
+    simulator = HomeAssistantSimulator(ACCESS_TOKEN, scripts=['switch_on_tv_box'], entities={'light.salon': 'off'},
+                                       script_seconds=0.3).start()
+    yield simulator
+    simulator.stop()
+
+
+@pytest.fixture
+def client(simulator):
+    client = HomeAssistantWebSocketClient(f"http://{simulator.address}", ACCESS_TOKEN, call_timeout=0.5)
+    assert client.start(timeout=2)
+    yield client
+    client.close()
+
+
+def test_mirror_is_loaded_then_kept_current_by_the_events(client):
+    assert client.states_snapshot() == {'script.switch_on_tv_box': 'off', 'light.salon': 'off'}
+
+    client.call_service('light', 'turn_on', {'entity_id': 'light.salon'})
+    assert wait_for(lambda: client.get_state('light.salon')['state'] == 'on')
+    client.call_service('script', 'switch_on_tv_box')
+    assert wait_for(lambda: client.states_snapshot('script') == {'script.switch_on_tv_box': 'on'})
+    assert wait_for(lambda: client.states_snapshot('script') == {'script.switch_on_tv_box': 'off'})
+
+
+def test_timed_out_call_is_not_left_pending(simulator, client):
+    simulator.behaviour.latency_ms = 800
+    with pytest.raises(TimeoutError):
+        client.call_service('light', 'turn_on', {'entity_id': 'light.salon'})
+    assert client._pending == {}
+
+    # The late answer of the forgotten call is ignored and the socket keeps working
+    simulator.behaviour.latency_ms = 0
+    time.sleep(0.5)
+    assert client.call_service('light', 'turn_off', {'entity_id': 'light.salon'}) is not None
+    assert client._pending == {}
+
+
+def test_failed_call_raises(simulator, client):
+    simulator.behaviour.error_rate = 1.0
+    with pytest.raises(Exception, match="Injected error"):
+        client.call_service('script', 'switch_on_tv_box')
+    assert client._pending == {}
+
+
+def test_manager_uses_rest_unless_the_websocket_is_enabled(simulator, monkeypatch):
+    monkeypatch.setenv('HOME_ASSISTANT_TOKEN', ACCESS_TOKEN)
+    manager = HomeAssistantManager(url=f"http://{simulator.address}")
+    assert manager.websocket_client is None
+    assert manager.entity_state('script.switch_on_tv_box') == 'off'
+    assert manager.entity_state('script.unknown') is None
+    manager.use_ha_script('switch_on_tv_box')
+    assert simulator.service_calls[-1]['service'] == 'switch_on_tv_box'
+
+
+def test_manager_reads_the_mirror_and_skips_a_running_script(simulator, monkeypatch):
+    monkeypatch.setenv('HOME_ASSISTANT_TOKEN', ACCESS_TOKEN)
+    manager = HomeAssistantManager(url=f"http://{simulator.address}", use_websocket=True)
+    try:
+        assert wait_for(lambda: manager.websocket_client.get_state('light.salon') is not None)
+        requests_before = simulator.behaviour.requests
+        assert manager.entity_state('light.salon') == 'off'
+        assert simulator.behaviour.requests == requests_before
+
+        manager.use_ha_script('switch_on_tv_box')
+        assert wait_for(lambda: manager.entity_state('script.switch_on_tv_box') == 'on')
+        manager.use_ha_script('switch_on_tv_box')
+        assert [call['service'] for call in simulator.service_calls] == ['switch_on_tv_box']
+    finally:
+        manager.websocket_client.close()
@@ -0,0 +1,128 @@
+import threading
+from concurrent.futures import wait
+
+import pytest
+
+pytest.importorskip("requests")
+
+from benchmarks.fakes import RecordingHueBridge
+from plugs.hue_plug.hue_command_scheduler import BACKGROUND_PRIORITY, HueCommandScheduler
+
+LIGHTS = [{'id': str(light_id), 'room': room, 'name': f"light {light_id}"}
+          for light_id, room in ((1, 'Salon'), (2, 'Salon'), (3, 'Chambre'), (4, 'Chambre'), (5, 'Couloir'))]
+# Groups of the recording bridge, one per room in alphabetical order
+CHAMBRE, COULOIR, SALON = 1, 2, 3
+
+
+class GatedHueBridge(RecordingHueBridge):
+    """
+    Bridge holding the first write until the gate opens, so the next writes queue up in the scheduler
+    """
+
+    def __init__(self):
+        super().__init__(LIGHTS)
+        self.gate = threading.Event()
+
+    def set_light(self, light_id, parameter, value=None, transitiontime=None):
+        self.gate.wait(5)
+        return super().set_light(light_id, parameter, value, transitiontime)
+
+    def set_group(self, group_id, parameter, value=None, transitiontime=None):
+        self.gate.wait(5)
+        return super().set_group(group_id, parameter, value, transitiontime)
+
+
+@pytest.fixture
+def bridge():
+    return GatedHueBridge()
+
+
+@pytest.fixture
+def scheduler(bridge):
+    scheduler = HueCommandScheduler(bridge, max_commands_per_second=1000, group_command_cost=1)
+    scheduler.update_groups({0: bridge.light_states, **{group_id: group['lights']
+                                                         for group_id, group in bridge.groups.items()}})
+    return scheduler
+
+
+def run(bridge, scheduler, writes):
+    """
+    Queue the writes behind a blocked write and return the writes the bridge received, the blocked one excluded
+    """
+    blocked = scheduler.submit_light(5, {'alert': 'none'})
+    futures = [submit(target, state, *options) for submit, target, state, *options in writes]
+    bridge.gate.set()
+    # The recording bridge can't apply xy_inc, the write is still recorded as sent
+    wait([blocked, *futures], timeout=5)
+    return [(name, arguments[0], arguments[1]) for name, arguments in bridge.calls if arguments[0] != 5]
+
+
+def test_merge_never_moves_a_light_write_behind_a_later_group_write(bridge, scheduler):
+    sent = run(bridge, scheduler, [
+        (scheduler.submit_light, 3, {'on': True}),
+        (scheduler.submit_group, 0, {'on': False}),
+        (scheduler.submit_light, 3, {'bri': 100}),
+    ])
+    assert sent == [('set_light', 3, {'on': True}), ('set_group', 0, {'on': False}), ('set_light', 3, {'bri': 100})]
+    assert bridge.light_states[3]['on'] is False and bridge.light_states[3]['bri'] == 100
+
+
+def test_latest_intent_wins_on_a_light_written_before_and_after_a_group(bridge, scheduler):
+    run(bridge, scheduler, [
+        (scheduler.submit_light, 3, {'on': False}),
+        (scheduler.submit_group, 0, {'on': True}),
+        (scheduler.submit_light, 3, {'on': False}),
+    ])
+    assert [light_id for light_id, state in bridge.light_states.items() if state['on']] == [1, 2, 4, 5]
+
+
+def test_writes_are_merged_in_place_when_nothing_overlapping_follows(bridge, scheduler):
+    sent = run(bridge, scheduler, [
+        (scheduler.submit_light, 3, {'on': True}),
+        (scheduler.submit_group, SALON, {'on': False}),
+        (scheduler.submit_light, 4, {'on': True}),
+        (scheduler.submit_light, 3, {'bri': 100}),
+    ])
+    assert sent == [('set_light', 3, {'on': True, 'bri': 100}), ('set_group', SALON, {'on': False}),
+                    ('set_light', 4, {'on': True})]
+    assert scheduler.collapsed == 1
+
+
+def test_unknown_group_overlaps_every_light(bridge, scheduler):
+    scheduler.update_groups({})
+    sent = run(bridge, scheduler, [
+        (scheduler.submit_light, 1, {'on': True}),
+        (scheduler.submit_group, CHAMBRE, {'on': False}),
+        (scheduler.submit_light, 1, {'bri': 10}),
+    ])
+    assert [target for _, target, _ in sent] == [1, CHAMBRE, 1]
+
+
+def test_increments_are_added_or_folded_into_the_absolute_value(bridge, scheduler):
+    sent = run(bridge, scheduler, [
+        (scheduler.submit_light, 1, {'bri_inc': 30}),
+        (scheduler.submit_light, 1, {'bri_inc': 20}),
+        (scheduler.submit_light, 2, {'bri': 100}),
+        (scheduler.submit_light, 2, {'bri_inc': 200}),
+        (scheduler.submit_light, 3, {'bri_inc': 50}),
+        (scheduler.submit_light, 3, {'bri': 10}),
+    ])
+    assert sent == [('set_light', 1, {'bri_inc': 50}), ('set_light', 2, {'bri': 254}), ('set_light', 3, {'bri': 10})]
+
+
+def test_increment_that_cannot_be_folded_is_sent_separately(bridge, scheduler):
+    sent = run(bridge, scheduler, [
+        (scheduler.submit_light, 1, {'xy': [0.3, 0.3]}),
+        (scheduler.submit_light, 1, {'xy_inc': [0.1, 0.0]}),
+    ])
+    assert sent == [('set_light', 1, {'xy': [0.3, 0.3]}), ('set_light', 1, {'xy_inc': [0.1, 0.0]})]
+
+
+def test_user_writes_go_before_background_ones(bridge, scheduler):
+    sent = run(bridge, scheduler, [
+        (scheduler.submit_light, 1, {'on': True}, BACKGROUND_PRIORITY),
+        (scheduler.submit_light, 2, {'on': True}),
+        (scheduler.submit_light, 1, {'bri': 50}),
+    ])
+    assert sent == [('set_light', 1, {'on': True, 'bri': 50}), ('set_light', 2, {'on': True})]
+    assert scheduler.queue_depth == 0
@@ -0,0 +1,37 @@
+import json
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("phue")
+pytest.importorskip("requests")
+
+from benchmarks.fakes import RecordingHueBridge
+from plugs.hue_plug import HueManager
+
+CONFIGURATION_PATH = Path(__file__).resolve().parent.parent / "plugs/hue_plug/hue_configuration.json"
+
+
+@pytest.fixture
+def bridge():
+    with CONFIGURATION_PATH.open(encoding="utf-8") as configuration_file:
+        return RecordingHueBridge(json.load(configuration_file)["hue_lights"])
+
+
+@pytest.fixture
+def manager(bridge):
+    return HueManager(str(CONFIGURATION_PATH), bridge=bridge)
+
+
+def writes_of(bridge, action):
+    bridge.calls.clear()
+    action()
+    return [(name, arguments[0]) for name, arguments in bridge.calls if name.startswith('set_')]
+
+
+def test_a_group_only_replaces_light_writes_costing_more_than_it(manager, bridge):
+    salon = next(group_id for group_id, group in bridge.groups.items() if group['name'] == 'Salon')
+    assert writes_of(bridge, lambda: manager.turn_on_rooms(['Salon'])) == [('set_group', salon)]
+    # Two paired lights make a group of their own, two light writes are still cheaper than a group write
+    assert sorted(writes_of(bridge, lambda: manager.turn_on_lights([28]))) == [('set_light', 28), ('set_light', 29)]
+    assert len(writes_of(bridge, lambda: manager.turn_on_rooms(['Cuisine']))) == 7
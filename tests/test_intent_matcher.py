@@ -0,0 +1,56 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from services.intent_matcher import IntentMatcher
+
+REPOSITORY = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(REPOSITORY)
+        with open("configuration.json", encoding="utf-8") as configuration_file:
+            return IntentMatcher(json.load(configuration_file))
+
+
+def command_of(answer):
+    command, = answer["commands"]
+    return command["manager_name"], command["command_name"], command["params"]
+
+
+@pytest.mark.parametrize("utterance", [
+    "Alfred, stop",
+    "Alfred arrête",
+    "Alfred lance",
+    "Alfred lance le",
+    "Alfred, lance le salon",
+    "Alfred, allume",
+])
+def test_an_action_without_target_goes_to_the_llm(matcher, utterance):
+    assert matcher.match(utterance) is None
+
+
+@pytest.mark.parametrize("utterance, expected", [
+    ("Alfred, arrête l'aspirateur", ("roborock", "finish_cleaning", [])),
+    ("Alfred, stoppe le robot", ("roborock", "finish_cleaning", [])),
+    ("Alfred, lance l'aspirateur", ("roborock", "clean_entire_house", [])),
+    ("Alfred, aspire toute la maison", ("roborock", "clean_entire_house", [])),
+    ("Alfred, aspire la cuisine", ("roborock", "clean_room", [[17]])),
+    ("Alfred, lance l'aspirateur dans la cuisine et le salon", ("roborock", "clean_room", [[17, 18]])),
+    ("Alfred, nettoie la chambre", ("roborock", "clean_room", [[16, 20]])),
+])
+def test_the_vacuum_is_reached_when_named_or_given_a_room(matcher, utterance, expected):
+    assert command_of(matcher.match(utterance)) == expected
+
+
+def test_lights_and_scripts_are_matched(matcher):
+    assert command_of(matcher.match("Alfred, éteins le couloir"))[:2] == ("hue", "turn_off_lights")
+    assert command_of(matcher.match("Alfred, allume la télé")) == ("home_assistant", "use_ha_script",
+                                                                 ["switch_on_tv_box"])
+
+
+def test_an_unknown_word_goes_to_the_llm(matcher):
+    assert matcher.match("Alfred, allume le salon en bleu") is None
@@ -0,0 +1,146 @@
+import json
+import time
+
+import pytest
+
+from llm.conversation_history import ConversationHistory
+from llm.llm_abstract_class import LLMInterface
+from llm.llm_router import LLMRouter
+
+
+class FakeBackend(LLMInterface):
+    """
+    Stateful backend answering after first_chunk_seconds, then one chunk every chunk_seconds
+    """
+
+    def __init__(self, name, first_chunk_seconds=0.0, chunk_seconds=0.0, fail=False):
+        self.name = name
+        self.first_chunk_seconds = first_chunk_seconds
+        self.chunk_seconds = chunk_seconds
+        self.fail = fail
+        self.calls = 0
+        self.history = ConversationHistory()
+
+    def add_plugs_context_to_prompt(self, plugs_context):
+        pass
+
+    def answer(self):
+        return json.dumps({"answer": f"answered by {self.name}", "commands": []})
+
+    def interpret_request(self, request):
+        self.calls += 1
+        time.sleep(self.first_chunk_seconds)
+        if self.fail:
+            raise ConnectionError(f"{self.name} is down")
+        answer = self.answer()
+        self.history.add_turn(request, answer)
+        return answer
+
+    def interpret_request_stream(self, request):
+        self.calls += 1
+        time.sleep(self.first_chunk_seconds)
+        if self.fail:
+            raise ConnectionError(f"{self.name} is down")
+        answer = self.answer()
+        for offset in range(0, len(answer), 10):
+            if offset:
+                time.sleep(self.chunk_seconds)
+            yield answer[offset:offset + 10]
+        self.history.add_turn(request, answer)
+
+    def turns(self):
+        return [user_message["content"] for user_message, _ in self.history.turns]
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_unsampled_backends_come_after_the_sampled_ones():
+    router = LLMRouter({"new": FakeBackend("new"), "slow": FakeBackend("slow"), "fast": FakeBackend("fast"),
+                        "broken": FakeBackend("broken")})
+    router.stats["slow"].record(900, True)
+    router.stats["fast"].record(100, True)
+    router.stats["broken"].record(10, False)
+    assert router.ranked_backends() == ["fast", "slow", "new", "broken"]
+
+
+def test_hedged_request_answers_from_the_fastest_backend_and_the_loser_forgets_the_turn():
+    slow, fast = FakeBackend("slow", first_chunk_seconds=0.3), FakeBackend("fast")
+    router = LLMRouter({"slow": slow, "fast": fast}, hedge_delay=0.05)
+    router.stats["slow"].record(10, True)
+
+    assert json.loads(router.interpret_request("allume le salon"))["answer"] == "answered by fast"
+    assert router.last_backend == "fast"
+    assert fast.turns() == ["allume le salon"]
+    assert wait_until(lambda: router.stats["slow"].as_dict()["calls"] == 2)
+    assert slow.turns() == []
+
+
+def test_request_is_not_hedged_without_hedge_delay():
+    slow, fast = FakeBackend("slow", first_chunk_seconds=0.1), FakeBackend("fast")
+    router = LLMRouter({"slow": slow, "fast": fast})
+    router.stats["slow"].record(10, True)
+    assert json.loads(router.interpret_request("éteins tout"))["answer"] == "answered by slow"
+    assert fast.calls == 0
+
+
+def test_failed_backend_falls_back_to_the_next_one():
+    router = LLMRouter({"down": FakeBackend("down", fail=True), "up": FakeBackend("up")})
+    assert json.loads(router.interpret_request("pause"))["answer"] == "answered by up"
+    assert router.stats["down"].error_rate == 1.0
+
+
+def test_stream_is_hedged_on_the_first_chunk():
+    slow, fast = FakeBackend("slow", first_chunk_seconds=0.3), FakeBackend("fast", chunk_seconds=0.01)
+    router = LLMRouter({"slow": slow, "fast": fast}, hedge_delay=0.05)
+    router.stats["slow"].record(10, True)
+    slow.history.add_turn("lance le ménage", slow.answer())
+
+    answer = "".join(router.interpret_request_stream("lance le ménage"))
+    assert json.loads(answer)["answer"] == "answered by fast"
+    assert router.last_backend == "fast"
+    assert fast.turns() == ["lance le ménage"]
+    # The loser is closed at its first chunk, before it could record its turn: its earlier identical turn stays
+    assert wait_until(lambda: router.stats["slow"].as_dict()["calls"] == 2)
+    assert slow.turns() == ["lance le ménage"]
+
+
+def test_stream_latency_is_the_time_to_the_first_chunk_not_the_consumer_time():
+    backend = FakeBackend("only", first_chunk_seconds=0.02)
+    router = LLMRouter({"only": backend})
+    for _ in router.interpret_request_stream("allume la cuisine"):
+        time.sleep(0.05)
+    assert 20 <= router.stats["only"].percentile(50) < 100
+
+
+def test_stream_falls_back_when_a_backend_fails_before_its_first_chunk():
+    router = LLMRouter({"down": FakeBackend("down", fail=True), "up": FakeBackend("up")})
+    answer = "".join(router.interpret_request_stream("baisse la lumière"))
+    assert json.loads(answer)["answer"] == "answered by up"
+    assert router.stats["down"].error_rate == 1.0
+
+
+class SilentBackend(FakeBackend):
+    def answer(self):
+        return ""
+
+
+def test_an_empty_stream_falls_back_and_forgets_its_turn():
+    silent = SilentBackend("silent")
+    silent.history.add_turn("éteins tout", "{}")
+    router = LLMRouter({"silent": silent, "up": FakeBackend("up")})
+    router.stats["silent"].record(10, True)
+
+    answer = "".join(router.interpret_request_stream("éteins tout"))
+    assert json.loads(answer)["answer"] == "answered by up"
+    assert [assistant["content"] for _, assistant in silent.history.turns] == ["{}"]
+
+
+def test_stream_raises_when_every_backend_fails():
+    router = LLMRouter({"down": FakeBackend("down", fail=True)}, hedge_delay=0.01)
+    with pytest.raises(RuntimeError):
+        list(router.interpret_request_stream("allume"))
@@ -0,0 +1,105 @@
+import json
+import threading
+import time
+
+import pytest
+
+from llm import local_llm
+from llm.local_llm import LocalLLM
+
+ANSWER = json.dumps({"answer": "Bien monsieur", "commands": []})
+
+
+class FakeLlama:
+    """
+    Stand-in for llama_cpp.Llama answering ANSWER in chunks of 8 characters, one every chunk_seconds
+    """
+
+    chunk_seconds = 0.01
+
+    def __init__(self, model_path, **kwargs):
+        self.model_path = model_path
+        self.active = 0
+        self.max_active = 0
+        self.chunks_generated = 0
+        self.requests = []
+
+    def set_cache(self, cache):
+        self.cache = cache
+
+    def create_chat_completion(self, messages, stream=False, **kwargs):
+        self.requests.append(messages[-1]["content"])
+        if stream:
+            return self.__stream()
+        with self.__running():
+            return {"choices": [{"message": {"content": ANSWER}}],
+                    "usage": {"prompt_tokens": 120, "completion_tokens": 9}}
+
+    def __stream(self):
+        with self.__running():
+            for offset in range(0, len(ANSWER), 8):
+                time.sleep(self.chunk_seconds)
+                self.chunks_generated += 1
+                yield {"choices": [{"delta": {"content": ANSWER[offset:offset + 8]}}]}
+
+    def __running(self):
+        fake = self
+
+        class Running:
+            def __enter__(self):
+                fake.active += 1
+                fake.max_active = max(fake.max_active, fake.active)
+
+            def __exit__(self, *exc_info):
+                fake.active -= 1
+
+        return Running()
+
+
+@pytest.fixture
+def llm(tmp_path, monkeypatch):
+    model_path = tmp_path / "model.gguf"
+    model_path.write_bytes(b"GGUF")
+    monkeypatch.setattr(local_llm, "Llama", FakeLlama)
+    monkeypatch.setattr(local_llm, "LlamaRAMCache", lambda capacity_bytes: capacity_bytes)
+    monkeypatch.setattr(LocalLLM, "_instance", None)
+    return LocalLLM(model_path=str(model_path))
+
+
+def test_missing_model_is_reported(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_llm, "Llama", FakeLlama)
+    monkeypatch.setattr(LocalLLM, "_instance", None)
+    with pytest.raises(FileNotFoundError):
+        LocalLLM(model_path=str(tmp_path / "missing.gguf"))
+
+
+def test_request_is_answered_and_kept_in_the_history(llm):
+    assert llm.interpret_request("allume le salon") == ANSWER
+    assert llm.last_usage["prompt_tokens"] == 120
+    assert [user["content"] for user, _ in llm.history.turns] == ["allume le salon"]
+
+
+def test_stream_yields_the_answer_and_keeps_it_in_the_history(llm):
+    assert "".join(llm.interpret_request_stream("éteins tout")) == ANSWER
+    assert [(user["content"], answer["content"]) for user, answer in llm.history.turns] == [("éteins tout", ANSWER)]
+
+
+def test_slow_consumer_does_not_hold_the_model(llm):
+    stream = llm.interpret_request_stream("lance le ménage")
+    next(stream)
+    answers = []
+    other_request = threading.Thread(target=lambda: answers.append(llm.interpret_request("pause")))
+    other_request.start()
+    other_request.join(timeout=2)
+    assert answers == [ANSWER]
+    assert "".join(stream)
+    assert llm.model.max_active == 1
+
+
+def test_closed_stream_stops_the_generation_and_keeps_no_turn(llm):
+    stream = llm.interpret_request_stream("baisse la lumière")
+    next(stream)
+    stream.close()
+    assert llm.interpret_request("allume") == ANSWER
+    assert llm.model.chunks_generated < len(range(0, len(ANSWER), 8))
+    assert [user["content"] for user, _ in llm.history.turns] == ["allume"]
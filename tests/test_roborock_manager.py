@@ -0,0 +1,25 @@
+import pytest
+
+miio = pytest.importorskip("miio")
+pytest.importorskip("cryptography")
+
+from plugs.roborock_plug.roborock_manager import RoborockManager
+from simulators import RoborockSimulator
+from simulators.roborock import SEGMENT_CLEANING
+
+TOKEN = "00112233445566778899aabbccddeeff"
+
+
+@pytest.fixture
+def simulated_manager(tmp_path):
+    configuration_path = tmp_path / "roborock_configuration.json"
+    configuration_path.write_text(f'{{"ip": "127.0.0.1", "token": "{TOKEN}"}}')
+    with RoborockSimulator(TOKEN) as simulator:
+        yield RoborockManager(str(configuration_path), miio.RoborockVacuum(simulator.host, TOKEN)), simulator
+
+
+def test_clean_room_sends_the_segments_with_the_repeat_count(simulated_manager):
+    manager, simulator = simulated_manager
+    manager.clean_room([16, 17], number_of_cleaning=2)
+    assert simulator.cleaned_segments == [[{"segments": [16, 17], "repeat": 2}]]
+    assert simulator.state == SEGMENT_CLEANING
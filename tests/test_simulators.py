@@ -0,0 +1,32 @@
+import argparse
+import socket
+from pathlib import Path
+
+import pytest
+
+from simulators.http_simulator import HttpSimulator
+
+REPOSITORY = Path(__file__).resolve().parent.parent
+
+
+def test_an_http_simulator_must_answer_requests():
+    with pytest.raises(TypeError):
+        HttpSimulator()
+
+
+def test_the_simulated_benchmark_stops_its_simulators(monkeypatch):
+    pytest.importorskip("phue")
+    pytest.importorskip("miio")
+    pytest.importorskip("cryptography")
+    from benchmarks.run_benchmark import Benchmark
+
+    monkeypatch.chdir(REPOSITORY)
+    arguments = argparse.Namespace(devices="simulated", device_latency_ms=0, response_cache=False,
+                                   llm_first_token_ms=0, llm_ms_per_token=0, llm_jitter=0.0, seed=0)
+    benchmark = Benchmark([], arguments)
+    hue_port = benchmark.devices["hue"].port
+    benchmark.close()
+
+    assert benchmark.simulators == []
+    with socket.socket() as connection:
+        assert connection.connect_ex(("127.0.0.1", hue_port)) != 0
@@ -0,0 +1,50 @@
+import threading
+
+import pytest
+
+pytest.importorskip("pyaudio")
+pytest.importorskip("pyttsx3")
+
+from speaker import Speaker, SpokenAnswer
+
+
+class SilentSpeaker(Speaker):
+    """
+    Records the queued sentences instead of starting the speech thread
+    """
+
+    def __init__(self):
+        self._generation = 0
+        self._interrupted = False
+        self._speaking = threading.Event()
+        self.said = []
+
+    def say(self, text):
+        if text and text.strip():
+            self.said.append(text)
+
+
+def test_complete_sentences_are_spoken_while_fed_and_the_rest_at_the_end():
+    speaker = SilentSpeaker()
+    answer = speaker.answer()
+    answer.feed("J'allume la lumière. Il est")
+    answer.feed(" tard")
+    assert speaker.said == ["J'allume la lumière."]
+    assert answer.complete("J'allume la lumière. Il est tard") == "Il est tard"
+
+
+def test_an_answer_never_completed_does_not_leak_into_the_next_one():
+    speaker = SilentSpeaker()
+    speaker.answer().feed("Une réponse jamais fermée")
+    assert speaker.answer().complete("Bonjour") == "Bonjour"
+
+
+def test_a_stopped_answer_stays_silent():
+    speaker = SilentSpeaker()
+    answer = speaker.answer()
+    answer.feed("Première phrase. Deu")
+    speaker.stop()
+    answer.feed("xième phrase. Troisième phrase. ")
+    assert speaker.said == ["Première phrase."]
+    assert answer.complete("Première phrase. Deuxième phrase. Troisième phrase.") == ""
+    assert isinstance(speaker.answer(), SpokenAnswer)
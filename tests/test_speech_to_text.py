@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+pytest.importorskip("speech_recognition")
+
+from services import speech_to_text
+from services.speech_to_text import VoskSpeechToText
+
+
+class FakeRecognizer:
+    """
+    KaldiRecognizer replaying a script: one (endpoint, text) step per AcceptWaveform call, then the final text
+    """
+
+    script = []
+    final_text = ''
+
+    def __init__(self, model, sample_rate, grammar=None):
+        self.steps = iter(self.script)
+        self.current = None
+
+    def AcceptWaveform(self, data):
+        self.current = next(self.steps)
+        return self.current[0]
+
+    def Result(self):
+        return json.dumps({"text": self.current[1]})
+
+    def PartialResult(self):
+        return json.dumps({"partial": self.current[1]})
+
+    def FinalResult(self):
+        return json.dumps({"text": self.final_text})
+
+
+class FakeVosk:
+    KaldiRecognizer = FakeRecognizer
+
+    @staticmethod
+    def SetLogLevel(level):
+        pass
+
+    @staticmethod
+    def Model(model_path):
+        return object()
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setattr(speech_to_text, "vosk", FakeVosk)
+    monkeypatch.setattr(VoskSpeechToText, "_models", {})
+    partials = []
+    engine = VoskSpeechToText("model", on_partial=partials.append)
+    engine.partials = partials
+    return engine
+
+
+def use_script(monkeypatch, script, final_text):
+    monkeypatch.setattr(FakeRecognizer, "script", script)
+    monkeypatch.setattr(FakeRecognizer, "final_text", final_text)
+
+
+def test_text_of_every_endpoint_is_kept(engine, monkeypatch):
+    use_script(monkeypatch, [(False, "allume"), (True, "allume la lumière"), (False, "du"), (True, "du salon"),
+                             (False, "et la")], "et la cuisine")
+    assert engine.transcribe(b"\0" * VoskSpeechToText.CHUNK_BYTES * 5, 16000) == \
+        "allume la lumière du salon et la cuisine"
+    assert engine.partials == ["allume", "allume la lumière", "allume la lumière du",
+                               "allume la lumière du salon", "allume la lumière du salon et la"]
+
+
+def test_phrase_ending_on_an_endpoint_keeps_its_text(engine, monkeypatch):
+    use_script(monkeypatch, [(False, "éteins"), (True, "éteins tout")], "")
+    assert engine.transcribe(b"\0" * VoskSpeechToText.CHUNK_BYTES * 2, 16000) == "éteins tout"
+
+
+def test_silence_is_not_understood(engine, monkeypatch):
+    use_script(monkeypatch, [(False, ""), (True, "")], "")
+    assert engine.transcribe(b"\0" * VoskSpeechToText.CHUNK_BYTES * 2, 16000) is None
+    assert engine.partials == []
@@ -0,0 +1,74 @@
+import json
+
+from llm.streaming_json_parser import StreamingAnswerParser
+
+ANSWER = {
+    "answer": "J'allume la \"lumière\" du salon {et} [la télé]\n",
+    "commands": [
+        {"manager_name": "hue", "command": "turn_on_room", "args": {"room": "Salon", "brightness": [1, 2]}},
+        {"manager_name": "home_assistant", "command": "switch_on_tv_box", "args": {}},
+    ],
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+        self.deltas = []
+
+    def parser(self, with_deltas=True):
+        return StreamingAnswerParser(lambda command: self.events.append(('command', command)),
+                                     lambda answer: self.events.append(('answer', answer)),
+                                     self.deltas.append if with_deltas else None)
+
+
+def feed_in_chunks(parser, text, size):
+    for start in range(0, len(text), size):
+        parser.feed(text[start:start + size])
+
+
+def test_every_chunk_size_gives_the_same_commands_and_answer():
+    text = json.dumps(ANSWER, ensure_ascii=False)
+    for size in (1, 2, 3, 7, len(text)):
+        recorder = Recorder()
+        parser = recorder.parser()
+        feed_in_chunks(parser, text, size)
+        assert recorder.events == [('answer', ANSWER['answer'])] + [('command', command)
+                                                                    for command in ANSWER['commands']]
+        assert ''.join(recorder.deltas) == ANSWER['answer']
+
+
+def test_commands_are_emitted_before_the_object_closes():
+    recorder = Recorder()
+    parser = recorder.parser()
+    text = json.dumps(ANSWER)
+    first_command_end = text.index('}}', text.index('"commands"')) + 2
+    parser.feed(text[:first_command_end])
+    assert recorder.events[-1] == ('command', ANSWER['commands'][0])
+    parser.feed(text[first_command_end:])
+    assert recorder.events[-1] == ('command', ANSWER['commands'][1])
+
+
+def test_deltas_do_not_split_escape_sequences():
+    recorder = Recorder()
+    parser = recorder.parser()
+    for chunk in ('{"answer": "a\\', 'u00e9', '\\', '"b', '\\n"', ', "commands": []}'):
+        parser.feed(chunk)
+    assert ''.join(recorder.deltas) == 'aé"b\n'
+    assert recorder.events == [('answer', 'aé"b\n')]
+
+
+def test_text_before_the_object_and_after_it_is_ignored():
+    recorder = Recorder()
+    parser = recorder.parser(with_deltas=False)
+    parser.feed('```json\n{"commands": [{"manager_name": "roborock", "command": "home"}], "answer": "ok"}\n```')
+    assert recorder.events == [('command', {"manager_name": "roborock", "command": "home"}), ('answer', 'ok')]
+    assert recorder.deltas == []
+
+
+def test_nested_answer_keys_are_not_taken_for_the_answer():
+    recorder = Recorder()
+    parser = recorder.parser()
+    parser.feed('{"commands": [{"manager_name": "hue", "args": {"answer": "no"}}], "answer": "yes"}')
+    assert recorder.events == [('command', {"manager_name": "hue", "args": {"answer": "no"}}), ('answer', 'yes')]
+    assert ''.join(recorder.deltas) == 'yes'
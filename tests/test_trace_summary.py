@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from services.tracing import Tracer, configure_tracing, tracer
+from trace_summary import end_to_end_durations, load_spans, stage_durations, stage_errors
+
+REPOSITORY = Path(__file__).resolve().parent.parent
+MS = 1_000_000
+
+
+def test_first_answer_is_the_start_of_the_first_tts_span(tmp_path):
+    traces_path = tmp_path / "traces.jsonl"
+    trace = Tracer(str(traces_path)).start_trace()
+    start = 1_000_000 * MS
+    trace.record_span("capture", start - 2000 * MS, start)
+    trace.record_span("command", start + 50 * MS, start + 120 * MS, manager="hue")
+    # The queue wait is already behind the start of the span, it must not be added again
+    trace.record_span("tts", start + 300 * MS, start + 900 * MS, queue_wait_ms=250)
+    trace.record_span("tts", start + 900 * MS, start + 1500 * MS, queue_wait_ms=800)
+    trace.tracer.flush()
+
+    spans = load_spans(traces_path)
+    assert end_to_end_durations(spans) == {
+        "speech end -> first command": [120.0],
+        "speech end -> first answer": [300.0],
+    }
+    assert stage_durations(spans)["command[hue]"] == [70.0]
+    assert stage_durations(spans)["tts"] == [600.0, 600.0]
+
+
+def test_a_trace_without_capture_has_no_end_to_end_duration(tmp_path):
+    traces_path = tmp_path / "traces.jsonl"
+    trace = Tracer(str(traces_path)).start_trace()
+    trace.record_span("tts", 0, 600 * MS)
+    trace.tracer.flush()
+    assert end_to_end_durations(load_spans(traces_path)) == {}
+
+
+def test_benchmark_replay_reports_every_stage(tmp_path, monkeypatch):
+    pytest.importorskip("phue")
+    pytest.importorskip("miio")
+    pytest.importorskip("requests")
+    from benchmarks.run_benchmark import DEFAULT_CORPUS_PATH, Benchmark, load_corpus
+
+    monkeypatch.chdir(REPOSITORY)
+    traces_path = tmp_path / "benchmark_traces.jsonl"
+    configure_tracing(str(traces_path))
+    corpus = [entry for entry in load_corpus(DEFAULT_CORPUS_PATH) if not entry.get("wav")]
+    arguments = argparse.Namespace(devices="fake", device_latency_ms=0, response_cache=False,
+                                   llm_first_token_ms=0, llm_ms_per_token=0, llm_jitter=0.0, seed=0)
+    benchmark = Benchmark(corpus, arguments)
+    asyncio.run(benchmark.run(repeat=1, concurrency=1))
+    tracer.flush()
+
+    spans = load_spans(traces_path)
+    durations = stage_durations(spans)
+    assert len(durations["request"]) == len(corpus)
+    assert benchmark.llm.calls == len(durations["llm"])
+    hue_commands = sum(1 for entry in corpus for command in entry["answer"]["commands"]
+                       if command["manager_name"] == "hue")
+    assert len(durations["command[hue]"]) == hue_commands
+    assert not stage_errors(spans)
@@ -0,0 +1,119 @@
+"""Latency percentiles of the voice pipeline stages, computed from the spans written by services.tracing."""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence
+
+DEFAULT_TRACES_PATH = Path("logs/traces.jsonl")
+PERCENTILES = (50, 95, 99)
+
+
+def load_spans(path: Path) -> List[dict]:
+    """Read the spans of a JSON lines trace file, skipping the truncated lines."""
+    spans = []
+    with path.open("r", encoding="utf-8") as traces_file:
+        for line in traces_file:
+            try:
+                spans.append(json.loads(line))
+            except ValueError:
+                continue
+    return spans
+
+
+def percentile(sorted_values: Sequence[float], percent: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def stage_names(span: dict) -> List[str]:
+    """Stages a span is reported under, commands are also reported per manager."""
+    manager = span.get("attributes", {}).get("manager")
+    if span["name"] == "command" and manager:
+        return [span["name"], f"command[{manager}]"]
+    return [span["name"]]
+
+
+def stage_durations(spans: Iterable[dict]) -> Dict[str, List[float]]:
+    """Durations in milliseconds per stage."""
+    durations: Dict[str, List[float]] = defaultdict(list)
+    for span in spans:
+        for stage in stage_names(span):
+            durations[stage].append(span["duration_ms"])
+    return durations
+
+
+def stage_errors(spans: Iterable[dict]) -> Dict[str, int]:
+    """Number of failed spans per stage."""
+    errors: Dict[str, int] = defaultdict(int)
+    for span in spans:
+        if span.get("status") == "ERROR":
+            for stage in stage_names(span):
+                errors[stage] += 1
+    return errors
+
+
+def end_to_end_durations(spans: Iterable[dict]) -> Dict[str, List[float]]:
+    """Time from the end of the captured speech to the first executed command and to the first spoken word."""
+    traces: Dict[str, List[dict]] = defaultdict(list)
+    for span in spans:
+        traces[span["trace_id"]].append(span)
+    durations: Dict[str, List[float]] = defaultdict(list)
+    for trace_spans in traces.values():
+        speech_end = min((span["end_time_unix_nano"] for span in trace_spans if span["name"] == "capture"),
+                         default=None)
+        if speech_end is None:
+            continue
+        first_command = min((span["end_time_unix_nano"] for span in trace_spans if span["name"] == "command"),
+                            default=None)
+        # The tts span is opened once its sentence has left the speaker queue, when the speech starts
+        first_speech = min((span["start_time_unix_nano"] for span in trace_spans if span["name"] == "tts"),
+                           default=None)
+        if first_command is not None:
+            durations["speech end -> first command"].append((first_command - speech_end) / 1e6)
+        if first_speech is not None:
+            durations["speech end -> first answer"].append((first_speech - speech_end) / 1e6)
+    return durations
+
+
+def format_table(durations: Dict[str, List[float]], errors: Dict[str, int]) -> str:
+    header = f"{'stage':<32}{'count':>7}{'errors':>8}" + "".join(f"{f'p{p} ms':>11}" for p in PERCENTILES)
+    lines = [header, "-" * len(header)]
+    for stage, values in sorted(durations.items()):
+        values = sorted(values)
+        lines.append(f"{stage:<32}{len(values):>7}{errors.get(stage, 0):>8}"
+                     + "".join(f"{percentile(values, p):>11.1f}" for p in PERCENTILES))
+    return "\n".join(lines)
+
+
+def main() -> None:
+    """Entry point printing the summary of a trace file."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", nargs="?", type=Path, default=DEFAULT_TRACES_PATH,
+                        help=f"trace file to summarise (default {DEFAULT_TRACES_PATH})")
+    parser.add_argument("--last", type=int, default=None, help="only use the spans of the last N traces")
+    arguments = parser.parse_args()
+
+    if not arguments.path.exists():
+        print(f"No trace file at {arguments.path}.")
+        return
+    spans = load_spans(arguments.path)
+    if arguments.last:
+        trace_ids = list(dict.fromkeys(span["trace_id"] for span in spans))[-arguments.last:]
+        kept = set(trace_ids)
+        spans = [span for span in spans if span["trace_id"] in kept]
+
+    print(f"{len({span['trace_id'] for span in spans})} traces, {len(spans)} spans\n")
+    print(format_table(stage_durations(spans), stage_errors(spans)))
+    end_to_end = end_to_end_durations(spans)
+    if end_to_end:
+        print()
+        print(format_table(end_to_end, {}))
+
+
+if __name__ == "__main__":
+    main()